@@ -0,0 +1,53 @@
+import json
+import timeit
+
+import msgpack
+
+from benchmark.Sample import order_row, rows
+from db.model.SalesOrderHeader import SalesOrderHeader
+from util.Columnar import COLUMNAR_JSON_MEDIA_TYPE, MSGPACK_MEDIA_TYPE, columnar_response
+from util.Json import FastJSONResponse
+
+"""
+Payload size, server encode time and client decode time of a page of
+orders as JSON objects (dict rows hydrated into models, as the JSON path
+does) against the columnar representations built from tuple rows
+
+Usage:
+    python -m benchmark.Columnar
+"""
+ROW_COUNTS = (1_000, 10_000, 100_000)
+REPEATS = 3
+
+
+def best_secs(func) -> float:
+    """
+    Best time over REPEATS runs
+    """
+    return min(timeit.repeat(func, number=1, repeat=REPEATS))
+
+
+def main() -> None:
+    print(f"{'Orders':>10}  {'Format':<16}{'size (KiB)':>12}{'encode (ms)':>14}{'decode (ms)':>14}")
+    for count in ROW_COUNTS:
+        data = rows(order_row, count)
+        columns = list(data[0])
+        tuples = [tuple(row.values()) for row in data]
+
+        cases = (
+            ("json", lambda: FastJSONResponse(SalesOrderHeader.from_rows(data)).body, json.loads),
+            ("columnar json", lambda: columnar_response(columns, tuples, COLUMNAR_JSON_MEDIA_TYPE).body, json.loads),
+            ("msgpack", lambda: columnar_response(columns, tuples, MSGPACK_MEDIA_TYPE).body, msgpack.unpackb),
+        )
+        for name, encode, decode in cases:
+            body = encode()
+            encode_secs = best_secs(encode)
+            decode_secs = best_secs(lambda: decode(body))
+            print(
+                f"{count:>10,}  {name:<16}{len(body) / 1024:>12,.0f}"
+                f"{encode_secs * 1e3:>14.1f}{decode_secs * 1e3:>14.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+import timeit
+
+from benchmark.Sample import customer_row, order_row, product_row, rows
+from db.model.ProductionProduct import ProductionProduct
+from db.model.SalesCustomer import SalesCustomer
+from db.model.SalesOrderHeader import SalesOrderHeader
+
+"""
+Per-row hydration cost of the validated path (cls(**row), used for request
+bodies) against the trusted path (Table.from_row, used for database rows)
+
+Usage:
+    python -m benchmark.Hydration
+"""
+ROWS = 1_000
+REPEATS = 5
+
+MODELS = (
+    (SalesOrderHeader, order_row),
+    (SalesCustomer, customer_row),
+    (ProductionProduct, product_row),
+)
+
+
+def per_row_secs(func, data: list[dict]) -> float:
+    """
+    Best per-row time over REPEATS runs
+    """
+    return min(timeit.repeat(lambda: func(data), number=1, repeat=REPEATS)) / len(data)
+
+
+def main() -> None:
+    print(f"{'Model':<20}{'validated (us)':>16}{'trusted (us)':>16}{'speedup':>10}")
+    for model, factory in MODELS:
+        data = rows(factory, ROWS)
+        validated = per_row_secs(lambda items: [model(**row) for row in items], data)
+        trusted = per_row_secs(model.from_rows, data)
+        print(f"{model.__name__:<20}{validated * 1e6:>16.2f}{trusted * 1e6:>16.2f}{validated / trusted:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
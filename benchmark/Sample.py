@@ -0,0 +1,103 @@
+from datetime import datetime, timedelta
+from decimal import Decimal
+from uuid import uuid4
+
+"""
+Sample rows shaped like the ones the database driver returns, with
+DECIMAL columns as Decimal and DATETIME columns as datetime
+"""
+BASE_DATE = datetime(2014, 1, 1)
+
+
+def order_row(i: int) -> dict[str, any]:
+    order_date = BASE_DATE + timedelta(hours=i)
+    return {
+        "SalesOrderID": 43659 + i,
+        "RevisionNumber": 8,
+        "OrderDate": order_date,
+        "DueDate": order_date + timedelta(days=12),
+        "ShipDate": order_date + timedelta(days=7),
+        "Status": 5,
+        "OnlineOrderFlag": i % 2,
+        "SalesOrderNumber": f"SO{43659 + i}",
+        "PurchaseOrderNumber": f"PO{522145787 + i}",
+        "AccountNumber": f"10-4020-{i % 1000:06d}",
+        "CustomerID": 29825 + i % 1000,
+        "SalesPersonID": 279,
+        "TerritoryID": 5,
+        "BillToAddressID": 985,
+        "ShipToAddressID": 985,
+        "ShipMethodID": 5,
+        "CreditCardID": 16281,
+        "CreditCardApprovalCode": f"105041Vi{i % 100000:05d}",
+        "CurrencyRateID": None,
+        "SubTotal": Decimal("20565.6206"),
+        "TaxAmt": Decimal("1971.5149"),
+        "Freight": Decimal("616.0984"),
+        "TotalDue": Decimal("23153.2339"),
+        "Comment": None,
+        "rowguid": str(uuid4()),
+        "ModifiedDate": order_date + timedelta(days=7),
+    }
+
+
+def customer_row(i: int) -> dict[str, any]:
+    return {
+        "CustomerID": 1 + i,
+        "PersonID": None,
+        "StoreID": 934,
+        "TerritoryID": 1 + i % 10,
+        "AccountNumber": f"AW{1 + i:08d}",
+        "rowguid": str(uuid4()),
+        "ModifiedDate": BASE_DATE,
+    }
+
+
+def product_row(i: int) -> dict[str, any]:
+    return {
+        "ProductID": 680 + i,
+        "Name": f"HL Road Frame - Black, {58 + i % 10}",
+        "ProductNumber": f"FR-R92B-{58 + i % 10}",
+        "MakeFlag": 1,
+        "FinishedGoodsFlag": 1,
+        "Color": "Black",
+        "SafetyStockLevel": 500,
+        "ReorderPoint": 375,
+        "StandardCost": Decimal("1059.3100"),
+        "ListPrice": Decimal("1431.5000"),
+        "Size": "58",
+        "SizeUnitMeasureCode": "CM",
+        "WeightUnitMeasureCode": "LB",
+        "Weight": Decimal("2.24"),
+        "DaysToManufacture": 1,
+        "ProductLine": "R",
+        "Class": "H",
+        "Style": "U",
+        "ProductSubcategoryID": 14,
+        "ProductModelID": 6,
+        "SellStartDate": BASE_DATE,
+        "SellEndDate": None,
+        "DiscontinuedDate": None,
+        "rowguid": str(uuid4()),
+        "ModifiedDate": BASE_DATE,
+    }
+
+
+def order_detail_row(i: int) -> dict[str, any]:
+    return {
+        "SalesOrderID": 43659 + i // 3,
+        "SalesOrderDetailID": 1 + i,
+        "CarrierTrackingNumber": f"4911-403C-{i % 100:02d}",
+        "OrderQty": 1 + i % 4,
+        "ProductID": 680 + i % 100,
+        "SpecialOfferID": 1,
+        "UnitPrice": Decimal("2024.9940"),
+        "UnitPriceDiscount": Decimal("0.0000"),
+        "LineTotal": Decimal("2024.9940") * (1 + i % 4),
+        "rowguid": str(uuid4()),
+        "ModifiedDate": BASE_DATE,
+    }
+
+
+def rows(factory, n: int) -> list[dict[str, any]]:
+    return [factory(i) for i in range(n)]
@@ -0,0 +1,170 @@
+import argparse
+import random
+import time
+from datetime import timedelta
+from typing import Iterator
+
+from benchmark.Sample import BASE_DATE, customer_row, order_detail_row, order_row, product_row
+from db.Config import DB_BACKEND, SQLITE_PATH
+from db.IdAllocator import SEQUENCE_TABLE, SEQUENCE_TABLE_DDL
+from db.PopularityIndex import ORDER_DETAIL_TABLE
+from db.backend.Backend import Backend, load_backend
+from db.model.ProductionProduct import ProductionProduct
+from db.model.SalesCustomer import SalesCustomer
+from db.model.SalesOrderHeader import SalesOrderHeader
+
+"""
+Fills an empty database with generated customers, products, orders and
+order lines, so that throughput and scaling can be measured without a copy
+of AdventureWorks2019. Data is generated from a seed, so runs with the same
+arguments produce the same rows (apart from rowguids), and is written in
+chunks, so millions of orders can be generated in constant memory.
+
+Orders are spread evenly over customers and time, while order lines are
+skewed towards a few best selling products, as in real sales data
+
+Usage:
+    python -m benchmark.Seed --orders 1000000
+    python -m benchmark.Seed --backend sqlite --path /tmp/aw.sqlite3 --orders 5000000
+"""
+ORDER_DETAIL_COLS = tuple(order_detail_row(0))
+# NOTE: SQL injection is not possible as the f string values
+# are constants set in code. No user inputs are inserted
+ORDER_DETAIL_INSERT = (
+    f"INSERT INTO {ORDER_DETAIL_TABLE} ({','.join(ORDER_DETAIL_COLS)}) "
+    f"VALUES ({','.join(['%s'] * len(ORDER_DETAIL_COLS))})"
+)
+
+
+def customers(count: int) -> Iterator[tuple]:
+    statements = SalesCustomer.statements()
+    for i in range(count):
+        yield statements.insert_values(customer_row(i))
+
+
+def products(count: int) -> Iterator[tuple]:
+    statements = ProductionProduct.statements()
+    for i in range(count):
+        row = product_row(i)
+        row["ProductID"] = 1 + i
+        row["Name"] = f"Product {1 + i}"
+        row["ProductNumber"] = f"PR-{1 + i:06d}"
+        yield statements.insert_values(row)
+
+
+def orders(count: int, customer_count: int, rng: random.Random) -> Iterator[tuple]:
+    statements = SalesOrderHeader.statements()
+    for i in range(count):
+        row = order_row(i)
+        order_date = BASE_DATE + timedelta(minutes=i)
+        row["SalesOrderID"] = 1 + i
+        row["SalesOrderNumber"] = f"SO{1 + i}"
+        row["CustomerID"] = rng.randint(1, customer_count)
+        row["OrderDate"] = order_date
+        row["DueDate"] = order_date + timedelta(days=12)
+        row["ShipDate"] = order_date + timedelta(days=7)
+        row["ModifiedDate"] = order_date + timedelta(days=7)
+        yield statements.insert_values(row)
+
+
+def order_lines(count: int, product_count: int, lines_per_order: int, rng: random.Random) -> Iterator[tuple]:
+    detail_id = 0
+    for order_id in range(1, count + 1):
+        for _ in range(rng.randint(1, 2 * lines_per_order - 1)):
+            row = order_detail_row(detail_id)
+            detail_id += 1
+            row["SalesOrderID"] = order_id
+            # Squaring a uniform draw skews sales towards the lowest ProductIDs
+            row["ProductID"] = 1 + int(product_count * rng.random() ** 2)
+            yield tuple(row[col] for col in ORDER_DETAIL_COLS)
+
+
+def write(backend: Backend, cxn, command: str, rows: Iterator[tuple], label: str) -> int:
+    """
+    Inserts rows in chunks of the backend's bulk_insert_rows, one transaction per chunk
+    """
+    cur = backend.cursor(cxn)
+    started = time.perf_counter()
+    written = 0
+    chunk = []
+
+    def flush() -> None:
+        backend.begin(cxn)
+        cur.executemany(command, chunk)
+        cxn.commit()
+        chunk.clear()
+
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= backend.bulk_insert_rows:
+            written += len(chunk)
+            flush()
+    if chunk:
+        written += len(chunk)
+        flush()
+
+    elapsed = time.perf_counter() - started
+    print(f"{label:<14}{written:>12,} rows in {elapsed:>7.1f}s ({written / max(elapsed, 1e-9):>10,.0f} rows/s)")
+    cur.close()
+    return written
+
+
+def seed(
+        backend: Backend,
+        order_count: int,
+        customer_count: int,
+        product_count: int,
+        lines_per_order: int,
+        random_seed: int
+) -> None:
+    """
+    Generates every table. IdSequence rows of the seeded tables are removed,
+    so that new IDs are reseeded from the generated data on first use
+    """
+    rng = random.Random(random_seed)
+    cxn = backend.connect()
+    try:
+        write(backend, cxn, SalesCustomer.statements().insert, customers(customer_count), "customers")
+        write(backend, cxn, ProductionProduct.statements().insert, products(product_count), "products")
+        write(backend, cxn, SalesOrderHeader.statements().insert, orders(order_count, customer_count, rng), "orders")
+        write(
+            backend, cxn, ORDER_DETAIL_INSERT,
+            order_lines(order_count, product_count, lines_per_order, rng), "order lines"
+        )
+
+        cur = backend.cursor(cxn)
+        cur.execute(SEQUENCE_TABLE_DDL)
+        for table in (SalesCustomer, ProductionProduct, SalesOrderHeader):
+            cur.execute(f"DELETE FROM {SEQUENCE_TABLE} WHERE TableName = %s", (table.table_name(),))
+        cur.close()
+    finally:
+        cxn.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Generate data into an empty database")
+    parser.add_argument("--backend", default=DB_BACKEND, choices=("mysql", "sqlite"))
+    parser.add_argument("--path", default=SQLITE_PATH, help="SQLite database file")
+    parser.add_argument("--orders", type=int, default=100_000)
+    parser.add_argument("--customers", type=int, default=None, help="Defaults to one per 10 orders")
+    parser.add_argument("--products", type=int, default=500)
+    parser.add_argument("--lines-per-order", type=int, default=3, help="Average order lines per order")
+    parser.add_argument("--seed", type=int, default=2019)
+    args = parser.parse_args()
+
+    backend = load_backend(args.backend)
+    if args.backend == "sqlite":
+        backend.path = args.path
+
+    seed(
+        backend,
+        order_count=args.orders,
+        customer_count=args.customers or max(args.orders // 10, 1),
+        product_count=args.products,
+        lines_per_order=args.lines_per_order,
+        random_seed=args.seed,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+import asyncio
+import timeit
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+from pydantic import TypeAdapter
+
+from benchmark.Sample import order_row, rows
+from db.model.SalesOrderHeader import SalesOrderHeader
+from util.Json import FastJSONResponse
+
+"""
+Cost of turning a list of orders into a response body, the way FastAPI
+does for a response_model=list[SalesOrderHeader] (validate and encode the
+returned models, then json.dumps them), through a precompiled pydantic
+TypeAdapter, and by returning a FastJSONResponse (orjson)
+
+Usage:
+    python -m benchmark.Serialisation
+"""
+ROW_COUNTS = (1_000, 10_000, 100_000)
+REPEATS = 3
+
+RESPONSE_FIELD = create_response_field(name="Response_orders", type_=list[SalesOrderHeader])
+ADAPTER = TypeAdapter(list[SalesOrderHeader])
+
+
+def response_model(orders: list[SalesOrderHeader]) -> bytes:
+    content = asyncio.run(serialize_response(field=RESPONSE_FIELD, response_content=orders))
+    return JSONResponse(content).body
+
+
+def type_adapter(orders: list[SalesOrderHeader]) -> bytes:
+    return ADAPTER.dump_json(orders)
+
+
+def fast_response(orders: list[SalesOrderHeader]) -> bytes:
+    return FastJSONResponse(orders).body
+
+
+def best_secs(func, orders: list[SalesOrderHeader]) -> float:
+    """
+    Best time over REPEATS runs
+    """
+    return min(timeit.repeat(lambda: func(orders), number=1, repeat=REPEATS))
+
+
+def main() -> None:
+    print(
+        f"{'Orders':>10}{'response_model (ms)':>22}{'TypeAdapter (ms)':>18}"
+        f"{'FastJSONResponse (ms)':>24}{'speedup':>10}"
+    )
+    for count in ROW_COUNTS:
+        orders = SalesOrderHeader.from_rows(rows(order_row, count))
+        slow = best_secs(response_model, orders)
+        adapted = best_secs(type_adapter, orders)
+        fast = best_secs(fast_response, orders)
+        print(f"{count:>10,}{slow * 1e3:>22.1f}{adapted * 1e3:>18.1f}{fast * 1e3:>24.1f}{slow / fast:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
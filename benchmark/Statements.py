@@ -0,0 +1,61 @@
+import timeit
+
+from benchmark.Sample import customer_row, order_row, product_row, rows
+from db.model.ProductionProduct import ProductionProduct
+from db.model.SalesCustomer import SalesCustomer
+from db.model.SalesOrderHeader import SalesOrderHeader
+
+"""
+Per-write cost of building an INSERT and a partial UPDATE by reflecting
+over model_fields (as the handlers used to) against picking the model's
+precompiled statements. Only statement building is timed, not the query
+
+Usage:
+    python -m benchmark.Statements
+"""
+ROWS = 1_000
+REPEATS = 5
+
+MODELS = (
+    (SalesOrderHeader, order_row),
+    (SalesCustomer, customer_row),
+    (ProductionProduct, product_row),
+)
+
+
+def reflected(table) -> None:
+    table_name = table.table_name()
+    cols = [field[0] for field in table.model_fields.items()]
+    data = [getattr(table, field[0]) for field in table.model_fields.items()]
+    f"INSERT INTO {table_name} ({','.join(cols)}) VALUES ({','.join(['%s'] * len(data))})"
+
+    cols = [field[0] for field in table.model_fields.items() if getattr(table, field[0]) is not None]
+    data = [getattr(table, field[0]) for field in table.model_fields.items() if getattr(table, field[0]) is not None]
+    data.append(1)
+    f"UPDATE {table_name} SET {', '.join(f'{col} = %s' for col in cols)} WHERE {table.primary_key_name()} = %s"
+
+
+def precompiled(table) -> None:
+    statements = table.statements()
+    statements.insert, statements.insert_row(table)
+    statements.update_row(table, 1)
+
+
+def per_row_secs(func, tables: list) -> float:
+    """
+    Best per-row time over REPEATS runs
+    """
+    return min(timeit.repeat(lambda: [func(table) for table in tables], number=1, repeat=REPEATS)) / len(tables)
+
+
+def main() -> None:
+    print(f"{'Model':<20}{'reflected (us)':>16}{'precompiled (us)':>18}{'speedup':>10}")
+    for model, factory in MODELS:
+        tables = model.from_rows(rows(factory, ROWS))
+        before = per_row_secs(reflected, tables)
+        after = per_row_secs(precompiled, tables)
+        print(f"{model.__name__:<20}{before * 1e6:>16.2f}{after * 1e6:>18.2f}{before / after:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
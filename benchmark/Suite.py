@@ -0,0 +1,236 @@
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import timeit
+from datetime import datetime
+from typing import Callable
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from benchmark.Sample import customer_row, order_row, product_row, rows
+from benchmark.Statements import precompiled, reflected
+from db.DataType import DataType
+from db.model.ProductionProduct import ProductionProduct
+from db.model.SalesCustomer import SalesCustomer
+from db.model.SalesOrderHeader import SalesOrderHeader
+from util.Json import dumps
+from util.Repeat import repeat
+
+"""
+Micro-benchmarks of the hot paths of the DB and model layers. Every case
+is timed in-process with no database, so results only depend on the code
+and the machine.
+
+Results are written as JSON, and can be compared against a stored baseline
+(taken on the same machine) to catch regressions. The comparison exits
+with status 1 if any case got slower by more than the threshold
+
+Usage:
+    python -m benchmark.Suite --save-baseline
+    python -m benchmark.Suite --output results.json
+    python -m benchmark.Suite --filter json --sizes 1,1000
+"""
+BASELINE_PATH = "benchmark/baseline.json"
+DEFAULT_SIZES = (1, 100, 10_000, 100_000)
+DEFAULT_THRESHOLD = 0.10
+REPEATS = 5
+MIN_RUN_SECS = 0.2
+
+MODELS = (
+    (SalesOrderHeader, order_row),
+    (SalesCustomer, customer_row),
+    (ProductionProduct, product_row),
+)
+
+
+class FakeCursor:
+    """
+    Cursor returning prebuilt rows, so DataType dispatch is timed without a driver
+    """
+
+    def __init__(self, data: list[dict]) -> None:
+        self._data = data
+
+    def fetchone(self) -> dict:
+        return self._data[0]
+
+    def fetchall(self) -> list[dict]:
+        return self._data
+
+    def fetchmany(self) -> list[dict]:
+        return self._data
+
+
+def datatype_cases() -> dict[str, Callable]:
+    cursor = FakeCursor(rows(order_row, 100))
+    count_cursor = FakeCursor([{"COUNT(*)": 31465}])
+    return {
+        "datatype.record": lambda: DataType.RECORD.get_data(cursor),
+        "datatype.records": lambda: DataType.RECORDS.get_data(cursor),
+        "datatype.column": lambda: DataType.COLUMN.get_data(cursor),
+        "datatype.count": lambda: DataType.COUNT.get_data(count_cursor),
+        "datatype.batch": lambda: DataType.BATCH.get_data(cursor),
+    }
+
+
+def statement_cases() -> dict[str, Callable]:
+    cases = {}
+    for model, factory in MODELS:
+        table = model.from_row(factory(0))
+        cases[f"statements.reflected.{model.__name__}"] = lambda table=table: reflected(table)
+        cases[f"statements.precompiled.{model.__name__}"] = lambda table=table: precompiled(table)
+    return cases
+
+
+def model_cases() -> dict[str, Callable]:
+    cases = {}
+    for model, factory in MODELS:
+        row = factory(0)
+        cases[f"model.validate.{model.__name__}"] = lambda model=model, row=row: model(**row)
+        cases[f"model.from_row.{model.__name__}"] = lambda model=model, row=row: model.from_row(row)
+        cases[f"model.model_dump.{model.__name__}"] = (
+            lambda table=model.from_row(row): table.model_dump(mode="json")
+        )
+    return cases
+
+
+def repeat_cases() -> dict[str, Callable]:
+    def plain() -> int:
+        return 1
+
+    repeated = repeat(retries=3)(plain)
+    return {
+        "repeat.plain": plain,
+        "repeat.wrapped": repeated,
+    }
+
+
+def json_cases(sizes: tuple[int, ...]) -> dict[str, Callable]:
+    """
+    Serialising a response of orders, the way FastAPI does for a
+    response_model (dump to python, then json.dumps), the way it does for
+    a returned list with no response_model (jsonable_encoder), through
+    pydantic's own JSON serializer, and through FastJSONResponse (orjson)
+    """
+    adapter = TypeAdapter(list[SalesOrderHeader])
+    cases = {}
+    for size in sizes:
+        orders = SalesOrderHeader.from_rows(rows(order_row, size))
+        cases[f"json.response_model.{size}"] = (
+            lambda orders=orders: json.dumps(adapter.dump_python(orders, mode="json")).encode()
+        )
+        cases[f"json.jsonable_encoder.{size}"] = (
+            lambda orders=orders: json.dumps(jsonable_encoder(orders)).encode()
+        )
+        cases[f"json.dump_json.{size}"] = lambda orders=orders: adapter.dump_json(orders)
+        cases[f"json.orjson.{size}"] = lambda orders=orders: dumps(orders)
+    return cases
+
+
+def time_case(func: Callable) -> dict[str, float]:
+    """
+    Times a case over REPEATS runs of at least MIN_RUN_SECS each
+
+    Returns:
+        dict: Best and median time per call in microseconds, and calls per run
+    """
+    timer = timeit.Timer(func)
+    number, elapsed = timer.autorange()
+    if elapsed < MIN_RUN_SECS:
+        number = max(int(number * MIN_RUN_SECS / max(elapsed, 1e-9)), 1)
+    runs = [elapsed / number * 1e6 for elapsed in timer.repeat(repeat=REPEATS, number=number)]
+    return {"best_us": min(runs), "median_us": statistics.median(runs), "number": number}
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(name_filter: str | None, sizes: tuple[int, ...]) -> dict[str, any]:
+    cases = datatype_cases() | statement_cases() | model_cases() | repeat_cases() | json_cases(sizes)
+    results = {}
+    for name, func in cases.items():
+        if name_filter and name_filter not in name:
+            continue
+        results[name] = time_case(func)
+        print(f"{name:<45}{results[name]['best_us']:>14.2f} us")
+
+    return {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+        },
+        "results": results,
+    }
+
+
+def compare(current: dict[str, any], baseline: dict[str, any], threshold: float) -> list[str]:
+    """
+    Prints every case's change against the baseline
+
+    Returns:
+        list[str]: Cases that got slower by more than the threshold
+    """
+    regressions = []
+    print(f"\n{'Case':<45}{'baseline (us)':>14}{'current (us)':>14}{'change':>10}")
+    for name, result in current["results"].items():
+        before = baseline["results"].get(name)
+        if before is None:
+            continue
+        change = result["best_us"] / before["best_us"] - 1
+        flag = ""
+        if change > threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<45}{before['best_us']:>14.2f}{result['best_us']:>14.2f}{change:>+10.1%}{flag}")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Micro-benchmarks of the DB and model layers")
+    parser.add_argument("--output", help="Write results to this JSON file")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Baseline JSON to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="Store the results as the baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Allowed slowdown, 0.1 = 10%%")
+    parser.add_argument("--filter", help="Only run cases whose name contains this")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)), help="Order counts for json cases")
+    args = parser.parse_args()
+
+    current = run(args.filter, tuple(int(size) for size in args.sizes.split(",")))
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(current, file, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as file:
+            json.dump(current, file, indent=2)
+        print(f"\nSaved baseline to {args.baseline}")
+        return
+
+    try:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+    except FileNotFoundError:
+        print(f"\nNo baseline at {args.baseline}, run with --save-baseline to store one")
+        return
+
+    regressions = compare(current, baseline, args.threshold)
+    if regressions:
+        print(f"\n{len(regressions)} case(s) regressed by more than {args.threshold:.0%}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
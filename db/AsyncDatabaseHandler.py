@@ -0,0 +1,604 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from functools import wraps
+from contextvars import ContextVar
+from typing import AsyncIterator, Awaitable, Callable, Iterable
+
+from util.Singleton import singleton
+from .BaseDatabaseHandler import BaseDatabaseHandler
+from .Config import (
+    POOL_MIN_SIZE, POOL_MAX_SIZE, POOL_TIMEOUT_SECS, STREAM_BATCH_SIZE, BULK_DELETE_BATCH_SIZE,
+    GROUP_COMMIT_ENABLED, GROUP_COMMIT_MAX_BATCH, GROUP_COMMIT_DELAY_SECS,
+)
+from .ConnectionPool import PoolTimeoutError, TransactionLostError
+from .DataType import DataType
+from .GroupCommit import GroupCommitter, is_write
+from .IdAllocator import RESERVE_SQL, RESERVED_SQL, SEQUENCE_TABLE_DDL
+from .backend.Backend import Backend
+
+from db.model.base.Table import Table
+from util.Metrics import METRICS
+from util.Resilience import CircuitBreaker, resilient
+
+logger = logging.getLogger(__name__)
+
+
+@singleton
+class AsyncDatabaseHandler(BaseDatabaseHandler):
+    """
+    Async Database Handler
+
+    The asyncio counterpart to DatabaseHandler, backed by the backend's async
+    pool (aiomysql for MySQL). Statements are built and bulk writes are
+    chunked by BaseDatabaseHandler, which this handler runs on the event loop.
+    Every method that touches the database is awaitable, so an in-flight
+    query never ties up a threadpool worker
+
+    The pool is created on first use, as it has to be bound to the running
+    event loop
+
+    This class is a singleton, to prevent the creation of multiple pools
+    """
+
+    def __init__(
+            self,
+            min_pool_size: int = POOL_MIN_SIZE,
+            max_pool_size: int = POOL_MAX_SIZE,
+            backend: Backend | None = None
+    ) -> None:
+        super().__init__(min_pool_size, max_pool_size, backend)
+        self.pool = None
+        self._connect_lock: asyncio.Lock | None = None
+        self._current: ContextVar[any] = ContextVar("async_db_connection", default=None)
+        self._last_row_id: ContextVar[int | None] = ContextVar("async_db_last_row_id", default=None)
+        self._transaction: ContextVar[any] = ContextVar("async_db_transaction", default=None)
+        self._after_commit: ContextVar[list | None] = ContextVar("async_db_after_commit", default=None)
+        self.breaker = CircuitBreaker("async")
+        self.group_commit = GroupCommitter(
+            self, GROUP_COMMIT_MAX_BATCH, GROUP_COMMIT_DELAY_SECS
+        ) if GROUP_COMMIT_ENABLED else None
+
+    @staticmethod
+    def with_commit(func):
+        """
+        with_commit decorator
+
+        Async counterpart to DatabaseHandler.with_commit
+
+        When group commit is on, writes outside a transaction are handed to
+        the group committer, so no connection is held for the unit of work
+
+        :param func:
+        :return:
+        """
+
+        @wraps(func)
+        async def inner(self, *args, **kwargs):
+            if self._grouping():
+                return await func(self, *args, **kwargs)
+            async with self.connection():
+                return await func(self, *args, **kwargs)
+
+        return inner
+
+    @property
+    def cxn(self):
+        """
+        The connection checked out by the current task, if any
+        """
+        return self._current.get()
+
+    async def connect(self) -> None:
+        """
+        Opens the connection pool
+        """
+        if self.pool is not None:
+            return
+
+        if self._connect_lock is None:
+            self._connect_lock = asyncio.Lock()
+
+        async with self._connect_lock:
+            if self.pool is None:
+                logger.warning(f"Connecting to the database (async, {self.backend.name})")
+                self.pool = await self.backend.create_pool(self.min_pool_size, self.max_pool_size)
+
+    @asynccontextmanager
+    async def connection(self, independent: bool = False) -> AsyncIterator[any]:
+        """
+        Checks a connection out of the pool for a unit of work, returning it
+        once the block exits. Nested calls within the same task reuse the
+        connection that is already checked out
+
+        NOTE: Tasks spawned inside the block inherit the connection, so they
+        must not query it concurrently
+
+        Args:
+            independent (bool, optional): Check out a separate connection, even if this
+            task already has one, so its statements are not part of the current
+            transaction. Defaults to False.
+
+        Usage:
+            async with ADB.connection():
+                await ADB.execute(...)
+                await ADB.record(...)
+        """
+        cxn = self._current.get()
+        if cxn is not None and not independent:
+            if cxn.closed:
+                if self._transaction.get() is cxn:
+                    # Reconnecting would silently drop the statements already run
+                    raise TransactionLostError("Connection lost during a transaction")
+                await cxn.ping(reconnect=True)
+            yield cxn
+            return
+
+        cxn = await self._acquire()
+        token = self._current.set(cxn)
+        try:
+            yield cxn
+        finally:
+            self._current.reset(token)
+            if not cxn.closed and cxn.get_transaction_status():
+                # Only reachable if a transaction was begun but never ended.
+                # aiomysql would otherwise close the connection on release
+                await self._end_transaction(cxn, commit=False)
+            self.pool.release(cxn)
+
+    @asynccontextmanager
+    async def transaction(self, independent: bool = False) -> AsyncIterator[any]:
+        """
+        Opens a transaction that every operation in the block shares. It is
+        committed exactly once when the block exits, or rolled back if the
+        block raises. Transactions opened inside another join the outer one
+
+        Args:
+            independent (bool, optional): Run on a separate connection, committing
+            on its own regardless of the current transaction. Defaults to False.
+
+        Usage:
+            async with ADB.transaction():
+                await table.ainsert()
+                await other_table.aupdate(primary_key_value)
+        """
+        async with self.connection(independent) as cxn:
+            if self._transaction.get() is cxn:
+                yield cxn
+                return
+
+            await cxn.begin()
+            callbacks = []
+            token = self._transaction.set(cxn)
+            callbacks_token = self._after_commit.set(callbacks)
+            try:
+                yield cxn
+            except BaseException:
+                await self._end_transaction(cxn, commit=False)
+                raise
+            finally:
+                self._after_commit.reset(callbacks_token)
+                self._transaction.reset(token)
+            await self._end_transaction(cxn, commit=True)
+            self._run_after_commit(callbacks)
+
+    def after_commit(self, callback: Callable[[], None]) -> None:
+        """
+        Async counterpart to DatabaseHandler.after_commit, for the current task's transaction
+        """
+        callbacks = self._after_commit.get()
+        if callbacks is not None:
+            callbacks.append(callback)
+        else:
+            callback()
+
+    @staticmethod
+    def _run_after_commit(callbacks: list[Callable[[], None]]) -> None:
+        pending = callbacks[:]
+        callbacks.clear()
+        for callback in pending:
+            callback()
+
+    def _grouping(self) -> bool:
+        """
+        If writes should be handed to the group committer
+        """
+        return self.group_commit is not None and self._transaction.get() is None
+
+    def in_transaction(self) -> bool:
+        """
+        If the current task is inside a transaction
+        """
+        return self._transaction.get() is not None
+
+    async def _acquire(self):
+        self.breaker.raise_if_open()
+        await self.connect()
+        started = time.perf_counter()
+        try:
+            cxn = await asyncio.wait_for(self.pool.acquire(), POOL_TIMEOUT_SECS)
+        except asyncio.TimeoutError:
+            raise PoolTimeoutError(f"Timed out waiting for a database connection ({self.max_pool_size} in use)")
+        METRICS.pool_wait("async", time.perf_counter() - started)
+        return cxn
+
+    @staticmethod
+    async def _end_transaction(cxn, commit: bool) -> None:
+        """
+        Commits or rolls back the transaction of a connection
+        """
+        started = time.perf_counter()
+        try:
+            if commit:
+                logger.debug("Committing")
+                await cxn.commit()
+                METRICS.observe_statement("COMMIT", time.perf_counter() - started)
+                METRICS.commit("transaction")
+                return
+            logger.debug("Rolling back")
+            await cxn.rollback()
+            METRICS.observe_statement("ROLLBACK", time.perf_counter() - started)
+        except Exception as e:
+            logger.error(f"Failed to end transaction: {repr(e)}")
+            cxn.close()
+            if commit:
+                raise e
+
+    async def close(self, log: bool = True) -> None:
+        """
+        Closes the connection pool
+
+        Args:
+            log (bool, optional): Log events to logger. Defaults to True.
+        """
+        try:
+            if log:
+                logger.warning("Closing async connection pool")
+            if self.group_commit is not None:
+                await self.group_commit.close()
+            if self.pool is not None:
+                self.pool.close()
+                await self.pool.wait_closed()
+                self.pool = None
+            if log:
+                logger.info("Successfully closed")
+
+        except Exception:
+            logger.critical("Failed to close async connection pool")
+
+    async def commit(self) -> None:
+        """
+        Commits the current transaction early
+        """
+        async with self.connection() as cxn:
+            await self._end_transaction(cxn, commit=True)
+        self._run_after_commit(self._after_commit.get() or [])
+
+    async def rollback(self) -> None:
+        """
+        Rolls back the current transaction
+        """
+        async with self.connection() as cxn:
+            await self._end_transaction(cxn, commit=False)
+        (self._after_commit.get() or []).clear()
+
+    @resilient()
+    @with_commit
+    async def _get_data(self, data_type: DataType, command: str, values: tuple) -> None | list | int:
+        """
+        Gets data from the db dependent on the command and values and
+        returns an output based on the data type
+
+        Args:
+            data_type (DataType): Data type
+            command (str): SQL command
+            values (tuple): Values for command substitution
+
+        Returns:
+            str: Database output
+        """
+        async with self.connection() as cxn:
+            async with cxn.cursor() as cur:
+                await self._execute(cur, command, values)
+                data = await data_type.aget_data(cur)
+                METRICS.observe_rows(command, data)
+                return data
+
+    @resilient()
+    async def tuples(self, command: str, *values) -> tuple[list[str], list[tuple]]:
+        """
+        Returns all db rows as tuples, along with the column names, so that
+        large results can be read without building a dict per row
+
+        Args:
+            command (str): SQL command
+            values (tuple): Command values
+
+        Returns:
+            tuple: Column names, and every row as a tuple in column order
+        """
+        async with self.connection() as cxn:
+            async with self.backend.async_cursor(cxn, tuples=True) as cur:
+                await self._execute(cur, command, values)
+                columns, rows = await DataType.TUPLES.aget_data(cur)
+        METRICS.observe_rows(command, rows)
+        return columns, rows
+
+    async def stream(self, command: str, *values, batch_size: int = STREAM_BATCH_SIZE) -> AsyncIterator[list[dict]]:
+        """
+        Streams rows through an unbuffered server-side cursor, `batch_size`
+        rows at a time, so that memory use stays constant regardless of
+        the size of the result
+
+        NOTE: The stream holds a dedicated connection until it is exhausted
+        or closed, as no other query can run on it in the meantime. Callers
+        that may stop early must close it with `await stream.aclose()` (or
+        contextlib.aclosing), rather than leave it to garbage collection
+
+        Args:
+            command (str): SQL command
+            values (tuple): Command values
+            batch_size (int, optional): Rows per batch. Defaults to STREAM_BATCH_SIZE.
+
+        Returns:
+            AsyncIterator[list[dict]]: Batches of rows
+        """
+        cxn = await self._acquire()
+        rows = 0
+        try:
+            async with self.backend.async_cursor(cxn, streaming=True) as cur:
+                cur.arraysize = batch_size
+                await self._execute(cur, command, values)
+                while batch := await DataType.BATCH.aget_data(cur):
+                    rows += len(batch)
+                    yield batch
+        finally:
+            self.pool.release(cxn)
+            METRICS.observe_rows(command, rows)
+
+    def last_row_id(self) -> int | None:
+        """
+        Retrieves the row ID of the most
+        recent cursor command in the current task
+
+        Returns:
+            int: Row ID
+        """
+        return self._last_row_id.get()
+
+    async def ensure_indexes(self, table: Table) -> None:
+        """
+        Async counterpart to DatabaseHandler.ensure_indexes
+        """
+        table_name = table.table_name()
+        for index_name, cols in table.indexes().items():
+            if not await self.count(self.backend.index_exists_sql, table_name, index_name):
+                await self.execute(self._create_index_sql(table_name, index_name, cols))
+
+    async def existing_values(self, table: Table, col: str, values: Iterable) -> dict[any, any]:
+        """
+        Async counterpart to DatabaseHandler.existing_values
+        """
+        found = {}
+        for command, chunk in self._existing_queries(table, col, values):
+            self._add_existing(found, table, col, await self.records(command, *chunk))
+        return found
+
+    @with_commit
+    async def insert(self, table: Table, with_commit: bool = True) -> Table:
+        """
+        Async counterpart to DatabaseHandler.insert
+        """
+        statements = table.statements()
+        await self.execute(statements.insert, statements.insert_row(table))
+        return table
+
+    @with_commit
+    async def delete(self, table: Table, with_commit: bool = True) -> bool:
+        """
+        Async counterpart to DatabaseHandler.delete
+        """
+        return bool(await self.execute(table.statements().delete_by_id, (table.get_primary_key(),)))
+
+    @with_commit
+    async def update(
+            self,
+            table: Table,
+            primary_key_value: int,
+            with_commit: bool = True,
+            current: Table | None = None,
+            read_back: bool = True
+    ) -> Table | None:
+        """
+        Async counterpart to DatabaseHandler.update
+        """
+        statements = table.statements()
+        command, data = statements.update_row(table, primary_key_value)
+        if not await self.execute(command, data):
+            return None
+        if current is None and read_back:
+            return table.from_row(await self.record(statements.select_by_id, primary_key_value))
+        return self._updated_row(table, primary_key_value, current)
+
+    async def bulk_insert(self, tables: list[Table]) -> list[Table]:
+        """
+        Async counterpart to DatabaseHandler.bulk_insert
+        """
+        if not tables:
+            return []
+
+        table = self._bulk_insert_table(tables)
+        self._set_primary_keys(tables, await self.get_next_id(table, len(tables)))
+        async with self.transaction():
+            for rows in self._insert_chunks(table, tables):
+                await self.executemany(table.statements().insert, rows)
+        return tables
+
+    async def bulk_update(self, table: type[Table], updates: dict[any, Table]) -> set:
+        """
+        Async counterpart to DatabaseHandler.bulk_update
+        """
+        if not updates:
+            return set()
+
+        async with self.transaction():
+            found = set(await self.existing_values(table, table.primary_key_name(), updates))
+            for command, values in self._update_statements(table, updates, found):
+                await self.execute(command, values)
+        return found
+
+    async def bulk_delete(
+            self,
+            table: type[Table],
+            primary_key_values: list,
+            dependents: tuple[tuple[str, str], ...] = (),
+            return_rows: bool = False,
+            before_delete: Callable[[list], Awaitable[None]] | None = None,
+            unless_referenced_by: tuple[tuple[str, str], ...] = ()
+    ) -> tuple[list, list[dict]]:
+        """
+        Async counterpart to DatabaseHandler.bulk_delete. before_delete is awaited
+        """
+        self._check_bulk_delete(dependents, unless_referenced_by)
+        statements = table.statements()
+        primary_key_name = table.primary_key_name()
+        deleted, rows = [], []
+        for chunk in self._chunks(list(dict.fromkeys(primary_key_values)), BULK_DELETE_BATCH_SIZE):
+            async with self.transaction():
+                # One SELECT finds which keys exist, reading the rows if they are returned
+                chunk_rows = []
+                if return_rows:
+                    chunk_rows = await self.records(statements.select_by_ids(len(chunk)), *chunk) or []
+                    chunk = [row[primary_key_name] for row in chunk_rows]
+                else:
+                    chunk = list(await self.existing_values(table, primary_key_name, chunk))
+                if not chunk:
+                    continue
+
+                if before_delete is not None:
+                    await before_delete(chunk)
+                *dependent_commands, command = self._delete_statements(
+                    table, chunk, dependents, unless_referenced_by
+                )
+                for dependent_command in dependent_commands:
+                    await self.execute(dependent_command, chunk)
+                if await self.execute(command, chunk) < len(chunk):
+                    # Only referenced rows are left
+                    kept = await self.existing_values(table, primary_key_name, chunk)
+                    chunk = [primary_key_value for primary_key_value in chunk if primary_key_value not in kept]
+                    chunk_rows = [row for row in chunk_rows if row[primary_key_name] not in kept]
+            deleted.extend(chunk)
+            rows.extend(chunk_rows)
+
+        return deleted, rows
+
+    async def get_next_id(self, table: Table, count: int = 1) -> int:
+        """
+        Allocates the next primary key ID(s) of a table from the
+        in-memory block, reserving a new block when it runs out
+
+        Args:
+            table (Table): Db table
+            count (int, optional): Amount of contiguous IDs to allocate. Defaults to 1.
+
+        Returns:
+            int: The first allocated ID
+        """
+        return await self.ids.aallocate(table.table_name(), count, lambda size: self._reserve_ids(table, size))
+
+    async def _reserve_ids(self, table: Table, size: int) -> int:
+        """
+        Async counterpart to DatabaseHandler._reserve_ids
+        """
+        async with self.connection(independent=True):
+            if not self._sequence_ready:
+                await self.execute(SEQUENCE_TABLE_DDL)
+                self._sequence_ready = True
+
+            # DDL implicitly commits, so the transaction only begins after it
+            async with self.transaction():
+                table_name = table.table_name()
+                if not await self.execute(RESERVE_SQL, size, table_name):
+                    await self.execute(self._seed_sql(table), table_name)
+                    await self.execute(RESERVE_SQL, size, table_name)
+
+                next_id = await self.count(RESERVED_SQL, table_name)
+        return next_id - size
+
+    @resilient(writes=True)
+    @with_commit
+    async def execute(self, command: str, *values) -> int:
+        """
+        Executes a database command
+
+        Args:
+            command (str): SQL command
+        """
+        if self._grouping() and is_write(command):
+            return await self.group_commit.execute(command, values)
+
+        async with self.connection() as cxn:
+            async with cxn.cursor() as cur:
+                result = await self._execute(cur, command, values)
+            if self._transaction.get() is not cxn and is_write(command):
+                METRICS.commit("autocommit")
+            return result
+
+    async def executemany(self, command: str, rows: list[tuple]) -> int:
+        """
+        Executes a database command once per row of values
+        NOTE: This is not retried, as a partially applied batch
+        must be rolled back rather than repeated
+
+        Args:
+            command (str): SQL command
+            rows (list[tuple]): Values for each execution
+        """
+        async with self.connection() as cxn:
+            async with cxn.cursor() as cur:
+                started = time.perf_counter()
+                try:
+                    result = await cur.executemany(command, rows)
+                except self.backend.async_connection_errors as e:
+                    cxn.close()
+                    raise e
+                finally:
+                    METRICS.observe_statement(command, time.perf_counter() - started)
+            if self._transaction.get() is not cxn and is_write(command):
+                METRICS.commit("autocommit")
+            return result
+
+    async def _execute(self, cur, command: str, values: tuple) -> int:
+        # Removes nested tuples
+        if len(values) == 1:
+            values = values[0]
+        values = values if values != ((),) else None
+
+        started = time.perf_counter()
+        try:
+            result = await cur.execute(command, values)
+            self._last_row_id.set(cur.lastrowid)
+            return result
+        except self.backend.async_connection_errors as e:
+            # A dropped connection is closed so that the pool discards it
+            # on release, and a fresh one is opened on the next checkout
+            cur.connection.close()
+            raise e
+        finally:
+            METRICS.observe_statement(command, time.perf_counter() - started)
+
+
+ADB = AsyncDatabaseHandler()
+
+
+async def request_transaction() -> AsyncIterator[any]:
+    """
+    FastAPI dependency that runs a whole request in one transaction,
+    committed once the endpoint returns, or rolled back if it raises
+
+    Usage:
+        @router.put("/{id}", dependencies=[Depends(request_transaction)])
+    """
+    async with ADB.transaction() as cxn:
+        yield cxn
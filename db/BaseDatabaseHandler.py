@@ -0,0 +1,254 @@
+import logging
+from typing import Iterable, Iterator
+
+from .Config import UNIQUE_CHECK_BATCH_SIZE, BULK_UPDATE_BATCH_SIZE, ID_BLOCK_SIZE
+from .DataType import DataType
+from .IdAllocator import IdAllocator, SEED_SQL
+from .backend.Backend import Backend, load_backend
+
+from db.model.base.Table import Table
+
+logger = logging.getLogger(__name__)
+
+
+class BaseDatabaseHandler:
+    """
+    Base Database Handler
+
+    Everything DatabaseHandler and AsyncDatabaseHandler have in common:
+    building statements, chunking bulk writes and turning rows into models.
+
+    The helpers here never touch a connection. Each handler runs the
+    statements they build with its own execute, inside its own connections
+    and transactions, so only acquiring connections and executing
+    statements differ between the two handlers
+
+    Subclasses implement _get_data
+    """
+
+    def __init__(
+            self,
+            min_pool_size: int,
+            max_pool_size: int,
+            backend: Backend | None = None
+    ) -> None:
+        self.backend = backend or load_backend()
+        self.min_pool_size = min_pool_size
+        self.max_pool_size = max_pool_size
+        self.ids = IdAllocator(ID_BLOCK_SIZE)
+        self._sequence_ready = False
+
+    def _get_data(self, data_type: DataType, command: str, values: tuple):
+        raise NotImplementedError("Subclass must implement _get_data")
+
+    def record(self, command: str, *values) -> dict[str, any]:
+        """
+        Returns a single db row
+
+        Args:
+            command (str): SQL command
+            values (tuple): Command values
+
+        Returns:
+            dict: Single row command output
+        """
+        return self._get_data(DataType.RECORD, command, values)
+
+    def records(self, command: str, *values) -> list[any]:
+        """
+        Returns all db rows
+
+        Args:
+            command (str): SQL command
+            values (tuple): Command values
+
+        Returns:
+            list(dict): All command output rows
+        """
+        return self._get_data(DataType.RECORDS, command, values)
+
+    def column(self, command: str, *values) -> int:
+        """
+        Returns a column of data.
+        NOTE: A column must be specified
+
+        Args:
+            command (str): SQL command
+            values (tuple): Command values
+
+        Returns:
+            tuple: Single column command output
+        """
+        return self._get_data(DataType.COLUMN, command, values)
+
+    def count(self, command: str, *values) -> int:
+        """
+        Returns the first value in the first row of data
+        Used to get the COUNT value
+
+        Args:
+            command (str): SQL command
+            values (tuple): Command values
+
+        Returns:
+            int: Count output
+        """
+        return self._get_data(DataType.COUNT, command, values)
+
+    def is_in_db(self, table: Table, col: str, value: str) -> dict[str, any]:
+        """
+        Checks if a value is in a database table and column
+
+        Args:
+            value (str): Value to look for
+            col (str): Column to search
+            table (Table): Table to search
+
+        Returns:
+            dict: The first found record if present
+            None: If no record is present
+        """
+        return self.record(table.statements().select_by[col], value)
+
+    @staticmethod
+    def _chunks(values: list, size: int) -> Iterator[list]:
+        """
+        Splits values into consecutive chunks of at most size values
+        """
+        for start in range(0, len(values), size):
+            yield values[start:start + size]
+
+    @staticmethod
+    def _create_index_sql(table_name: str, index_name: str, cols: tuple[str, ...]) -> str:
+        logger.warning(f"Creating index {index_name} on {table_name}")
+        # NOTE: SQL injection is not possible as the f string values
+        # are constants set in code. No user inputs are inserted
+        return f"CREATE INDEX {index_name} ON {table_name} ({', '.join(cols)})"
+
+    @classmethod
+    def _existing_queries(cls, table: Table, col: str, values: Iterable) -> Iterator[tuple[str, list]]:
+        """
+        Builds the projected SELECT ... IN of every UNIQUE_CHECK_BATCH_SIZE
+        values, along with the values it is run with
+        """
+        statements = table.statements()
+        for chunk in cls._chunks(list(dict.fromkeys(values)), UNIQUE_CHECK_BATCH_SIZE):
+            yield statements.select_existing(col, len(chunk)), chunk
+
+    @staticmethod
+    def _add_existing(found: dict, table: Table, col: str, rows: list[dict] | None) -> None:
+        """
+        Adds the rows read by an _existing_queries query to found, as
+        the primary key of the row holding each value
+        """
+        for row in rows or ():
+            found[row[col]] = row[table.primary_key_name()]
+
+    @staticmethod
+    def _updated_row(table: Table, primary_key_value: int, current: Table | None) -> Table:
+        """
+        Builds the row after an update from the row before it, or from only
+        the updated columns when it isn't known
+        """
+        changes = {col: value for col, value in table.__dict__.items() if value is not None}
+        changes.setdefault(table.statements().primary_key_name, primary_key_value)
+        return (current if current is not None else table).model_copy(update=changes)
+
+    @staticmethod
+    def _bulk_insert_table(tables: list[Table]) -> type[Table]:
+        """
+        Returns the table every row of a bulk insert belongs to
+
+        Raises:
+            ValueError: If the rows belong to different tables
+        """
+        table = type(tables[0])
+        if any(type(row) is not table for row in tables):
+            raise ValueError("All rows in a bulk insert must belong to the same table")
+        return table
+
+    @staticmethod
+    def _set_primary_keys(tables: list[Table], next_id: int) -> None:
+        """
+        Gives the rows of a bulk insert the block of primary keys starting at next_id
+        """
+        for offset, row in enumerate(tables):
+            row.set_primary_key(next_id + offset)
+
+    def _insert_chunks(self, table: type[Table], tables: list[Table]) -> Iterator[list[tuple]]:
+        """
+        Builds the rows of each executemany of a bulk insert. They are sent in
+        chunks, so that no single statement outgrows what the backend accepts
+        """
+        statements = table.statements()
+        for chunk in self._chunks(tables, self.backend.bulk_insert_rows):
+            yield [statements.insert_row(row) for row in chunk]
+
+    @classmethod
+    def _update_statements(
+            cls,
+            table: type[Table],
+            updates: dict[any, Table],
+            found: set
+    ) -> Iterator[tuple[str, list]]:
+        """
+        Groups the rows that exist by the set of columns they change, and
+        builds the UPDATE ... CASE statements writing every group
+        BULK_UPDATE_BATCH_SIZE rows at a time
+        """
+        statements = table.statements()
+        groups: dict[tuple[str, ...], list[tuple[any, Table]]] = {}
+        for primary_key_value, row in updates.items():
+            cols = statements.changed_cols(row)
+            if primary_key_value in found and cols:
+                groups.setdefault(cols, []).append((primary_key_value, row))
+
+        for cols, rows in groups.items():
+            for chunk in cls._chunks(rows, BULK_UPDATE_BATCH_SIZE):
+                yield statements.update_many(cols, len(chunk)), statements.update_many_values(cols, chunk)
+
+    @staticmethod
+    def _check_bulk_delete(
+            dependents: tuple[tuple[str, str], ...],
+            unless_referenced_by: tuple[tuple[str, str], ...]
+    ) -> None:
+        if dependents and unless_referenced_by:
+            raise ValueError("Dependents can't be deleted along with rows that may be kept")
+
+    @staticmethod
+    def _delete_statements(
+            table: type[Table],
+            chunk: list,
+            dependents: tuple[tuple[str, str], ...],
+            unless_referenced_by: tuple[tuple[str, str], ...]
+    ) -> list[str]:
+        """
+        Builds the statements deleting a chunk of rows, run with the chunk's
+        keys: the DELETEs of their dependents, then of the rows themselves.
+        Rows that are still referenced by unless_referenced_by are kept by
+        the last DELETE
+        """
+        placeholders = ",".join(["%s"] * len(chunk))
+        primary_key_name = table.primary_key_name()
+        # NOTE: SQL injection is not possible as the f string values
+        # are constants set in code. No user inputs are inserted
+        commands = [
+            f"DELETE FROM {dependent_table} WHERE {col} IN ({placeholders})" for dependent_table, col in dependents
+        ]
+        command = table.statements().delete_by_ids(len(chunk))
+        for referencing_table, col in unless_referenced_by:
+            command += (
+                f" AND NOT EXISTS (SELECT 1 FROM {referencing_table} "
+                f"WHERE {referencing_table}.{col} = {table.table_name()}.{primary_key_name})"
+            )
+        return commands + [command]
+
+    def _seed_sql(self, table: Table) -> str:
+        """
+        Builds the statement seeding a table's sequence from MAX(primary key)
+        """
+        return SEED_SQL.format(
+            insert_ignore=self.backend.insert_ignore,
+            primary_key_name=table.primary_key_name(),
+            table_name=table.table_name()
+        )
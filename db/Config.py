@@ -0,0 +1,88 @@
+"""
+Since environment variables aren't allowed for this assignment,
+I have stored these in constants. In a real world situation, i would
+add these to a .env file
+"""
+# Storage backend, either "mysql" or "sqlite". SQLite keeps the database in
+# SQLITE_PATH, see benchmark/Seed.py to generate data for it
+DB_BACKEND = "mysql"
+SQLITE_PATH = "adventureworks.sqlite3"
+
+DB_HOST = "localhost"
+DB_PORT = 3306
+DB_USER = "root"
+DB_PASSWORD = "aaaaaa"
+DB_DATABASE = "adventureworks2019"
+
+POOL_MIN_SIZE = 2
+POOL_MAX_SIZE = 10
+POOL_TIMEOUT_SECS = 30.0
+POOL_HEALTH_CHECK_SECS = 30.0
+
+ID_BLOCK_SIZE = 100
+
+POPULARITY_RECONCILE_SECS = 300.0
+
+# Each worker opens its pool, creates missing indexes, builds the popularity
+# index and caches its WARMUP_HOT_PRODUCTS best selling products (0 disables)
+# once it has started, and only reports ready on /health/ready afterwards.
+# Failed warm-ups are retried every WARMUP_RETRY_SECS. Logging is configured
+# at LOG_LEVEL as the worker starts, rather than when the app is imported
+WARMUP_HOT_PRODUCTS = 100
+WARMUP_RETRY_SECS = 5.0
+LOG_LEVEL = "INFO"
+
+ENTITY_CACHE_SIZE = 10_000
+ENTITY_CACHE_TTL_SECS = 60.0
+
+STREAM_BATCH_SIZE = 500
+
+# Rows set by each UPDATE ... CASE statement of a bulk update
+BULK_UPDATE_BATCH_SIZE = 500
+# Rows removed per transaction by a bulk delete
+BULK_DELETE_BATCH_SIZE = 1_000
+
+# Uniqueness checks look values up UNIQUE_CHECK_BATCH_SIZE at a time. With
+# UNIQUE_FILTER_ENABLED, each checked column's values are also kept in a
+# bloom filter, so values that are definitely new skip the database. Only
+# enable it if this process is the only writer of those columns, as the
+# filter does not see values written elsewhere
+UNIQUE_CHECK_BATCH_SIZE = 500
+UNIQUE_FILTER_ENABLED = False
+UNIQUE_FILTER_ERROR_RATE = 0.01
+
+# Group commit batches the writes of concurrent requests made outside an
+# explicit transaction into one transaction, committed (and fsynced) once
+GROUP_COMMIT_ENABLED = False
+GROUP_COMMIT_MAX_BATCH = 64
+GROUP_COMMIT_DELAY_SECS = 0.002
+
+# Query and request instrumentation, served by /metrics. Statements slower
+# than SLOW_QUERY_SECS are logged (None disables the slow query log)
+METRICS_ENABLED = True
+SLOW_QUERY_SECS = 0.5
+
+# On-demand profiling of single requests, see util/Profiler.py. Requests
+# sending PROFILE_TOKEN in an X-Profile header are profiled, as is one in
+# every PROFILE_SAMPLE_EVERY requests (0 disables sampling). The last
+# PROFILE_KEEP profiles are served by /admin/profiles, which also requires
+# the token. Modes are "cprofile" (deterministic) or "sample" (statistical)
+PROFILE_TOKEN = None
+PROFILE_SAMPLE_EVERY = 0
+PROFILE_KEEP = 20
+PROFILE_MODE = "cprofile"
+PROFILE_SAMPLE_INTERVAL_SECS = 0.001
+
+# Transient database errors are retried up to RETRY_ATTEMPTS times in total,
+# with jittered exponential backoff. Retries are capped process-wide at
+# RETRY_BUDGET_RATIO of calls (plus RETRY_BUDGET_MIN_PER_SEC), so a failing
+# database isn't hit by a multiple of its usual load. After
+# CIRCUIT_FAILURE_THRESHOLD consecutive failures a handler's circuit opens,
+# failing requests fast with a 503 for CIRCUIT_RESET_SECS
+RETRY_ATTEMPTS = 3
+RETRY_DELAY_SECS = 0.05
+RETRY_MAX_DELAY_SECS = 1.0
+RETRY_BUDGET_RATIO = 0.1
+RETRY_BUDGET_MIN_PER_SEC = 5.0
+CIRCUIT_FAILURE_THRESHOLD = 5
+CIRCUIT_RESET_SECS = 10.0
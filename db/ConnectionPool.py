@@ -0,0 +1,229 @@
+import logging
+import threading
+import time
+from collections import deque
+from typing import Callable
+
+from util.Resilience import DatabaseUnavailableError
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeoutError(DatabaseUnavailableError, TimeoutError):
+    """
+    Raised when no connection could be checked out of the pool in time
+    """
+
+
+class TransactionLostError(DatabaseUnavailableError):
+    """
+    Raised when the connection of an open transaction is lost, as running the
+    rest of the transaction on a new connection would apply only part of it
+    """
+
+
+class PooledConnection:
+    """
+    Pooled Connection
+
+    A single database connection and its cursor, along with the bookkeeping
+    the pool needs to decide whether the connection is still healthy
+    """
+
+    def __init__(self, backend) -> None:
+        self._backend = backend
+        self.cxn = None
+        self.cur = None
+        self.last_used = 0.0
+        self.broken = False
+        self.in_transaction = False
+        # Callbacks to run once the current transaction commits
+        self.after_commit: list[Callable[[], None]] = []
+        self.open()
+
+    def open(self) -> None:
+        """
+        Opens | Reopens the underlying connection and cursor
+        """
+        self.close()
+        self.cxn = self._backend.connect()
+        self.cur = self._backend.cursor(self.cxn)
+        self.last_used = time.monotonic()
+        self.broken = False
+        self.in_transaction = False
+        self.after_commit = []
+
+    def close(self) -> None:
+        """
+        Closes the connection, ignoring any errors from an already dead connection
+        """
+        for closeable in (self.cur, self.cxn):
+            if closeable is None:
+                continue
+            try:
+                closeable.close()
+            except Exception as e:
+                logger.debug(f"Ignoring error on close: {repr(e)}")
+        self.cur = None
+        self.cxn = None
+
+    def is_alive(self) -> bool:
+        """
+        Pings the server to check if the connection can still be used
+        """
+        try:
+            self._backend.ping(self.cxn)
+            return True
+        except Exception as e:
+            logger.warning(f"Pooled connection failed health check: {repr(e)}")
+            return False
+
+
+class ConnectionPool:
+    """
+    Connection Pool
+
+    A thread-safe pool of database connections. Connections are checked out
+    for a unit of work and checked back in once it has finished, so that
+    concurrent requests never share a cursor.
+
+    Idle connections are health checked when they are checked out, and are
+    transparently reopened if the server has dropped them
+    """
+
+    def __init__(
+            self,
+            backend,
+            min_size: int = 2,
+            max_size: int = 10,
+            timeout_secs: float = 30.0,
+            health_check_secs: float = 30.0,
+    ) -> None:
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError(f"Invalid pool size: min={min_size}, max={max_size}")
+
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout_secs = timeout_secs
+        self.health_check_secs = health_check_secs
+
+        self._backend = backend
+        self._idle: deque[PooledConnection] = deque()
+        self._size = 0
+        self._closed = False
+        self._condition = threading.Condition()
+
+        for _ in range(min_size):
+            self._idle.append(self._open())
+            self._size += 1
+
+    @property
+    def size(self) -> int:
+        """
+        Total amount of connections, both idle and checked out
+        """
+        return self._size
+
+    @property
+    def idle(self) -> int:
+        """
+        Amount of connections waiting in the pool
+        """
+        return len(self._idle)
+
+    def _open(self) -> PooledConnection:
+        logger.warning("Opening a pooled connection to the database")
+        return PooledConnection(self._backend)
+
+    def checkout(self) -> PooledConnection:
+        """
+        Checks a connection out of the pool, opening a new one if the pool
+        has not reached its max size
+
+        Raises:
+            PoolTimeoutError: If no connection was available within the timeout
+        """
+        deadline = time.monotonic() + self.timeout_secs
+        with self._condition:
+            while True:
+                if self._closed:
+                    raise RuntimeError("Connection pool is closed")
+                if self._idle:
+                    # LIFO keeps the most recently used (and most likely alive)
+                    # connections busy, letting the rest go idle
+                    pooled = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    pooled = None
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolTimeoutError(
+                        f"Timed out waiting for a database connection ({self.max_size} in use)"
+                    )
+                self._condition.wait(remaining)
+
+        if pooled is None:
+            try:
+                return self._open()
+            except Exception:
+                self._release_slot()
+                raise
+
+        try:
+            self._ensure_alive(pooled)
+        except Exception:
+            pooled.close()
+            self._release_slot()
+            raise
+        return pooled
+
+    def checkin(self, pooled: PooledConnection) -> None:
+        """
+        Returns a connection to the pool. Broken connections are discarded
+        """
+        pooled.last_used = time.monotonic()
+        if pooled.broken or self._closed:
+            pooled.close()
+            self._release_slot()
+            return
+
+        with self._condition:
+            self._idle.append(pooled)
+            self._condition.notify()
+
+    def revive(self, pooled: PooledConnection) -> None:
+        """
+        Reconnects a checked out connection in place
+        """
+        logger.warning("Reconnecting a broken pooled connection")
+        pooled.open()
+
+    def close(self) -> None:
+        """
+        Closes every idle connection. Checked out connections are closed
+        as soon as they are checked back in
+        """
+        with self._condition:
+            self._closed = True
+            while self._idle:
+                self._idle.pop().close()
+                self._size -= 1
+            self._condition.notify_all()
+
+    def _ensure_alive(self, pooled: PooledConnection) -> None:
+        """
+        Health checks connections that have been idle for a while,
+        reconnecting them on checkout if needed
+        """
+        if pooled.broken:
+            self.revive(pooled)
+        elif time.monotonic() - pooled.last_used > self.health_check_secs and not pooled.is_alive():
+            self.revive(pooled)
+
+    def _release_slot(self) -> None:
+        with self._condition:
+            self._size -= 1
+            self._condition.notify()
@@ -1,7 +1,6 @@
 from enum import Enum
 
 import logging
-from MySQLdb.cursors import DictCursor
 
 logger = logging.getLogger(__name__)
 
@@ -18,8 +17,10 @@ class DataType(Enum):
     RECORDS = 1,
     COLUMN = 2,
     COUNT = 3
+    BATCH = 4
+    TUPLES = 5
 
-    def get_data(self, cursor: DictCursor) -> None | list | int:
+    def get_data(self, cursor) -> None | list | int:
         match self:
             case self.RECORD:
                 return cursor.fetchone()
@@ -35,5 +36,39 @@ class DataType(Enum):
 
             case self.COUNT:
                 return int((list(cursor.fetchone().values())[0]))
+            case self.BATCH:
+                # Reads the next `cursor.arraysize` rows, used to stream
+                # from unbuffered cursors
+                return cursor.fetchmany()
+            case self.TUPLES:
+                # Column names, and every row as a tuple, from a tuple cursor
+                return [column[0] for column in cursor.description], cursor.fetchall()
+            case _:
+                raise KeyError("Invalid data type")
+
+    async def aget_data(self, cursor) -> None | list | int:
+        """
+        Async counterpart to get_data for async cursors, whose
+        fetch methods are awaitable
+        """
+        match self:
+            case self.RECORD:
+                return await cursor.fetchone()
+            case self.RECORDS:
+                return await cursor.fetchall()
+            case self.COLUMN:
+                response_dict = await cursor.fetchone()
+                items = list(response_dict.items())
+                if not items:
+                    return None
+                else:
+                    return items[0]
+
+            case self.COUNT:
+                return int((list((await cursor.fetchone()).values())[0]))
+            case self.BATCH:
+                return await cursor.fetchmany()
+            case self.TUPLES:
+                return [column[0] for column in cursor.description], await cursor.fetchall()
             case _:
                 raise KeyError("Invalid data type")
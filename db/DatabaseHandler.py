@@ -1,113 +1,278 @@
 import logging
-from dataclasses import fields
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from typing import Any, Callable, Iterable, Iterator
 
 from util.Singleton import singleton
+from .BaseDatabaseHandler import BaseDatabaseHandler
+from .Config import (
+    POOL_MIN_SIZE, POOL_MAX_SIZE, POOL_TIMEOUT_SECS, POOL_HEALTH_CHECK_SECS, STREAM_BATCH_SIZE, BULK_DELETE_BATCH_SIZE,
+)
+from .ConnectionPool import ConnectionPool, PooledConnection, TransactionLostError
 from .DataType import DataType
+from .GroupCommit import is_write
+from .IdAllocator import RESERVE_SQL, RESERVED_SQL, SEQUENCE_TABLE_DDL
 
-from MySQLdb.cursors import Cursor, DictCursor
-from MySQLdb import Connection
-from MySQLdb import Connect
+from .backend.Backend import Backend
 
 from db.model.base.Table import Table
-from util.Repeat import repeat
+from util.Metrics import METRICS
+from util.Resilience import CircuitBreaker, resilient
 
 logger = logging.getLogger(__name__)
-logging.basicConfig(level=logging.DEBUG)
-
-"""
-Since environment variables aren't allowed for this assignment,
-I have stored these in constants. In a real world situation, i would
-add these to a .env file
-"""
-DB_HOST = "localhost"
-DB_USER = "root"
-DB_PASSWORD = "aaaaaa"
-DB_DATABASE = "adventureworks2019"
 
 
 @singleton
-class DatabaseHandler:
+class DatabaseHandler(BaseDatabaseHandler):
     """
     Database Handler
 
     A custom database handler to handle all aspects of a database required for
-    this assignment
+    this assignment. Statements are built and bulk writes are chunked by
+    BaseDatabaseHandler, which this handler runs synchronously
 
-    This class is a singleton, to prevent the creation of multiple cursors
+    This class is a singleton, to prevent the creation of multiple pools.
+    Every unit of work runs on a connection checked out of the pool, so
+    concurrent requests never share a cursor
     """
 
-    def __init__(self) -> None:
-        self.cur = None
-        self.cxn = None
-        self.connect()
+    def __init__(
+            self,
+            min_pool_size: int = POOL_MIN_SIZE,
+            max_pool_size: int = POOL_MAX_SIZE,
+            backend: Backend | None = None
+    ) -> None:
+        super().__init__(min_pool_size, max_pool_size, backend)
+        self.pool: ConnectionPool | None = None
+        self.breaker = CircuitBreaker("sync")
+        self._local = threading.local()
 
     @staticmethod
     def with_commit(func) -> None:
         """
         with_commit decorator
 
-        Auto-commits any function run with this decorator
+        Runs any function with this decorator as a single unit of work on one
+        connection. Connections autocommit, so each statement is committed by
+        the server as it runs, without a separate COMMIT round trip. Inside
+        DB.transaction() nothing is committed until the transaction ends
 
         :param func:
         :return:
         """
 
+        @wraps(func)
         def inner(self, *args, **kwargs):
-            if kwargs.get("with_commit", True):
-                self.commit()
-            return func(self, *args, **kwargs)
+            with self.connection():
+                return func(self, *args, **kwargs)
 
         return inner
 
     @property
-    def cursor(self) -> DictCursor:
+    def cxn(self):
+        """
+        The connection checked out by the current thread, if any
+        """
+        pooled = getattr(self._local, "pooled", None)
+        return pooled.cxn if pooled is not None else None
+
+    @property
+    def cur(self):
+        """
+        The cursor checked out by the current thread, if any
+        """
+        pooled = getattr(self._local, "pooled", None)
+        return pooled.cur if pooled is not None else None
+
+    @property
+    def cursor(self):
         """
         Property to retrieve the cursor when used outside the
         database handler
+        NOTE: This is only set inside a `with DB.connection()` block
         :return: DictCursor
         """
         return self.cur
 
     def connect(self) -> None:
         """
-        Connects | Reconnects to the database
-        """
-        if self.cur is None or self.cxn is None:
-            logger.warning("Connecting to the database")
-            self.cxn: Connection = Connect(
-                host=DB_HOST,
-                user=DB_USER,
-                password=DB_PASSWORD,
-                database=DB_DATABASE
+        Opens the connection pool. This happens on first use, so importing
+        the handler never connects
+        """
+        if self.pool is None:
+            logger.warning(f"Connecting to the database ({self.backend.name})")
+            self.pool = ConnectionPool(
+                self.backend,
+                min_size=self.min_pool_size,
+                max_size=self.max_pool_size,
+                timeout_secs=POOL_TIMEOUT_SECS,
+                health_check_secs=POOL_HEALTH_CHECK_SECS,
             )
-            self.cur: Cursor = self.cxn.cursor(cursorclass=DictCursor)
 
-    @with_commit
+    @contextmanager
+    def connection(self, independent: bool = False) -> Iterator[PooledConnection]:
+        """
+        Checks a connection out of the pool for a unit of work, returning it
+        once the block exits. Nested calls on the same thread reuse the
+        connection that is already checked out
+
+        Args:
+            independent (bool, optional): Check out a separate connection, even if this
+            thread already has one, so its statements are not part of the current
+            transaction. Defaults to False.
+
+        Usage:
+            with DB.connection():
+                DB.execute(...)
+                DB.record(...)
+        """
+        outer = getattr(self._local, "pooled", None)
+        if outer is not None and not independent:
+            if outer.broken:
+                if outer.in_transaction:
+                    # Reconnecting would silently drop the statements already run
+                    raise TransactionLostError("Connection lost during a transaction")
+                self.pool.revive(outer)
+            yield outer
+            return
+
+        pooled = self._checkout()
+        self._local.pooled = pooled
+        try:
+            yield pooled
+        finally:
+            if pooled.in_transaction:
+                # Only reachable if a transaction was begun but never ended
+                self._end_transaction(pooled, commit=False)
+            self._local.pooled = outer
+            self.pool.checkin(pooled)
+
+    def _checkout(self) -> PooledConnection:
+        self.breaker.raise_if_open()
+        self.connect()
+        started = time.perf_counter()
+        pooled = self.pool.checkout()
+        METRICS.pool_wait("sync", time.perf_counter() - started)
+        return pooled
+
+    def in_transaction(self) -> bool:
+        """
+        If the current thread is inside a transaction
+        """
+        pooled = getattr(self._local, "pooled", None)
+        return pooled is not None and pooled.in_transaction
+
+    def after_commit(self, callback: Callable[[], None]) -> None:
+        """
+        Runs a callback once the current transaction commits, or straight
+        away outside a transaction. Used for in-memory state that must only
+        reflect committed writes. Callbacks of a transaction that is rolled
+        back are dropped
+
+        Args:
+            callback (Callable): Function taking no arguments
+        """
+        pooled = getattr(self._local, "pooled", None)
+        if pooled is not None and pooled.in_transaction:
+            pooled.after_commit.append(callback)
+        else:
+            callback()
+
+    @contextmanager
+    def transaction(self, independent: bool = False) -> Iterator[PooledConnection]:
+        """
+        Opens a transaction that every operation in the block shares. It is
+        committed exactly once when the block exits, or rolled back if the
+        block raises. Transactions opened inside another join the outer one
+
+        Args:
+            independent (bool, optional): Run on a separate connection, committing
+            on its own regardless of the current transaction. Defaults to False.
+
+        Usage:
+            with DB.transaction():
+                table.insert()
+                other_table.update(primary_key_value)
+        """
+        with self.connection(independent) as pooled:
+            if pooled.in_transaction:
+                yield pooled
+                return
+
+            self.backend.begin(pooled.cxn)
+            pooled.in_transaction = True
+            try:
+                yield pooled
+            except BaseException:
+                self._end_transaction(pooled, commit=False)
+                raise
+            self._end_transaction(pooled, commit=True)
+
+    @staticmethod
+    def _end_transaction(pooled: PooledConnection, commit: bool) -> None:
+        """
+        Commits or rolls back the transaction of a connection, running its
+        after_commit callbacks once it has committed
+        """
+        pooled.in_transaction = False
+        callbacks, pooled.after_commit = pooled.after_commit, []
+        started = time.perf_counter()
+        try:
+            if commit:
+                logger.debug("Committing")
+                pooled.cxn.commit()
+                METRICS.observe_statement("COMMIT", time.perf_counter() - started)
+                METRICS.commit("transaction")
+            else:
+                logger.debug("Rolling back")
+                pooled.cxn.rollback()
+                METRICS.observe_statement("ROLLBACK", time.perf_counter() - started)
+        except Exception as e:
+            logger.error(f"Failed to end transaction: {repr(e)}")
+            pooled.broken = True
+            if commit:
+                raise e
+            return
+        if commit:
+            for callback in callbacks:
+                callback()
+
     def close(self, log: bool = True) -> None:
         """
-        Closes the database connection
+        Closes the connection pool
 
         Args:
             log (bool, optional): Log events to logger. Defaults to True.
         """
         try:
             if log:
-                logger.warning("Closing connection")
-            self.cur.close()
-            self.cxn.close()
+                logger.warning("Closing connection pool")
+            if self.pool is not None:
+                self.pool.close()
+                self.pool = None
             if log:
                 logger.info("Successfully closed")
 
         except Exception:
-            logger.critical("Failed to close connection")
+            logger.critical("Failed to close connection pool")
 
     def commit(self) -> None:
         """
-        Commits to the db
+        Commits the current transaction early
         """
-        logger.debug("Committing")
-        self.cxn.commit()
+        with self.connection() as pooled:
+            self._end_transaction(pooled, commit=True)
 
+    def rollback(self) -> None:
+        """
+        Rolls back the current transaction
+        """
+        with self.connection() as pooled:
+            self._end_transaction(pooled, commit=False)
+
+    @resilient()
     def _get_data(self, data_type: DataType, command: str, values: tuple) -> None | list | int:
         """
         Gets data from the db dependent on the command and values and
@@ -121,211 +286,406 @@ class DatabaseHandler:
         Returns:
             str: Database output
         """
-        self.execute(command, values)
-        return data_type.get_data(self.cur)
+        with self.connection() as pooled:
+            # Not through execute, which would retry on top of this method's retries
+            self._execute(pooled, command, values)
+            data = data_type.get_data(pooled.cur)
+            METRICS.observe_rows(command, data)
+            return data
 
-    def record(self, command: str, *values) -> dict[str, any]:
+    @resilient()
+    def tuples(self, command: str, *values) -> tuple[list[str], list[tuple]]:
         """
-        Returns a single db row
+        Returns all db rows as tuples, along with the column names, so that
+        large results can be read without building a dict per row
 
         Args:
             command (str): SQL command
             values (tuple): Command values
 
         Returns:
-            tuple: Single row command output
-        """
-        return self._get_data(DataType.RECORD, command, values)
-
-    def records(self, command: str, *values) -> list[any]:
-        """
-        Returns all db rows
+            tuple: Column names, and every row as a tuple in column order
+        """
+        with self.connection() as pooled:
+            cur = self.backend.cursor(pooled.cxn, tuples=True)
+            started = time.perf_counter()
+            try:
+                cur.execute(command, values or None)
+                columns, rows = DataType.TUPLES.get_data(cur)
+            except self.backend.connection_errors:
+                pooled.broken = True
+                raise
+            finally:
+                cur.close()
+                METRICS.observe_statement(command, time.perf_counter() - started)
+        METRICS.observe_rows(command, rows)
+        return columns, rows
+
+    def stream(self, command: str, *values, batch_size: int = STREAM_BATCH_SIZE) -> Iterator[list[dict]]:
+        """
+        Streams rows through an unbuffered server-side cursor, `batch_size`
+        rows at a time, so that memory use stays constant regardless of
+        the size of the result
+
+        NOTE: The stream holds a dedicated connection until it is exhausted
+        or closed, as no other query can run on it in the meantime
 
         Args:
             command (str): SQL command
             values (tuple): Command values
+            batch_size (int, optional): Rows per batch. Defaults to STREAM_BATCH_SIZE.
 
         Returns:
-            list(tuple): All command output rows
+            Iterator[list[dict]]: Batches of rows
         """
-        return self._get_data(DataType.RECORDS, command, values)
+        pooled = self._checkout()
+        cur = self.backend.cursor(pooled.cxn, streaming=True)
+        rows = 0
+        started = time.perf_counter()
+        try:
+            cur.arraysize = batch_size
+            cur.execute(command, values or None)
+            while batch := DataType.BATCH.get_data(cur):
+                rows += len(batch)
+                yield batch
+        except self.backend.connection_errors:
+            pooled.broken = True
+            raise
+        finally:
+            cur.close()
+            self.pool.checkin(pooled)
+            # Includes the time the consumer spent between batches
+            METRICS.observe_statement(command, time.perf_counter() - started)
+            METRICS.observe_rows(command, rows)
 
-    def column(self, command: str, *values) -> int:
+    def last_row_id(self) -> None:
         """
-        Returns a column of data.
-        NOTE: A column must be specified
-
-        Args:
-            command (str): SQL command
-            values (tuple): Command values
+        Retrieves the row ID of the most
+        recent cursor command
 
         Returns:
-            tuple: Single column command output
+            int: Row ID
         """
-        return self._get_data(DataType.COLUMN, command, values)
+        return getattr(self._local, "last_row_id", None)
 
-    def count(self, command: str, *values) -> int:
+    def ensure_indexes(self, table: Table) -> None:
         """
-        Returns the first value in the first row of data
-        Used to get the COUNT value
+        Creates any index declared by a table that is missing from the database
 
         Args:
-            command (str): SQL command
-            values (tuple): Command values
-
-        Returns:
-            int: Count output
+            table (Table): Db table
         """
-        return self._get_data(DataType.COUNT, command, values)
+        table_name = table.table_name()
+        for index_name, cols in table.indexes().items():
+            if not self.count(self.backend.index_exists_sql, table_name, index_name):
+                self.execute(self._create_index_sql(table_name, index_name, cols))
 
-    def last_row_id(self) -> None:
+    def existing_values(self, table: Table, col: str, values: Iterable) -> dict[any, any]:
         """
-        Retrieves the row ID of the most
-        recent cursor command
+        Finds which of the given values are already in a column, with one
+        projected SELECT ... IN per UNIQUE_CHECK_BATCH_SIZE values
+
+        Args:
+            table (Table): Table to search
+            col (str): Column to search
+            values (Iterable): Values to look for
 
         Returns:
-            int: Row ID
+            dict: Primary key of the row holding each value that was found
         """
-        return self.cur.lastrowid
+        found = {}
+        for command, chunk in self._existing_queries(table, col, values):
+            self._add_existing(found, table, col, self.records(command, *chunk))
+        return found
 
-    def is_in_db(self, table: Table, col: str, value: str) -> dict[str, any]:
+    @with_commit
+    def insert(self, table: Table, with_commit: bool = True) -> Table:
         """
-        Checks if a value is in a database table and column
+        Inserts data into the database
 
         Args:
-            value (str): Value to look for
-            col (str): Column to search
-            table (Table): Table to search
+            table (Table): Db table
+            with_commit (bool, optional): Should a commit occur after this insertion.
+            Defaults to True. Ignored inside DB.transaction().
 
         Returns:
-            list[tuple]: The first found record if present
-            None: If no record is present
+            Table: The inserted row
         """
-        table_name = table.table_name()
-        # NOTE: SQL injection is not possible as the f string values
-        # are constants set in code. No user inputs are inserted
-        command = f"SELECT * FROM {table_name} WHERE {col} = %s"
-        return self.record(command, value)
+        statements = table.statements()
+        self.execute(statements.insert, statements.insert_row(table))
+        # Every column, defaults included, was given to the INSERT, so
+        # the model already is the row that was written
+        return table
 
     @with_commit
-    def insert(self, table: Table, with_commit: bool = True) -> tuple | None:
+    def delete(self, table: Table, with_commit: bool = True) -> bool:
         """
-        Inserts data into the database
+        Deletes data from the database
 
         Args:
             table (Table): Db table
             with_commit (bool, optional): Should a commit occur after this insertion.
-            Defaults to True.
-        """
-        table_name = table.table_name()
-        cols = [field[0] for field in table.model_fields.items()]
-        data = [getattr(table, field[0]) for field in table.model_fields.items()]
-        cols_str = ",".join(cols)
-
-        # Workaround to add nulls to the database
-        data_str = ",".join(["?" if x is not None else "NULL" for x in data])
+            Defaults to True. Ignored inside DB.transaction().
 
-        # NOTE: SQL injection is not possible as the f string values
-        # are constants set in code. No user inputs are inserted
-        self.execute(
-            f"INSERT INTO {table_name} ({cols_str}) VALUES ({data_str})",
-            *data
-        )
-        return table.get_from_id(self.cur.lastrowid)
+        Returns:
+            bool: If the row existed
+        """
+        return bool(self.execute(table.statements().delete_by_id, (table.get_primary_key(),)))
 
     @with_commit
-    def delete(self, table: Table, with_commit: bool = True) -> bool:
+    def update(
+            self,
+            table: Table,
+            primary_key_value: int,
+            with_commit: bool = True,
+            current: Table | None = None,
+            read_back: bool = True
+    ) -> Table | None:
         """
-        Deletes data from the database
+        Updates data in the database
+
+        The updated row is built from the row as it was before the update,
+        when it is known, rather than read back
 
         Args:
             table (Table): Db table
+            primary_key_value (int): Primary key of the row to update
             with_commit (bool, optional): Should a commit occur after this insertion.
-            Defaults to True.
+            Defaults to True. Ignored inside DB.transaction().
+            current (Table, optional): The row before the update. Defaults to None.
+            read_back (bool, optional): Read the row back when it isn't known. Defaults to True.
+
+        Returns:
+            Table | None: The updated row, or None if there is no row with the primary
+            key. If the row is neither known nor read back, only the updated columns
         """
-        table_name = table.table_name()
-        primary_key_name = table.primary_key_name()
-        primary_key_value = table.get_primary_key()
+        statements = table.statements()
+        command, data = statements.update_row(table, primary_key_value)
+        if not self.execute(command, data):
+            return None
+        if current is None and read_back:
+            return table.from_row(self.record(statements.select_by_id, primary_key_value))
+        return self._updated_row(table, primary_key_value, current)
 
-        try:
-            # NOTE: SQL injection is not possible as the f string values
-            # are constants set in code. No user inputs are inserted
-            self.execute(
-                f"DELETE FROM {table_name} WHERE {primary_key_name} = %s", (primary_key_value,)
-            )
-            return True
-        except Exception as e:
-            logger.error(repr(e))
-            return False
-        finally:
-            # Ensures that a commit takes place regardless of the error
-            self.commit()
+    def bulk_insert(self, tables: list[Table]) -> list[Table]:
+        """
+        Inserts many rows of the same table in a single transaction
 
-    @with_commit
-    def update(self, table: Table, primary_key_value: int, with_commit: bool = True) -> tuple:
+        Primary keys are allocated as one block, and the rows are written by
+        executemany in chunks of the backend's bulk_insert_rows (MySQLdb sends
+        each chunk as one multi-row INSERT).
+        A single commit takes place at the end, and the whole batch is
+        rolled back if any row fails
+
+        Args:
+            tables (list[Table]): Validated rows of a single db table
+
+        Returns:
+            list[Table]: The inserted rows, with their primary keys set
         """
-        Inserts data into the database
+        if not tables:
+            return []
+
+        table = self._bulk_insert_table(tables)
+        self._set_primary_keys(tables, self.get_next_id(table, len(tables)))
+        with self.transaction():
+            for rows in self._insert_chunks(table, tables):
+                self.executemany(table.statements().insert, rows)
+        return tables
+
+    def bulk_update(self, table: type[Table], updates: dict[any, Table]) -> set:
+        """
+        Updates many rows of the same table in a single transaction, each to
+        its own non-null columns
+
+        Rows are grouped by the set of columns they change, and every group
+        is written by set-based UPDATE ... CASE statements of up to
+        BULK_UPDATE_BATCH_SIZE rows, rather than one UPDATE per row.
+        A single commit takes place at the end, and the whole batch is
+        rolled back if any statement fails
 
         Args:
             table (Table): Db table
-            :param table:
-            :param primary_key_value:
-            :param with_commit: (bool, optional): Should a commit occur after this insertion.
-            Defaults to True.
+            updates (dict): Validated rows holding the new values, by primary key
+
+        Returns:
+            set: Primary keys of the rows that exist, and were updated if they
+            changed any column
+        """
+        if not updates:
+            return set()
+
+        with self.transaction():
+            found = set(self.existing_values(table, table.primary_key_name(), updates))
+            for command, values in self._update_statements(table, updates, found):
+                self.execute(command, values)
+        return found
+
+    def bulk_delete(
+            self,
+            table: type[Table],
+            primary_key_values: list,
+            dependents: tuple[tuple[str, str], ...] = (),
+            return_rows: bool = False,
+            before_delete: Callable[[list], Any] | None = None,
+            unless_referenced_by: tuple[tuple[str, str], ...] = ()
+    ) -> tuple[list, list[dict]]:
+        """
+        Deletes many rows of the same table by primary key, with set-based
+        DELETE ... WHERE pk IN (...) statements. Every chunk of
+        BULK_DELETE_BATCH_SIZE keys runs in its own transaction, so that no
+        transaction (or lock) grows with the size of the purge
+
+        NOTE: A failure rolls back its own chunk, but chunks that were
+        already committed stay deleted
+
+        Args:
+            table (Table): Db table
+            primary_key_values (list): Primary keys of the rows to delete
+            dependents (tuple, optional): (table name, column) of rows referencing the
+            primary key, which are deleted first in the same transaction. Defaults to ().
+            return_rows (bool, optional): Read the rows before deleting them. Defaults to False.
+            before_delete (Callable, optional): Called with the keys of each chunk that
+            exist, inside its transaction, before they are deleted. Defaults to None.
+            unless_referenced_by (tuple, optional): (table name, column) of rows referencing
+            the primary key. Rows that are still referenced are kept, which the DELETE
+            itself checks, so rows referenced while it runs are never deleted. Can't be
+            combined with dependents. Defaults to ().
+
+        Returns:
+            tuple: The keys that existed and were deleted, and the deleted rows if requested
         """
-        table_name = table.table_name()
+        self._check_bulk_delete(dependents, unless_referenced_by)
+        statements = table.statements()
         primary_key_name = table.primary_key_name()
+        deleted, rows = [], []
+        for chunk in self._chunks(list(dict.fromkeys(primary_key_values)), BULK_DELETE_BATCH_SIZE):
+            with self.transaction():
+                # One SELECT finds which keys exist, reading the rows if they are returned
+                chunk_rows = []
+                if return_rows:
+                    chunk_rows = self.records(statements.select_by_ids(len(chunk)), *chunk) or []
+                    chunk = [row[primary_key_name] for row in chunk_rows]
+                else:
+                    chunk = list(self.existing_values(table, primary_key_name, chunk))
+                if not chunk:
+                    continue
+
+                if before_delete is not None:
+                    before_delete(chunk)
+                *dependent_commands, command = self._delete_statements(
+                    table, chunk, dependents, unless_referenced_by
+                )
+                for dependent_command in dependent_commands:
+                    self.execute(dependent_command, chunk)
+                if self.execute(command, chunk) < len(chunk):
+                    # Only referenced rows are left
+                    kept = self.existing_values(table, primary_key_name, chunk)
+                    chunk = [primary_key_value for primary_key_value in chunk if primary_key_value not in kept]
+                    chunk_rows = [row for row in chunk_rows if row[primary_key_name] not in kept]
+            deleted.extend(chunk)
+            rows.extend(chunk_rows)
+
+        return deleted, rows
+
+    def get_next_id(self, table: Table, count: int = 1) -> int:
+        """
+        Allocates the next primary key ID(s) of a table from the
+        in-memory block, reserving a new block when it runs out
 
-        cols = [field[0] for field in table.model_fields.items() if getattr(table, field[0]) is not None] or []
-        data = [getattr(table, field[0]) for field in table.model_fields.items() if
-                getattr(table, field[0]) is not None] or []
-        data.append(primary_key_value)
-        clauses = [f"{col} = %s" for col in cols]
-        clauses_str = ", ".join(clauses)
-
-        # NOTE: SQL injection is not possible as the f string values
-        # are constants set in code. No user inputs are inserted
-        self.execute(
-            f"UPDATE {table_name} SET {clauses_str} WHERE {primary_key_name} = %s",
-            *data,
-        )
-
-        return table.create_update(
-            **self.record(
-                f"SELECT * FROM {table_name} WHERE {primary_key_name} = %s",
-                primary_key_value
-            )
-        )
+        Args:
+            table (Table): Db table
+            count (int, optional): Amount of contiguous IDs to allocate. Defaults to 1.
 
-    def get_next_id(self, table: Table) -> int:
-        primary_key_name = table.primary_key_name()
-        table_name = table.table_name()
-        print(primary_key_name, table_name)
-        return self.count(f"SELECT MAX({primary_key_name}) FROM {table_name}") + 1
+        Returns:
+            int: The first allocated ID
+        """
+        return self.ids.allocate(table.table_name(), count, lambda size: self._reserve_ids(table, size))
+
+    def _reserve_ids(self, table: Table, size: int) -> int:
+        """
+        Reserves a block of IDs in the sequence table, seeding the
+        table's sequence from MAX(primary key) the first time
+
+        The reservation runs on its own connection, so that rolling back the
+        caller's transaction never hands the same IDs out twice
+
+        Returns:
+            int: The first reserved ID
+        """
+        with self.connection(independent=True):
+            if not self._sequence_ready:
+                self.execute(SEQUENCE_TABLE_DDL)
+                self._sequence_ready = True
+
+            # DDL implicitly commits, so the transaction only begins after it
+            with self.transaction():
+                table_name = table.table_name()
+                if not self.execute(RESERVE_SQL, size, table_name):
+                    self.execute(self._seed_sql(table), table_name)
+                    self.execute(RESERVE_SQL, size, table_name)
 
-    @repeat(retries=3)
+                next_id = self.count(RESERVED_SQL, table_name)
+        return next_id - size
+
+    @resilient(writes=True)
     @with_commit
-    def execute(self, command: str, *values) -> None:
+    def execute(self, command: str, *values) -> int:
         """
         Executes a database command
 
         Args:
             command (str): SQL command
         Raises:
-            LookupError: If the max retries limit has exceeded
+            DatabaseUnavailableError: If the database could not be reached
+        """
+        with self.connection() as pooled:
+            result = self._execute(pooled, command, values)
+            if not pooled.in_transaction and is_write(command):
+                METRICS.commit("autocommit")
+            return result
+
+    def executemany(self, command: str, rows: list[tuple]) -> int:
         """
+        Executes a database command once per row of values
+        NOTE: This is not retried, as a partially applied batch
+        must be rolled back rather than repeated
+
+        Args:
+            command (str): SQL command
+            rows (list[tuple]): Values for each execution
+        """
+        with self.connection() as pooled:
+            started = time.perf_counter()
+            try:
+                result = pooled.cur.executemany(command, rows)
+                if not pooled.in_transaction and is_write(command):
+                    METRICS.commit("autocommit")
+                return result
+            except self.backend.connection_errors as e:
+                pooled.broken = True
+                raise e
+            finally:
+                METRICS.observe_statement(command, time.perf_counter() - started)
+
+    def _execute(self, pooled: PooledConnection, command: str, values: tuple) -> int:
         # Removes nested tuples
         if len(values) == 1:
             values = values[0]
         values = values if values != ((),) else None
 
+        started = time.perf_counter()
         try:
-            return self.cur.execute(command, values)
-        except Exception as e:
+            result = pooled.cur.execute(command, values)
+            self._local.last_row_id = pooled.cur.lastrowid
+            return result
+        except self.backend.connection_errors as e:
             # A typical error in MySql python is the connection
-            # expiring; this should fix it
-            self.connect()
+            # expiring; the connection is reopened before it is used again
+            pooled.broken = True
             raise e
+        finally:
+            METRICS.observe_statement(command, time.perf_counter() - started)
 
 
 DB = DatabaseHandler()
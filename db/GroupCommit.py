@@ -0,0 +1,170 @@
+import asyncio
+import logging
+import time
+
+from util.Metrics import METRICS
+from util.Resilience import DatabaseUnavailableError
+
+logger = logging.getLogger(__name__)
+
+WRITE_STATEMENTS = ("INSERT", "UPDATE", "DELETE", "REPLACE")
+
+
+class GroupCommitAbortedError(DatabaseUnavailableError):
+    """
+    Raised to the writers of a group commit batch that was rolled back, as
+    their writes were undone along with it. It is never retried, so the API
+    answers it with a 503 and the client decides whether to write again
+    """
+
+
+def is_write(command: str) -> bool:
+    """
+    Checks if an SQL command is a DML write that can join a group commit
+    """
+    return command.lstrip()[:7].upper().startswith(WRITE_STATEMENTS)
+
+
+class GroupCommitter:
+    """
+    Group Committer
+
+    Runs the writes of concurrent requests on one shared connection, inside
+    one transaction, and commits them together once `max_batch` writes have
+    queued up or `max_delay_secs` has passed since the first of them. Every
+    caller is only resumed once the commit covering its write has finished,
+    so a write is still durable by the time it returns, but the server only
+    has to flush its log once per batch instead of once per write.
+
+    NOTE: The batch shares one transaction, so a statement that raises
+    rolls back every write in it (a deadlock aborts the whole transaction,
+    even though the connection stays open). Every writer in the batch is
+    then failed with GroupCommitAbortedError, as is a failed commit
+    """
+
+    def __init__(self, handler, max_batch: int = 64, max_delay_secs: float = 0.002) -> None:
+        if max_batch < 1:
+            raise ValueError(f"Invalid group commit batch size: {max_batch}")
+        self.handler = handler
+        self.max_batch = max_batch
+        self.max_delay_secs = max_delay_secs
+        self._lock: asyncio.Lock | None = None
+        self._cxn = None
+        self._waiters: list[asyncio.Future] = []
+        self._flush_task: asyncio.Task | None = None
+
+    async def execute(self, command: str, values: tuple) -> int:
+        """
+        Runs a write in the current batch, returning once the batch has committed
+
+        Args:
+            command (str): SQL command
+            values (tuple): Values for command substitution
+
+        Returns:
+            int: Affected rows
+        """
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        async with self._lock:
+            if self._cxn is None:
+                self._cxn = await self.handler._acquire()
+                await self._cxn.begin()
+
+            try:
+                async with self._cxn.cursor() as cur:
+                    result = await self.handler._execute(cur, command, values)
+            except BaseException as e:
+                await self._abort(e)
+                if isinstance(e, Exception) and self.handler.backend.is_transient(e, write=True):
+                    # Retrying would have to run again in a transaction that is gone
+                    raise GroupCommitAbortedError(f"Group commit rolled back: {repr(e)}") from e
+                raise
+
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            if len(self._waiters) >= self.max_batch:
+                await self._flush()
+            elif self._flush_task is None:
+                self._flush_task = asyncio.create_task(self._flush_later())
+
+        await waiter
+        METRICS.commit("group")
+        return result
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self.max_delay_secs)
+        async with self._lock:
+            self._flush_task = None
+            await self._flush()
+
+    async def _flush(self) -> None:
+        """
+        Commits the current batch and resumes its writers
+        NOTE: Must be called while holding the lock
+        """
+        cxn, waiters = self._cxn, self._waiters
+        self._cxn, self._waiters = None, []
+        if cxn is None:
+            return
+
+        error = None
+        started = time.perf_counter()
+        try:
+            await cxn.commit()
+            METRICS.observe_statement("COMMIT", time.perf_counter() - started)
+            logger.debug(f"Group committed {len(waiters)} write(s)")
+        except Exception as e:
+            logger.error(f"Failed to group commit {len(waiters)} write(s): {repr(e)}")
+            cxn.close()
+            error = e
+        finally:
+            self.handler.pool.release(cxn)
+
+        for waiter in waiters:
+            if waiter.done():
+                continue
+            if error is None:
+                waiter.set_result(None)
+            else:
+                waiter.set_exception(GroupCommitAbortedError(f"Group commit failed: {repr(error)}"))
+
+    async def _abort(self, error: BaseException) -> None:
+        """
+        Rolls back the current batch after one of its statements raised, and
+        fails its writers
+        NOTE: Must be called while holding the lock
+        """
+        cxn, waiters = self._cxn, self._waiters
+        self._cxn, self._waiters = None, []
+        logger.error(f"Rolling back a group commit of {len(waiters)} write(s) after: {repr(error)}")
+        if not cxn.closed and isinstance(error, Exception):
+            started = time.perf_counter()
+            try:
+                await cxn.rollback()
+                METRICS.observe_statement("ROLLBACK", time.perf_counter() - started)
+            except Exception as e:
+                logger.error(f"Failed to roll back a group commit: {repr(e)}")
+                cxn.close()
+        elif not cxn.closed:
+            # A cancelled statement leaves the connection in an unknown state,
+            # and closing it rolls the transaction back on the server
+            cxn.close()
+        self.handler.pool.release(cxn)
+
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_exception(GroupCommitAbortedError(f"Group commit rolled back: {repr(error)}"))
+
+    async def close(self) -> None:
+        """
+        Commits any pending writes
+        """
+        if self._lock is None:
+            return
+        async with self._lock:
+            if self._flush_task is not None:
+                self._flush_task.cancel()
+                self._flush_task = None
+            await self._flush()
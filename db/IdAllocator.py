@@ -0,0 +1,129 @@
+import asyncio
+import logging
+import threading
+from typing import Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+"""
+The AdventureWorks2019 database has no AUTO_INCREMENT, so primary keys are
+handed out from the IdSequence table instead. Each row holds the next
+unreserved ID of a table; a block is reserved by an UPDATE and a read of
+the new value in one transaction, as the UPDATE locks the row until commit
+
+NOTE: SQL injection is not possible as the f string values
+are constants set in code. No user inputs are inserted
+"""
+SEQUENCE_TABLE = "IdSequence"
+SEQUENCE_TABLE_DDL = (
+    f"CREATE TABLE IF NOT EXISTS {SEQUENCE_TABLE} ("
+    "TableName VARCHAR(128) NOT NULL PRIMARY KEY, "
+    "NextID BIGINT NOT NULL"
+    ")"
+)
+RESERVE_SQL = f"UPDATE {SEQUENCE_TABLE} SET NextID = NextID + %s WHERE TableName = %s"
+RESERVED_SQL = f"SELECT NextID FROM {SEQUENCE_TABLE} WHERE TableName = %s"
+# Formatted with the backend's insert_ignore
+SEED_SQL = (
+    "{insert_ignore} INTO " + SEQUENCE_TABLE + " (TableName, NextID) "
+    "SELECT %s, COALESCE(MAX({primary_key_name}), 0) + 1 FROM {table_name}"
+)
+
+
+class IdBlock:
+    """
+    A contiguous range [next, end) of reserved primary keys
+    """
+
+    def __init__(self, start: int, end: int) -> None:
+        self.next = start
+        self.end = end
+
+    @property
+    def remaining(self) -> int:
+        return self.end - self.next
+
+
+class IdAllocator:
+    """
+    ID Allocator
+
+    Hands out primary keys from blocks reserved in the sequence table.
+    Only one query is made per block, so an allocation is usually
+    served from memory, and IDs stay unique across threads and workers
+    as every block is reserved atomically
+
+    NOTE: Every writer of a table must allocate through the sequence table,
+    otherwise the IDs it inserts may collide with a reserved block
+    """
+
+    def __init__(self, block_size: int = 100) -> None:
+        if block_size < 1:
+            raise ValueError(f"Invalid block size: {block_size}")
+        self.block_size = block_size
+        self._blocks: dict[str, IdBlock] = {}
+        self._lock = threading.Lock()
+        self._async_locks: dict[str, asyncio.Lock] = {}
+
+    def allocate(self, table_name: str, count: int, reserve: Callable[[int], int]) -> int:
+        """
+        Allocates `count` contiguous IDs, reserving a new block if needed
+
+        Args:
+            table_name (str): Table to allocate for
+            count (int): Amount of IDs to allocate
+            reserve (Callable): Reserves a block of the given size, returning its first ID
+
+        Returns:
+            int: The first allocated ID
+        """
+        with self._lock:
+            start = self._take(table_name, count)
+            if start is None:
+                size = self._reserve_size(count)
+                start = self._refill(table_name, count, reserve(size), size)
+            return start
+
+    async def aallocate(self, table_name: str, count: int, reserve: Callable[[int], Awaitable[int]]) -> int:
+        """
+        Async counterpart to allocate
+        """
+        start = self._take(table_name, count)
+        if start is not None:
+            return start
+
+        lock = self._async_locks.setdefault(table_name, asyncio.Lock())
+        async with lock:
+            # Another task may have refilled the block while this one waited
+            start = self._take(table_name, count)
+            if start is None:
+                size = self._reserve_size(count)
+                start = self._refill(table_name, count, await reserve(size), size)
+            return start
+
+    def reset(self, table_name: str | None = None) -> None:
+        """
+        Discards the reserved blocks of a table, or of every table
+        """
+        if table_name is None:
+            self._blocks.clear()
+        else:
+            self._blocks.pop(table_name, None)
+
+    def _take(self, table_name: str, count: int) -> int | None:
+        block = self._blocks.get(table_name)
+        if block is None or block.remaining < count:
+            return None
+        start = block.next
+        block.next += count
+        return start
+
+    def _refill(self, table_name: str, count: int, first: int, size: int) -> int:
+        logger.debug(f"Reserved IDs {first:,} - {first + size - 1:,} for {table_name}")
+        # Any IDs left in the previous block are abandoned, which leaves gaps
+        # but never duplicates
+        self._blocks[table_name] = IdBlock(first + count, first + size)
+        return first
+
+    def _reserve_size(self, count: int) -> int:
+        return max(self.block_size, count)
@@ -0,0 +1,199 @@
+import asyncio
+import heapq
+import logging
+from typing import Iterator
+from uuid import uuid4
+
+from util.Singleton import singleton
+from db.model.ProductionProduct import ProductionProduct
+
+logger = logging.getLogger(__name__)
+
+ORDER_DETAIL_TABLE = "Sales_SalesOrderDetail"
+
+# NOTE: SQL injection is not possible as the f string values
+# are constants set in code. No user inputs are inserted
+POPULARITY_SQL = (
+    f"SELECT p.ProductID, p.Name, p.ProductNumber, COUNT(s.ProductID) AS sales "
+    f"FROM {ProductionProduct.table_name()} p "
+    f"LEFT JOIN {ORDER_DETAIL_TABLE} s ON p.ProductID = s.ProductID "
+    f"GROUP BY p.ProductID"
+)
+ORDER_LINES_SQL = (
+    f"SELECT ProductID, COUNT(*) AS sales FROM {ORDER_DETAIL_TABLE} "
+    f"WHERE SalesOrderID = %s GROUP BY ProductID"
+)
+
+
+@singleton
+class PopularityIndex:
+    """
+    Popularity Index
+
+    A materialised count of order lines per product, so that the most popular
+    products can be served without aggregating the whole sales history.
+
+    It is built once at startup, kept up to date as products are added and
+    order lines are deleted through the API (once their transaction has
+    committed), and periodically reconciled against the database to pick up
+    writes made by other workers or outside the API
+
+    Every change bumps the index's version, which the ETag of the ranking is
+    built from, so clients can poll it without it being serialised again
+
+    NOTE: The index is only modified from the event loop, so no locking is needed
+    """
+
+    def __init__(self) -> None:
+        self._products: dict[int, tuple[str, str]] = {}
+        self._sales: dict[int, int] = {}
+        self._built = False
+        self._reconcile_task: asyncio.Task | None = None
+        # Versions are only comparable within one index, so every worker's
+        # index has its own ID
+        self.id = uuid4().hex
+        self.version = 0
+
+    @property
+    def is_built(self) -> bool:
+        return self._built
+
+    def _changed(self) -> None:
+        self.version += 1
+
+    async def build(self) -> None:
+        """
+        (Re)builds the index from the database
+        """
+        from db.AsyncDatabaseHandler import ADB
+        rows = await ADB.records(POPULARITY_SQL)
+        if rows is None:
+            logger.error("Failed to build the popularity index")
+            return
+
+        products = {row["ProductID"]: (row["Name"], row["ProductNumber"]) for row in rows}
+        sales = {row["ProductID"]: int(row["sales"]) for row in rows}
+        # Reconciling usually finds nothing new, which keeps clients' ETags valid
+        if products != self._products or sales != self._sales:
+            self._products, self._sales = products, sales
+            self._changed()
+        self._built = True
+        logger.info(f"Built popularity index for {len(self._products):,} products")
+
+    def start_reconciling(self, interval_secs: float) -> None:
+        """
+        Starts rebuilding the index every `interval_secs` in the background
+        """
+        if self._reconcile_task is None or self._reconcile_task.done():
+            self._reconcile_task = asyncio.create_task(self._reconcile_forever(interval_secs))
+
+    def stop_reconciling(self) -> None:
+        if self._reconcile_task is not None:
+            self._reconcile_task.cancel()
+            self._reconcile_task = None
+
+    async def _reconcile_forever(self, interval_secs: float) -> None:
+        while True:
+            await asyncio.sleep(interval_secs)
+            try:
+                await self.build()
+            except Exception as e:
+                logger.error(f"Failed to reconcile the popularity index: {repr(e)}")
+
+    def add_product(self, product: ProductionProduct) -> None:
+        """
+        Adds a newly created product with no sales
+        """
+        product_id = product.get_primary_key()
+        self._products[product_id] = (product.Name, product.ProductNumber)
+        self._sales.setdefault(product_id, 0)
+        self._changed()
+
+    def remove_sales(self, sales: dict[int, int]) -> None:
+        """
+        Uncounts deleted order lines. Must only be called once their
+        deletion has committed (see ADB.after_commit)
+
+        Args:
+            sales (dict[int, int]): Amount of deleted order lines per ProductID
+        """
+        for product_id, count in sales.items():
+            if product_id in self._sales:
+                self._sales[product_id] = max(self._sales[product_id] - count, 0)
+        if sales:
+            self._changed()
+
+    @staticmethod
+    async def order_lines(sales_order_id: int) -> dict[int, int]:
+        """
+        Retrieves the amount of order lines per ProductID in an order, so they
+        can be uncounted once the order has been deleted
+        """
+        from db.AsyncDatabaseHandler import ADB
+        rows = await ADB.records(ORDER_LINES_SQL, sales_order_id) or []
+        return {row["ProductID"]: int(row["sales"]) for row in rows}
+
+    @staticmethod
+    async def orders_lines(sales_order_ids: list[int]) -> dict[int, int]:
+        """
+        Retrieves the amount of order lines per ProductID in many orders, in
+        one query
+        """
+        from db.AsyncDatabaseHandler import ADB
+        rows = await ADB.records(
+            f"SELECT ProductID, COUNT(*) AS sales FROM {ORDER_DETAIL_TABLE} "
+            f"WHERE SalesOrderID IN ({','.join(['%s'] * len(sales_order_ids))}) GROUP BY ProductID",
+            *sales_order_ids
+        ) or []
+        return {row["ProductID"]: int(row["sales"]) for row in rows}
+
+    def top(self, limit: int | None = None) -> list[dict[str, any]]:
+        """
+        Returns the most popular products, most sold first
+
+        Args:
+            limit (int, optional): Only return the top N products. Defaults to all products.
+
+        Returns:
+            list[dict]: Product name, number and amount sold
+        """
+        return list(self.iter_top(limit))
+
+    def top_columns(self, limit: int | None = None) -> tuple[list[str], list[tuple]]:
+        """
+        Returns the most popular products as column names and row tuples,
+        for columnar responses
+        """
+        return ["Name", "ProductNumber", "sales"], [
+            (*self._products[product_id], self._sales[product_id]) for product_id in self._ranked(limit)
+        ]
+
+    def top_ids(self, limit: int | None = None) -> list[int]:
+        """
+        Returns the ProductIDs of the most popular products, most sold first
+        """
+        return self._ranked(limit)
+
+    def iter_top(self, limit: int | None = None) -> Iterator[dict[str, any]]:
+        """
+        Lazily yields the most popular products, most sold first, so that
+        the ranking can be streamed without building every row up front
+        """
+        for product_id in self._ranked(limit):
+            name, product_number = self._products[product_id]
+            yield {
+                "Name": name,
+                "ProductNumber": product_number,
+                "sales": self._sales[product_id],
+            }
+
+    def _ranked(self, limit: int | None) -> list[int]:
+        def sort_key(product_id: int) -> tuple[int, int]:
+            # Ties are broken by ProductID so that the ranking is stable
+            return -self._sales[product_id], product_id
+
+        if limit is None or limit >= len(self._sales):
+            return sorted(self._sales, key=sort_key)
+        return heapq.nsmallest(limit, self._sales, key=sort_key)
+
+POPULARITY = PopularityIndex()
@@ -0,0 +1,136 @@
+from operator import itemgetter
+
+
+class Statements:
+    """
+    Statements
+
+    The SQL a model is read and written with, compiled once when the model
+    class is defined, so that the write path only has to pick a statement
+    and gather its values.
+
+    UPDATE statements only set the columns that were given, so one is
+    compiled per set of non-null columns the first time it is used
+
+    NOTE: SQL injection is not possible as the f string values
+    are constants set in code. No user inputs are inserted
+    """
+
+    def __init__(self, table_name: str, primary_key_name: str, cols: tuple[str, ...]) -> None:
+        self.table_name = table_name
+        self.primary_key_name = primary_key_name
+        self.cols = cols
+
+        self.insert = f"INSERT INTO {table_name} ({','.join(cols)}) VALUES ({','.join(['%s'] * len(cols))})"
+        self.select_by_id = f"SELECT * FROM {table_name} WHERE {primary_key_name} = %s"
+        self.delete_by_id = f"DELETE FROM {table_name} WHERE {primary_key_name} = %s"
+        self.select_by = {col: f"SELECT * FROM {table_name} WHERE {col} = %s LIMIT 1" for col in cols}
+
+        # Pulls every column's value out of a model's __dict__, in column order
+        self.insert_values = itemgetter(*cols) if len(cols) > 1 else lambda values: (values[cols[0]],)
+        self._updates: dict[tuple[str, ...], str] = {}
+        self._select_existing: dict[tuple[str, int], str] = {}
+
+    def insert_row(self, table) -> tuple:
+        """
+        Returns the values of the INSERT statement for a model
+        """
+        return self.insert_values(table.__dict__)
+
+    def update_row(self, table, primary_key_value: int) -> tuple[str, list]:
+        """
+        Returns the UPDATE statement setting every non-null column of a
+        model, along with its values
+
+        Args:
+            table (Table): Model holding the new values
+            primary_key_value (int): Primary key of the row to update
+
+        Returns:
+            tuple[str, list]: SQL command and its values
+
+        Raises:
+            ValueError: If every column is null
+        """
+        values = table.__dict__
+        cols = tuple(col for col in self.cols if values[col] is not None)
+        if not cols:
+            raise ValueError(f"No columns given to update in {self.table_name}")
+        command = self._updates.get(cols)
+        if command is None:
+            command = self._updates[cols] = self._compile_update(cols)
+
+        data = [values[col] for col in cols]
+        data.append(primary_key_value)
+        return command, data
+
+    def update_many(self, cols: tuple[str, ...], count: int) -> str:
+        """
+        Returns one UPDATE setting `cols` on `count` rows, each to its own
+        values. Takes (primary key, value) pairs per row for every column,
+        followed by the primary keys again for the WHERE clause. These are
+        not cached, as the last chunk of every bulk update has its own size
+
+        Raises:
+            ValueError: If a column is not in the table, or is the primary key
+        """
+        invalid = set(cols) - set(self.cols) | ({self.primary_key_name} & set(cols))
+        if invalid:
+            raise ValueError(f"Invalid column(s) given: {', '.join(sorted(invalid))}")
+        cases = " ".join(["WHEN %s THEN %s"] * count)
+        clauses_str = ", ".join(f"{col} = CASE {self.primary_key_name} {cases} END" for col in cols)
+        return (
+            f"UPDATE {self.table_name} SET {clauses_str} "
+            f"WHERE {self.primary_key_name} IN ({','.join(['%s'] * count)})"
+        )
+
+    def select_by_ids(self, count: int) -> str:
+        return f"SELECT * FROM {self.table_name} WHERE {self.primary_key_name} IN ({','.join(['%s'] * count)})"
+
+    def delete_by_ids(self, count: int) -> str:
+        return f"DELETE FROM {self.table_name} WHERE {self.primary_key_name} IN ({','.join(['%s'] * count)})"
+
+    def changed_cols(self, table) -> tuple[str, ...]:
+        """
+        Returns the non-null columns of a model, other than its primary key,
+        which are the columns a bulk update sets
+        """
+        values = table.__dict__
+        return tuple(col for col in self.cols if values[col] is not None and col != self.primary_key_name)
+
+    @staticmethod
+    def update_many_values(cols: tuple[str, ...], rows: list[tuple[any, any]]) -> list:
+        """
+        Returns the values of an update_many statement, given (primary key,
+        model) pairs
+        """
+        data = []
+        for col in cols:
+            for primary_key_value, table in rows:
+                data.append(primary_key_value)
+                data.append(table.__dict__[col])
+        data.extend(primary_key_value for primary_key_value, _ in rows)
+        return data
+
+    def select_existing(self, col: str, count: int) -> str:
+        """
+        Returns the SELECT finding which of `count` values are already in a
+        column. Only the column and the primary key are selected, so an
+        index on the column alone answers it
+
+        Raises:
+            ValueError: If the column is not in the table
+        """
+        command = self._select_existing.get((col, count))
+        if command is None:
+            if col not in self.cols:
+                raise ValueError(f"Invalid column given: {col}")
+            command = self._select_existing[(col, count)] = (
+                f"SELECT {self.primary_key_name}, {col} FROM {self.table_name} "
+                f"WHERE {col} IN ({','.join(['%s'] * count)})"
+            )
+        return command
+
+    def _compile_update(self, cols: tuple[str, ...]) -> str:
+        clauses_str = ", ".join(f"{col} = %s" for col in cols)
+        return f"UPDATE {self.table_name} SET {clauses_str} WHERE {self.primary_key_name} = %s"
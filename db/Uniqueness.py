@@ -0,0 +1,250 @@
+import logging
+from contextlib import aclosing, contextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Iterable, Iterator
+
+from fastapi.exceptions import ValidationException
+
+from db.Config import UNIQUE_FILTER_ENABLED, UNIQUE_FILTER_ERROR_RATE
+from db.model.base.Table import Table
+from util.Bloom import BloomFilter
+
+logger = logging.getLogger(__name__)
+
+# Bloom filters of the values in unique columns, keyed by (table name, column)
+KEY_FILTERS: dict[tuple[str, str], BloomFilter] = {}
+
+# Capacity given to a filter on top of the rows already in its table
+FILTER_HEADROOM = 2
+
+_batch: ContextVar["UniqueBatch | None"] = ContextVar("unique_batch", default=None)
+
+
+def current_unique_batch() -> "UniqueBatch | None":
+    return _batch.get()
+
+
+def _filter_statements(table: type[Table], col: str) -> tuple[str, str]:
+    if col not in table.statements().cols:
+        raise ValueError(f"Invalid column given: {col}")
+    # NOTE: SQL injection is not possible as the f string values
+    # are constants set in code. No user inputs are inserted
+    return f"SELECT COUNT(*) FROM {table.table_name()}", f"SELECT {col} FROM {table.table_name()}"
+
+
+def build_key_filter(table: type[Table], col: str) -> BloomFilter:
+    """
+    Loads every value of a column into a new bloom filter, streaming the
+    column so that memory use stays constant
+    """
+    from db.DatabaseHandler import DB
+    count_sql, select_sql = _filter_statements(table, col)
+    key_filter = BloomFilter(max(DB.count(count_sql) * FILTER_HEADROOM, 1024), UNIQUE_FILTER_ERROR_RATE)
+    for batch in DB.stream(select_sql):
+        for row in batch:
+            if row[col] is not None:
+                key_filter.add(row[col])
+    KEY_FILTERS[(table.table_name(), col)] = key_filter
+    logger.info(f"Built key filter of {len(key_filter):,} {table.table_name()}.{col} values")
+    return key_filter
+
+
+async def abuild_key_filter(table: type[Table], col: str) -> BloomFilter:
+    """
+    Loads every value of a column into a new bloom filter, streaming the
+    column so that memory use stays constant
+    """
+    from db.AsyncDatabaseHandler import ADB
+    count_sql, select_sql = _filter_statements(table, col)
+    key_filter = BloomFilter(max(await ADB.count(count_sql) * FILTER_HEADROOM, 1024), UNIQUE_FILTER_ERROR_RATE)
+    async with aclosing(ADB.stream(select_sql)) as batches:
+        async for batch in batches:
+            for row in batch:
+                if row[col] is not None:
+                    key_filter.add(row[col])
+    KEY_FILTERS[(table.table_name(), col)] = key_filter
+    logger.info(f"Built key filter of {len(key_filter):,} {table.table_name()}.{col} values")
+    return key_filter
+
+
+class UniqueBatch:
+    """
+    Unique Batch
+
+    Collects the values of unique columns validated during a request, so
+    that they are checked against the database together, with one
+    projected SELECT ... IN per column instead of one query per value.
+    Values given more than once within the batch are refused as soon as
+    they are added.
+
+    Usage:
+        with unique_batch() as batch:
+            customers = [SalesCustomer(**data) for data in payload]
+            batch.check()
+    """
+
+    def __init__(self, use_filter: bool = UNIQUE_FILTER_ENABLED) -> None:
+        self.use_filter = use_filter
+        self._values: dict[tuple[type[Table], str], set] = {}
+        # Values added by the item being validated, see item()
+        self._item_values: list[tuple[tuple[type[Table], str], any]] | None = None
+
+    @property
+    def pending(self) -> bool:
+        return any(self._values.values())
+
+    def add(self, table: type[Table], col: str, value: any) -> None:
+        """
+        Adds a value to be checked
+
+        Raises:
+            ValidationException: If the value was already given in this batch
+        """
+        values = self._values.setdefault((table, col), set())
+        if value in values:
+            raise ValidationException(f"{col} must be unique, {value!r} is given more than once")
+        values.add(value)
+        if self._item_values is not None:
+            self._item_values.append(((table, col), value))
+
+    @contextmanager
+    def item(self) -> Iterator[None]:
+        """
+        Validates one item of a bulk write. If the block raises, the values
+        it added are taken back out of the batch, so an invalid item never
+        makes a later item's value count as given more than once
+        """
+        self._item_values = []
+        try:
+            yield
+        except BaseException:
+            for key, value in self._item_values:
+                self._values[key].discard(value)
+            raise
+        finally:
+            self._item_values = None
+
+    def check(self, owners: dict[type[Table], Iterable] | None = None) -> None:
+        """
+        Checks every collected value against the database
+
+        Args:
+            owners (dict, optional): Primary keys of the rows being written, by
+                table. Values already held by these rows are not conflicts
+
+        Raises:
+            ValidationException: If any value is already in the database
+        """
+        self._raise_conflicts(self.find_conflicts(owners))
+
+    async def acheck(self, owners: dict[type[Table], Iterable] | None = None) -> None:
+        """
+        Checks every collected value against the database
+
+        Args:
+            owners (dict, optional): Primary keys of the rows being written, by
+                table. Values already held by these rows are not conflicts
+
+        Raises:
+            ValidationException: If any value is already in the database
+        """
+        self._raise_conflicts(await self.afind_conflicts(owners))
+
+    def find_conflicts(
+            self,
+            owners: dict[type[Table], Iterable] | None = None
+    ) -> dict[tuple[type[Table], str], set]:
+        """
+        Looks every collected value up in the database, without raising
+
+        Returns:
+            dict: Values already held by other rows, by (table, column)
+        """
+        from db.DatabaseHandler import DB
+        conflicts = {}
+        for (table, col), values in self._values.items():
+            key_filter = None
+            if self.use_filter:
+                key_filter = KEY_FILTERS.get((table.table_name(), col)) or build_key_filter(table, col)
+            found = DB.existing_values(table, col, self._lookups(values, key_filter))
+            conflicts[(table, col)] = self._conflicts(table, found, owners)
+            self._remember(values - conflicts[(table, col)], key_filter)
+        self._values.clear()
+        return conflicts
+
+    async def afind_conflicts(
+            self,
+            owners: dict[type[Table], Iterable] | None = None
+    ) -> dict[tuple[type[Table], str], set]:
+        """
+        Looks every collected value up in the database, without raising
+
+        Returns:
+            dict: Values already held by other rows, by (table, column)
+        """
+        from db.AsyncDatabaseHandler import ADB
+        conflicts = {}
+        for (table, col), values in self._values.items():
+            key_filter = None
+            if self.use_filter:
+                key_filter = KEY_FILTERS.get((table.table_name(), col)) or await abuild_key_filter(table, col)
+            found = await ADB.existing_values(table, col, self._lookups(values, key_filter))
+            conflicts[(table, col)] = self._conflicts(table, found, owners)
+            self._remember(values - conflicts[(table, col)], key_filter)
+        self._values.clear()
+        return conflicts
+
+    @staticmethod
+    def _lookups(values: set, key_filter: BloomFilter | None) -> list:
+        # A value the filter has never seen can't be in the database
+        if key_filter is None:
+            return list(values)
+        return [value for value in values if value in key_filter]
+
+    @staticmethod
+    def _conflicts(table: type[Table], found: dict, owners: dict | None) -> set:
+        allowed = set((owners or {}).get(table, ()))
+        return {value for value, primary_key in found.items() if primary_key not in allowed}
+
+    @staticmethod
+    def _raise_conflicts(conflicts: dict[tuple[type[Table], str], set]) -> None:
+        for (table, col), values in conflicts.items():
+            if values:
+                in_use = ", ".join(sorted(map(str, values)))
+                raise ValidationException(f"{col} must be unique, already in use: {in_use}")
+
+    @staticmethod
+    def _remember(values: set, key_filter: BloomFilter | None) -> None:
+        # The values are about to be written. If the write fails, the
+        # filter only gains false positives, which are checked anyway
+        if key_filter is not None:
+            for value in values:
+                key_filter.add(value)
+
+
+@contextmanager
+def unique_batch(use_filter: bool = UNIQUE_FILTER_ENABLED) -> Iterator[UniqueBatch]:
+    """
+    Collects the unique values validated within the block into one batch
+    """
+    batch = UniqueBatch(use_filter)
+    token = _batch.set(batch)
+    try:
+        yield batch
+    finally:
+        _batch.reset(token)
+
+
+async def request_unique_batch() -> AsyncIterator[UniqueBatch]:
+    """
+    FastAPI dependency collecting the unique values of a request's body,
+    which the endpoint checks with `await batch.acheck()`. Dependencies are
+    solved before the body is validated, so the batch is already active
+
+    Usage:
+        async def endpoint(body: Model, batch: UniqueBatch = Depends(request_unique_batch)):
+    """
+    with unique_batch() as batch:
+        yield batch
+    if batch.pending:
+        logger.error("Unique values were collected by a request but never checked")
@@ -0,0 +1,140 @@
+from abc import ABC, abstractmethod
+
+
+class Backend(ABC):
+    """
+    Storage Backend
+
+    Everything the database handlers need to know about the database they
+    talk to: how to connect to it, its placeholder dialect, its cursors and
+    how many rows it takes per bulk insert.
+
+    SQL in the code base is written with MySQL's `%s` placeholders, and is
+    translated once per distinct statement by sql()
+
+    Connections are opened in autocommit mode, and return rows as dicts.
+    Writes return the rows they matched, so an UPDATE of a row that exists
+    returns 1 even if it changed nothing
+    """
+
+    # Name used to select the backend in db/Config.py
+    name = ""
+    # Placeholder the driver expects in place of %s
+    placeholder = "%s"
+    # Statement prefix inserting a row only if its key is not taken
+    insert_ignore = "INSERT IGNORE"
+    # Counts the indexes of a table with a given name, taking (table name, index name)
+    index_exists_sql = ""
+    # Rows sent per executemany in a bulk insert
+    bulk_insert_rows = 1_000
+    # Errors raised by the sync and async drivers when a connection is unusable
+    connection_errors: tuple[type[Exception], ...] = ()
+    async_connection_errors: tuple[type[Exception], ...] = ()
+
+    def __init__(self) -> None:
+        self._translated: dict[str, str] = {}
+
+    def sql(self, command: str) -> str:
+        """
+        Translates an SQL command to the backend's placeholder dialect
+
+        Args:
+            command (str): SQL command using %s placeholders
+
+        Returns:
+            str: SQL command the driver accepts
+        """
+        if self.placeholder == "%s":
+            return command
+        translated = self._translated.get(command)
+        if translated is None:
+            translated = self._translated[command] = (
+                command.replace("%s", self.placeholder).replace("%%", "%")
+            )
+        return translated
+
+    @abstractmethod
+    def connect(self):
+        """
+        Opens a new (sync) connection
+        """
+        raise NotImplementedError("Subclass must implement connect")
+
+    @abstractmethod
+    def cursor(self, cxn, streaming: bool = False, tuples: bool = False):
+        """
+        Opens a (sync) cursor returning rows as dicts
+
+        Args:
+            cxn: Connection opened by connect
+            streaming (bool, optional): Read rows from the server as they are
+            fetched, rather than buffering the whole result. Defaults to False.
+            tuples (bool, optional): Return rows as tuples instead, in the order
+            of cursor.description. Defaults to False.
+        """
+        raise NotImplementedError("Subclass must implement cursor")
+
+    def begin(self, cxn) -> None:
+        """
+        Begins a transaction on a (sync) connection
+        """
+        cxn.begin()
+
+    def ping(self, cxn) -> None:
+        """
+        Checks a (sync) connection is alive, raising if it is not
+        """
+        cxn.ping()
+
+    def is_unavailable(self, error: Exception) -> bool:
+        """
+        Checks if an error means the database couldn't be reached, which
+        counts towards the handler's circuit breaker
+        """
+        return isinstance(error, self.connection_errors + self.async_connection_errors)
+
+    def is_transient(self, error: Exception, write: bool = False) -> bool:
+        """
+        Checks if an error is worth retrying. Writes are only retried if the
+        error guarantees the statement was not applied
+
+        Args:
+            error (Exception): Error raised by the driver
+            write (bool, optional): The statement may have written. Defaults to False.
+        """
+        return not write and self.is_unavailable(error)
+
+    @abstractmethod
+    async def create_pool(self, min_size: int, max_size: int):
+        """
+        Opens an async pool of connections, with the acquire, release,
+        close and wait_closed methods of an aiomysql pool
+        """
+        raise NotImplementedError("Subclass must implement create_pool")
+
+    @abstractmethod
+    def async_cursor(self, cxn, streaming: bool = False, tuples: bool = False):
+        """
+        Async counterpart to cursor, used as an async context manager
+        """
+        raise NotImplementedError("Subclass must implement async_cursor")
+
+
+def load_backend(name: str | None = None) -> Backend:
+    """
+    Creates the backend selected in db/Config.py. The drivers of the other
+    backends are never imported, so they need not be installed
+
+    Args:
+        name (str, optional): Backend name. Defaults to DB_BACKEND.
+    """
+    from db.Config import DB_BACKEND
+    match name or DB_BACKEND:
+        case "mysql":
+            from db.backend.MySQLBackend import MySQLBackend
+            return MySQLBackend()
+        case "sqlite":
+            from db.backend.SQLiteBackend import SQLiteBackend
+            return SQLiteBackend()
+        case other:
+            raise ValueError(f"Unknown database backend: {other}")
@@ -0,0 +1,97 @@
+import aiomysql
+from aiomysql.cursors import (
+    Cursor as AsyncCursor, DictCursor as AsyncDictCursor, SSCursor as AsyncSSCursor, SSDictCursor as AsyncSSDictCursor
+)
+from MySQLdb import Connect, InterfaceError, OperationalError
+from MySQLdb.constants.CLIENT import FOUND_ROWS
+from MySQLdb.cursors import Cursor, DictCursor, SSCursor, SSDictCursor
+from pymysql.constants.CLIENT import FOUND_ROWS as ASYNC_FOUND_ROWS
+from pymysql.err import InterfaceError as AsyncInterfaceError, OperationalError as AsyncOperationalError
+
+from db.Config import DB_HOST, DB_PORT, DB_USER, DB_PASSWORD, DB_DATABASE, POOL_HEALTH_CHECK_SECS
+from db.backend.Backend import Backend
+
+# Server errors meaning the database couldn't be reached: too many
+# connections, can't connect, server gone away, connection lost mid-query
+UNAVAILABLE_CODES = frozenset((1040, 2002, 2003, 2006, 2013, 2055))
+# Errors where the connection was lost while a statement ran, which may
+# or may not have been applied. The server going away (2006) is among
+# them, as it can't be told apart from it going away mid-statement
+LOST_CODES = frozenset((2006, 2013, 2055))
+# Lock wait timeouts and deadlocks, after which the statement was rolled back
+CONTENTION_CODES = frozenset((1205, 1213))
+
+
+class MySQLBackend(Backend):
+    """
+    MySQL Backend
+
+    The AdventureWorks2019 MySQL database, through MySQLdb and aiomysql.
+    Large results are streamed through unbuffered server-side cursors.
+    Connections are opened with FOUND_ROWS, so that an UPDATE reports the
+    rows it matched rather than the rows whose values it changed
+    """
+
+    name = "mysql"
+    index_exists_sql = (
+        "SELECT COUNT(*) FROM information_schema.statistics "
+        "WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s"
+    )
+    # MySQLdb sends an executemany as one multi-row INSERT, which has
+    # to fit in the server's max_allowed_packet
+    bulk_insert_rows = 1_000
+    connection_errors = (OperationalError, InterfaceError)
+    async_connection_errors = (AsyncOperationalError, AsyncInterfaceError)
+
+    def is_unavailable(self, error: Exception) -> bool:
+        # Interface errors are raised for connections that are already closed
+        if isinstance(error, (InterfaceError, AsyncInterfaceError)):
+            return True
+        return isinstance(error, (OperationalError, AsyncOperationalError)) and _code(error) in UNAVAILABLE_CODES
+
+    def is_transient(self, error: Exception, write: bool = False) -> bool:
+        if isinstance(error, (OperationalError, AsyncOperationalError)) and _code(error) in CONTENTION_CODES:
+            return True
+        if write and _code(error) in LOST_CODES:
+            return False
+        return self.is_unavailable(error)
+
+    def connect(self):
+        return Connect(
+            host=DB_HOST,
+            port=DB_PORT,
+            user=DB_USER,
+            password=DB_PASSWORD,
+            database=DB_DATABASE,
+            autocommit=True,
+            client_flag=FOUND_ROWS
+        )
+
+    def cursor(self, cxn, streaming: bool = False, tuples: bool = False):
+        if tuples:
+            return cxn.cursor(SSCursor if streaming else Cursor)
+        return cxn.cursor(SSDictCursor if streaming else DictCursor)
+
+    async def create_pool(self, min_size: int, max_size: int):
+        return await aiomysql.create_pool(
+            minsize=min_size,
+            maxsize=max_size,
+            pool_recycle=POOL_HEALTH_CHECK_SECS,
+            host=DB_HOST,
+            port=DB_PORT,
+            user=DB_USER,
+            password=DB_PASSWORD,
+            db=DB_DATABASE,
+            cursorclass=AsyncDictCursor,
+            autocommit=True,
+            client_flag=ASYNC_FOUND_ROWS,
+        )
+
+    def async_cursor(self, cxn, streaming: bool = False, tuples: bool = False):
+        if tuples:
+            return cxn.cursor(AsyncSSCursor if streaming else AsyncCursor)
+        return cxn.cursor(AsyncSSDictCursor if streaming else AsyncDictCursor)
+
+
+def _code(error: Exception) -> int | None:
+    return error.args[0] if error.args and isinstance(error.args[0], int) else None
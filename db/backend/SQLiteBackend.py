@@ -0,0 +1,356 @@
+import asyncio
+import sqlite3
+from datetime import datetime
+from decimal import Decimal
+
+from db.Config import SQLITE_PATH, POOL_TIMEOUT_SECS
+from db.backend.Backend import Backend
+
+"""
+Schema of the mirrored AdventureWorks2019 tables, plus the order lines the
+popularity index counts. DATETIME columns are declared as TIMESTAMP so they
+are read back as datetime, and DECIMAL columns are stored as REAL
+"""
+SCHEMA_DDL = """
+CREATE TABLE IF NOT EXISTS Sales_Customer (
+    CustomerID INTEGER NOT NULL PRIMARY KEY,
+    PersonID INTEGER,
+    StoreID INTEGER,
+    TerritoryID INTEGER,
+    AccountNumber VARCHAR(10),
+    rowguid VARCHAR(64),
+    ModifiedDate TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS Production_Product (
+    ProductID INTEGER NOT NULL PRIMARY KEY,
+    Name VARCHAR(50),
+    ProductNumber VARCHAR(25),
+    MakeFlag INTEGER,
+    FinishedGoodsFlag INTEGER,
+    Color VARCHAR(15),
+    SafetyStockLevel INTEGER,
+    ReorderPoint INTEGER,
+    StandardCost REAL,
+    ListPrice REAL,
+    Size VARCHAR(5),
+    SizeUnitMeasureCode VARCHAR(3),
+    WeightUnitMeasureCode VARCHAR(3),
+    Weight REAL,
+    DaysToManufacture INTEGER,
+    ProductLine VARCHAR(2),
+    Class VARCHAR(2),
+    Style VARCHAR(2),
+    ProductSubcategoryID INTEGER,
+    ProductModelID INTEGER,
+    SellStartDate TIMESTAMP,
+    SellEndDate TIMESTAMP,
+    DiscontinuedDate TIMESTAMP,
+    rowguid VARCHAR(64),
+    ModifiedDate TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS Sales_SalesOrderHeader (
+    SalesOrderID INTEGER NOT NULL PRIMARY KEY,
+    RevisionNumber INTEGER,
+    OrderDate TIMESTAMP,
+    DueDate TIMESTAMP,
+    ShipDate TIMESTAMP,
+    Status INTEGER,
+    OnlineOrderFlag INTEGER,
+    SalesOrderNumber VARCHAR(25),
+    PurchaseOrderNumber VARCHAR(25),
+    AccountNumber VARCHAR(15),
+    CustomerID INTEGER,
+    SalesPersonID INTEGER,
+    TerritoryID INTEGER,
+    BillToAddressID INTEGER,
+    ShipToAddressID INTEGER,
+    ShipMethodID INTEGER,
+    CreditCardID INTEGER,
+    CreditCardApprovalCode VARCHAR(15),
+    CurrencyRateID INTEGER,
+    SubTotal REAL,
+    TaxAmt REAL,
+    Freight REAL,
+    TotalDue REAL,
+    Comment VARCHAR(128),
+    rowguid VARCHAR(64),
+    ModifiedDate TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS Sales_SalesOrderDetail (
+    SalesOrderID INTEGER NOT NULL,
+    SalesOrderDetailID INTEGER NOT NULL,
+    CarrierTrackingNumber VARCHAR(25),
+    OrderQty INTEGER,
+    ProductID INTEGER,
+    SpecialOfferID INTEGER,
+    UnitPrice REAL,
+    UnitPriceDiscount REAL,
+    LineTotal REAL,
+    rowguid VARCHAR(64),
+    ModifiedDate TIMESTAMP,
+    PRIMARY KEY (SalesOrderID, SalesOrderDetailID)
+);
+
+CREATE INDEX IF NOT EXISTS IX_SalesOrderDetail_ProductID ON Sales_SalesOrderDetail (ProductID);
+"""
+
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(" "))
+sqlite3.register_adapter(Decimal, float)
+sqlite3.register_converter("TIMESTAMP", lambda value: datetime.fromisoformat(value.decode()))
+
+
+def dict_row(cursor: sqlite3.Cursor, row: tuple) -> dict[str, any]:
+    return {column[0]: value for column, value in zip(cursor.description, row)}
+
+
+def as_params(values) -> tuple | list | dict:
+    """
+    The handlers pass single values unwrapped, as the MySQL drivers accept them
+    """
+    if values is None:
+        return ()
+    if isinstance(values, (tuple, list, dict)):
+        return values
+    return (values,)
+
+
+class SQLiteCursor(sqlite3.Cursor):
+    """
+    SQLite cursor that takes %s placeholders and returns the affected row
+    count from execute, like the MySQL drivers
+    """
+
+    backend: "SQLiteBackend" = None
+
+    def execute(self, command: str, values=None) -> int:
+        super().execute(self.backend.sql(command), as_params(values))
+        return self.rowcount
+
+    def executemany(self, command: str, rows) -> int:
+        super().executemany(self.backend.sql(command), rows)
+        return self.rowcount
+
+
+class SQLiteBackend(Backend):
+    """
+    SQLite Backend
+
+    An embedded database file holding the same tables as the MySQL database,
+    so that the API can be run and benchmarked without a MySQL server. See
+    benchmark/Seed.py to fill it with generated data.
+
+    The async connections run each call in a worker thread, as sqlite3 has
+    no async interface. Transactions begin IMMEDIATE, taking the write lock
+    up front, as SQLite only allows one writer at a time
+
+    NOTE: The database must be a file, as every connection to :memory:
+    would open an empty database of its own
+    """
+
+    name = "sqlite"
+    placeholder = "?"
+    insert_ignore = "INSERT OR IGNORE"
+    index_exists_sql = "SELECT COUNT(*) FROM sqlite_master WHERE type = 'index' AND tbl_name = %s AND name = %s"
+    bulk_insert_rows = 10_000
+    connection_errors = (sqlite3.InterfaceError, sqlite3.ProgrammingError)
+    async_connection_errors = connection_errors
+
+    def is_unavailable(self, error: Exception) -> bool:
+        # Programming errors are also raised for bad SQL, which isn't the database's fault
+        if isinstance(error, self.connection_errors):
+            return "closed" in str(error)
+        return isinstance(error, sqlite3.OperationalError) and "unable to open" in str(error)
+
+    def is_transient(self, error: Exception, write: bool = False) -> bool:
+        # Locks are taken before a statement runs, so a locked database never applied it
+        if isinstance(error, sqlite3.OperationalError) and ("locked" in str(error) or "busy" in str(error)):
+            return True
+        return self.is_unavailable(error)
+
+    def __init__(self, path: str = SQLITE_PATH) -> None:
+        super().__init__()
+        self.path = path
+        self._schema_ready = False
+
+        class Cursor(SQLiteCursor):
+            backend = self
+
+        self._cursor_class = Cursor
+
+    def connect(self) -> sqlite3.Connection:
+        cxn = sqlite3.connect(
+            self.path,
+            timeout=POOL_TIMEOUT_SECS,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            # Autocommit, transactions are begun explicitly
+            isolation_level=None,
+            # Pooled connections move between threads, but are never shared
+            check_same_thread=False,
+        )
+        cxn.row_factory = dict_row
+        cxn.execute("PRAGMA journal_mode = WAL")
+        cxn.execute("PRAGMA synchronous = NORMAL")
+        if not self._schema_ready:
+            cxn.executescript(SCHEMA_DDL)
+            self._schema_ready = True
+        return cxn
+
+    def cursor(self, cxn: sqlite3.Connection, streaming: bool = False, tuples: bool = False) -> SQLiteCursor:
+        # SQLite cursors always step through results lazily
+        cur = cxn.cursor(self._cursor_class)
+        if tuples:
+            # Overrides the connection's dict_row
+            cur.row_factory = None
+        return cur
+
+    def begin(self, cxn: sqlite3.Connection) -> None:
+        cxn.execute("BEGIN IMMEDIATE")
+
+    def ping(self, cxn: sqlite3.Connection) -> None:
+        cxn.execute("SELECT 1")
+
+    async def create_pool(self, min_size: int, max_size: int) -> "AsyncSQLitePool":
+        pool = AsyncSQLitePool(self, max_size)
+        for _ in range(min_size):
+            pool.release(await pool.acquire())
+        return pool
+
+    def async_cursor(
+            self,
+            cxn: "AsyncSQLiteConnection",
+            streaming: bool = False,
+            tuples: bool = False
+    ) -> "AsyncSQLiteCursor":
+        return cxn.cursor(tuples=tuples)
+
+
+class AsyncSQLiteCursor:
+    """
+    Async wrapper of a SQLiteCursor, with the interface of an aiomysql cursor
+    """
+
+    def __init__(self, connection: "AsyncSQLiteConnection", cur: SQLiteCursor) -> None:
+        self.connection = connection
+        self._cur = cur
+
+    async def __aenter__(self) -> "AsyncSQLiteCursor":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self._cur.close()
+
+    @property
+    def arraysize(self) -> int:
+        return self._cur.arraysize
+
+    @arraysize.setter
+    def arraysize(self, size: int) -> None:
+        self._cur.arraysize = size
+
+    @property
+    def lastrowid(self) -> int | None:
+        return self._cur.lastrowid
+
+    @property
+    def description(self) -> tuple | None:
+        return self._cur.description
+
+    async def execute(self, command: str, values=None) -> int:
+        return await asyncio.to_thread(self._cur.execute, command, values)
+
+    async def executemany(self, command: str, rows) -> int:
+        return await asyncio.to_thread(self._cur.executemany, command, rows)
+
+    async def fetchone(self) -> dict | None:
+        return await asyncio.to_thread(self._cur.fetchone)
+
+    async def fetchall(self) -> list[dict]:
+        return await asyncio.to_thread(self._cur.fetchall)
+
+    async def fetchmany(self) -> list[dict]:
+        return await asyncio.to_thread(self._cur.fetchmany)
+
+
+class AsyncSQLiteConnection:
+    """
+    Async wrapper of an SQLite connection, with the interface of an
+    aiomysql connection
+    """
+
+    def __init__(self, backend: SQLiteBackend, cxn: sqlite3.Connection) -> None:
+        self._backend = backend
+        self._cxn = cxn
+
+    @property
+    def closed(self) -> bool:
+        return self._cxn is None
+
+    def cursor(self, *args, tuples: bool = False) -> AsyncSQLiteCursor:
+        return AsyncSQLiteCursor(self, self._backend.cursor(self._cxn, tuples=tuples))
+
+    def get_transaction_status(self) -> bool:
+        return self._cxn.in_transaction
+
+    async def begin(self) -> None:
+        await asyncio.to_thread(self._backend.begin, self._cxn)
+
+    async def commit(self) -> None:
+        await asyncio.to_thread(self._cxn.commit)
+
+    async def rollback(self) -> None:
+        await asyncio.to_thread(self._cxn.rollback)
+
+    async def ping(self, reconnect: bool = False) -> None:
+        if self._cxn is None and reconnect:
+            self._cxn = await asyncio.to_thread(self._backend.connect)
+        await asyncio.to_thread(self._backend.ping, self._cxn)
+
+    def close(self) -> None:
+        if self._cxn is not None:
+            self._cxn.close()
+            self._cxn = None
+
+
+class AsyncSQLitePool:
+    """
+    Async pool of SQLite connections, with the interface of an aiomysql pool
+    """
+
+    def __init__(self, backend: SQLiteBackend, max_size: int) -> None:
+        self._backend = backend
+        self._idle: list[AsyncSQLiteConnection] = []
+        self._slots = asyncio.Semaphore(max_size)
+        self._closed = False
+
+    async def acquire(self) -> AsyncSQLiteConnection:
+        if self._closed:
+            raise RuntimeError("Connection pool is closed")
+        await self._slots.acquire()
+        if self._idle:
+            return self._idle.pop()
+        try:
+            return AsyncSQLiteConnection(self._backend, await asyncio.to_thread(self._backend.connect))
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def release(self, cxn: AsyncSQLiteConnection) -> None:
+        if not cxn.closed and cxn.get_transaction_status():
+            # Mirrors aiomysql, which never pools a connection mid-transaction
+            cxn.close()
+        if cxn.closed or self._closed:
+            cxn.close()
+        else:
+            self._idle.append(cxn)
+        self._slots.release()
+
+    def close(self) -> None:
+        self._closed = True
+        while self._idle:
+            self._idle.pop().close()
+
+    async def wait_closed(self) -> None:
+        return None
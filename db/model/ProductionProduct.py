@@ -46,67 +46,88 @@ class ProductionProduct(Table):
         return "ProductID"
 
     @classmethod
-    def create(cls, **kwargs):
-        optionals = {
-            "ProductID": cls.get_next_id(),
+    def defaults(cls) -> dict:
+        return {
             "rowguid": str(uuid4()),
-            "ModifiedDate": datetime.now()
+            "ModifiedDate": datetime.now().replace(microsecond=0)
         }
 
+    @classmethod
+    def create(cls, **kwargs):
+        optionals = {"ProductID": cls.get_next_id()} | cls.defaults()
+
         clazz = cls(**((kwargs or {}) | optionals))
 
         clazz.insert()
         return clazz
 
+    @classmethod
+    async def acreate(cls, **kwargs):
+        optionals = {"ProductID": await cls.aget_next_id()} | cls.defaults()
+
+        clazz = cls(**((kwargs or {}) | optionals))
+
+        await clazz.ainsert()
+        return clazz
+
     # Validators based on the AdventureWorks2019 schema
 
     @field_validator("Name")
     @classmethod
     def validate_name(cls, value):
         cls.size_g_validate("Name", value, 100)
+        return value
 
     @field_validator("ProductNumber")
     @classmethod
     def validate_product_number(cls, value):
         cls.size_g_validate("ProductNumber", value, 25)
+        return value
 
     @field_validator("MakeFlag", "FinishedGoodsFlag")
     @classmethod
     def validate_flat(cls, value):
         cls.one_of_validate("Flag", value, (1, 0))
+        return value
 
     @field_validator("Color")
     @classmethod
     def validate_color(cls, value):
         cls.size_g_validate("Color", value, 15)
+        return value
 
     @field_validator("StandardCost", "ListPrice", "Weight")
     @classmethod
     def validate_cost(cls, value):
         cls.size_v_validate("Cost", value, 0)
+        return value
 
     @field_validator("SizeUnitMeasureCode", "WeightUnitMeasureCode")
     @classmethod
     def validate_unit_measure_code(cls, value):
         cls.size_g_validate("Measure Code", value, 3)
+        return value
 
     @field_validator("ProductLine")
     @classmethod
     def validate_product_line(cls, value):
         cls.size_g_validate("ProductLine", value, 2)
         cls.one_of_validate("ProductLine", value, ("R", "M", "T", "S"))
+        return value
 
     @field_validator("Class")
     @classmethod
     def validate_class_line(cls, value):
         cls.size_g_validate("Class", value, 2)
         cls.one_of_validate("Class", value, ("H", "M", "L"))
+        return value
 
     @field_validator("Style")
     @classmethod
     def validate_style_line(cls, value):
         cls.size_g_validate("Style", value, 2)
         cls.one_of_validate("Style", value, ("W", "M", "U"))
+        return value
 
     def get_primary_key(self):
         return self.ProductID
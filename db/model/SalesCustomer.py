@@ -1,6 +1,7 @@
 from pydantic import field_validator
 
 from db.model.base.Table import Table
+from db.Uniqueness import unique_batch
 from datetime import datetime
 from uuid import uuid4
 
@@ -28,26 +29,49 @@ class SalesCustomer(Table):
     def primary_key_name() -> str:
         return "CustomerID"
 
+    @staticmethod
+    def indexes() -> dict[str, tuple[str, ...]]:
+        return {
+            # Uniqueness checks of AccountNumber
+            "IX_Customer_AccountNumber": ("AccountNumber",),
+        }
+
     @classmethod
-    def create(cls, **kwargs):
-        optionals = {
-            "CustomerID": cls.get_next_id(),
+    def defaults(cls) -> dict:
+        return {
             "rowguid": str(uuid4()),
-            "ModifiedDate": datetime.now()
+            "ModifiedDate": datetime.now().replace(microsecond=0)
         }
 
-        clazz = cls(**(optionals | (kwargs or {})))
+    @classmethod
+    def create(cls, **kwargs):
+        optionals = {"CustomerID": cls.get_next_id()} | cls.defaults()
+
+        with unique_batch() as unique:
+            clazz = cls(**(optionals | (kwargs or {})))
+            unique.check()
 
         clazz.insert()
         return clazz
 
+    @classmethod
+    async def acreate(cls, **kwargs):
+        optionals = {"CustomerID": await cls.aget_next_id()} | cls.defaults()
+
+        with unique_batch() as unique:
+            clazz = cls(**(optionals | (kwargs or {})))
+            await unique.acheck()
+
+        await clazz.ainsert()
+        return clazz
+
     # Validators based on the AdventureWorks2019 schema
 
     @field_validator("AccountNumber")
     @classmethod
     def validate_account_number(cls, value):
-        # cls.unique_validate("AccountNumber", value)
         cls.size_g_validate("AccountNumber", value, 10)
+        cls.unique_validate("AccountNumber", value)
         return value
 
     def get_primary_key(self):
@@ -48,23 +48,45 @@ class SalesOrderHeader(Table):
     def primary_key_name() -> str:
         return "SalesOrderID"
 
+    @staticmethod
+    def indexes() -> dict[str, tuple[str, ...]]:
+        return {
+            # Keyset pagination of a customer's purchase history
+            "IX_SalesOrderHeader_CustomerID_OrderDate": ("CustomerID", "OrderDate", "SalesOrderID"),
+        }
+
+    @classmethod
+    def defaults(cls) -> dict:
+        return {
+            "OrderDate": datetime.now().replace(microsecond=0),
+            "rowguid": str(uuid4()),
+            "ModifiedDate": datetime.now().replace(microsecond=0)
+        }
+
     @classmethod
     def create(
             cls,
             **kwargs
     ):
-        optionals = {
-            "SalesOrderID": cls.get_next_id(),
-            "OrderDate": datetime.now(),
-            "rowguid": str(uuid4()),
-            "ModifiedDate": datetime.now()
-        }
+        optionals = {"SalesOrderID": cls.get_next_id()} | cls.defaults()
 
         clazz = cls(**(optionals | (kwargs or {})))
 
         clazz.insert()
         return clazz
 
+    @classmethod
+    async def acreate(
+            cls,
+            **kwargs
+    ):
+        optionals = {"SalesOrderID": await cls.aget_next_id()} | cls.defaults()
+
+        clazz = cls(**(optionals | (kwargs or {})))
+
+        await clazz.ainsert()
+        return clazz
+
     # Validators based on the AdventureWorks2019 schema
 
     @field_validator('Status', mode='before')
@@ -77,21 +99,25 @@ class SalesOrderHeader(Table):
     @classmethod
     def validate_flag(cls, value):
         cls.one_of_validate("OnlineOrderFlag", value, (0, 1))
+        return value
 
     @field_validator("SalesOrderNumber")
     @classmethod
     def validate_sales_order_number(cls, value):
         cls.size_g_validate("SalesOrderNumber", value, 25)
+        return value
 
     @field_validator("PurchaseOrderNumber")
     @classmethod
     def validate_purchase_order_number(cls, value):
         cls.size_g_validate("PurchaseOrderNumber", value, 50)
+        return value
 
     @field_validator("SubTotal", "TaxAmt", "Freight", "TotalDue")
     @classmethod
     def validate_prices(cls, value):
         cls.size_v_validate("Price", value, 0)
+        return value
 
     def get_primary_key(self):
         return self.SalesOrderID
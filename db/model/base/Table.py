@@ -1,7 +1,28 @@
 from fastapi.exceptions import ValidationException
-from pydantic import BaseModel
-from dataclasses import fields
+from pydantic import BaseModel, create_model
 from abc import ABC, abstractmethod
+from datetime import datetime
+from decimal import Decimal
+from typing import Callable, get_args
+
+from db.Config import ENTITY_CACHE_SIZE, ENTITY_CACHE_TTL_SECS
+from db.Statements import Statements
+from util.Cache import LRUCache
+
+# One read-through cache per model, keyed by table name
+ENTITY_CACHES: dict[str, LRUCache] = {}
+
+# Partial models, keyed by model and set of columns
+PARTIAL_MODELS: dict[tuple[type, frozenset[str]], type[BaseModel]] = {}
+
+# Precompiled row -> model functions used to hydrate trusted rows, keyed by model
+ROW_BUILDERS: dict[type, Callable] = {}
+
+# SQL statements compiled when each model is defined, keyed by model
+STATEMENTS: dict[type, Statements] = {}
+
+# Column stamped with the time of every update, which the ETags of rows are built from
+MODIFIED_COL = "ModifiedDate"
 
 
 class Table(BaseModel, ABC):
@@ -9,6 +30,22 @@ class Table(BaseModel, ABC):
     Parent class for all Pydantic models in the API
     """
 
+    @classmethod
+    def __pydantic_init_subclass__(cls, **kwargs) -> None:
+        super().__pydantic_init_subclass__(**kwargs)
+        try:
+            STATEMENTS[cls] = Statements(cls.table_name(), cls.primary_key_name(), tuple(cls.model_fields))
+        except NotImplementedError:
+            # Intermediate models without a table of their own
+            pass
+
+    @classmethod
+    def statements(cls) -> Statements:
+        """
+        Returns the model's precompiled SQL statements
+        """
+        return STATEMENTS[cls]
+
     @classmethod
     def get_cols(cls, other_cols=None) -> list[str]:
         """
@@ -18,19 +55,41 @@ class Table(BaseModel, ABC):
         Args:
             other_cols (iterable, optional): List of column names (str). Defaults to None.
 
+        Raises:
+            ValueError: If any of the given columns are not in the table
+
         Returns:
-            set: Set of (valid) columns
+            list: List of (valid) columns, in table order
         """
-        field_set = {field.name for field in fields(cls)}
+        field_names = list(cls.model_fields)
         if not other_cols:
-            return field_set
+            return field_names
 
         other_cols = set(other_cols)
         # Check for invalid col names
-        if len(other_cols - field_set) != 0:
-            raise ValueError(f"Invalid column(s) given: {other_cols - field_set}")
+        if len(other_cols - set(field_names)) != 0:
+            raise ValueError(f"Invalid column(s) given: {', '.join(sorted(other_cols - set(field_names)))}")
+
+        return [field_name for field_name in field_names if field_name in other_cols]
 
-        return field_set.intersection(other_cols)
+    @classmethod
+    def partial(cls, cols: list[str]) -> type[BaseModel]:
+        """
+        Returns a model holding only the given columns, used to respond
+        with a projection of the table. Models are built once per set of columns
+
+        Args:
+            cols (list[str]): Valid column names, see get_cols
+        """
+        key = (cls, frozenset(cols))
+        model = PARTIAL_MODELS.get(key)
+        if model is None:
+            model = create_model(
+                f"{cls.__name__}Partial",
+                **{col: (cls.model_fields[col].annotation, None) for col in cls.get_cols(cols)}
+            )
+            PARTIAL_MODELS[key] = model
+        return model
 
     @staticmethod
     def table_name() -> str:
@@ -50,6 +109,14 @@ class Table(BaseModel, ABC):
         """
         raise NotImplementedError("Subclass must implement primary_key_name")
 
+    @staticmethod
+    def indexes() -> dict[str, tuple[str, ...]]:
+        """
+        Static property to retrieve the indexes a class relies on, by
+        index name. These are created at startup if they are missing
+        """
+        return {}
+
     @abstractmethod
     def get_primary_key(self):
         """
@@ -59,6 +126,34 @@ class Table(BaseModel, ABC):
         """
         raise NotImplementedError("Subclass must implement get_primary_key")
 
+    @abstractmethod
+    def set_primary_key(self, key):
+        """
+        Abstract method to set the primary key value of a class
+        """
+        raise NotImplementedError("Subclass must implement set_primary_key")
+
+    @classmethod
+    def defaults(cls) -> dict:
+        """
+        Values a new row receives when they are not given, mirroring the
+        defaults in the AdventureWorks2019 schema. Datetimes are given in
+        whole seconds, as DATETIME columns store them, so that a written
+        model is the row as it would be read back
+        """
+        return {}
+
+    @classmethod
+    def prepare(cls, **kwargs):
+        """
+        Method to create (and validate) an instance of a model for insertion,
+        filling any missing or null values with the table defaults.
+        NOTE: The primary key is left for the caller to allocate
+        :param kwargs: Table arguments
+        """
+        given = {key: value for key, value in kwargs.items() if value is not None}
+        return cls(**(dict.fromkeys(cls.model_fields) | cls.defaults() | given))
+
     @classmethod
     @abstractmethod
     def create(cls, **kwargs):
@@ -68,6 +163,159 @@ class Table(BaseModel, ABC):
         """
         raise NotImplementedError("Subclass must implement create")
 
+    @classmethod
+    @abstractmethod
+    async def acreate(cls, **kwargs):
+        """
+        Async counterpart to create
+        :param kwargs: Table arguments
+        """
+        raise NotImplementedError("Subclass must implement acreate")
+
+    @classmethod
+    def create_many(cls, rows: list[dict]) -> list:
+        """
+        Method to create many instances of a model and insert them into the
+        database in a single transaction. Every row is validated before
+        anything is written
+        :param rows: Table arguments for each row
+        """
+        from db.Uniqueness import unique_batch
+        with unique_batch() as unique:
+            tables = [cls.prepare(**row) for row in rows]
+            unique.check()
+
+        from db.DatabaseHandler import DB
+        return DB.bulk_insert(tables)
+
+    @classmethod
+    async def acreate_many(cls, rows: list[dict]) -> list:
+        """
+        Async counterpart to create_many
+        :param rows: Table arguments for each row
+        """
+        from db.Uniqueness import unique_batch
+        with unique_batch() as unique:
+            tables = [cls.prepare(**row) for row in rows]
+            await unique.acheck()
+
+        from db.AsyncDatabaseHandler import ADB
+        return await ADB.bulk_insert(tables)
+
+    @classmethod
+    def update_many(cls, updates: dict) -> set:
+        """
+        Method to update many rows of a model in a single transaction, each
+        to the non-null values of its model
+        :param updates: Validated models holding the new values, by primary key
+        :return: Primary keys of the rows that exist
+        """
+        for table in updates.values():
+            if cls.statements().changed_cols(table):
+                table._touch()
+
+        from db.DatabaseHandler import DB
+        found = DB.bulk_update(cls, updates)
+        cls._cache_invalidate(DB, found)
+        return found
+
+    @classmethod
+    async def aupdate_many(cls, updates: dict) -> set:
+        """
+        Async counterpart to update_many
+        :param updates: Validated models holding the new values, by primary key
+        """
+        for table in updates.values():
+            if cls.statements().changed_cols(table):
+                table._touch()
+
+        from db.AsyncDatabaseHandler import ADB
+        found = await ADB.bulk_update(cls, updates)
+        cls._cache_invalidate(ADB, found)
+        return found
+
+    @classmethod
+    def delete_many(cls, primary_key_values: list, **kwargs) -> tuple[list, list]:
+        """
+        Method to delete many rows of a model by primary key, in transactions
+        of bounded size. See DatabaseHandler.bulk_delete for the arguments
+        :param primary_key_values: Primary keys of the rows to delete
+        :return: The keys that were deleted, and the deleted rows if requested
+        """
+        from db.DatabaseHandler import DB
+        deleted, rows = DB.bulk_delete(cls, primary_key_values, **kwargs)
+        cls._cache_invalidate(DB, deleted)
+        return deleted, cls.from_rows(rows)
+
+    @classmethod
+    async def adelete_many(cls, primary_key_values: list, **kwargs) -> tuple[list, list]:
+        """
+        Async counterpart to delete_many
+        :param primary_key_values: Primary keys of the rows to delete
+        """
+        from db.AsyncDatabaseHandler import ADB
+        deleted, rows = await ADB.bulk_delete(cls, primary_key_values, **kwargs)
+        cls._cache_invalidate(ADB, deleted)
+        return deleted, cls.from_rows(rows)
+
+    @classmethod
+    def from_row(cls, row: dict[str, any]):
+        """
+        Trusted hydration of a model from a database row, skipping validation.
+        Rows read from our own database were validated when they were written,
+        so only the few conversions the driver needs are applied
+
+        NOTE: Request bodies must never be hydrated this way
+        :param row: Database row
+        """
+        builder = ROW_BUILDERS.get(cls)
+        if builder is None:
+            builder = ROW_BUILDERS[cls] = cls._compile_row_builder()
+        return builder(row)
+
+    @classmethod
+    def from_rows(cls, rows: list[dict[str, any]]) -> list:
+        """
+        Trusted hydration of many database rows, see from_row
+        """
+        builder = ROW_BUILDERS.get(cls)
+        if builder is None:
+            builder = ROW_BUILDERS[cls] = cls._compile_row_builder()
+        return [builder(row) for row in rows]
+
+    @classmethod
+    def _compile_row_builder(cls) -> Callable[[dict[str, any]], "Table"]:
+        """
+        Compiles a row -> model function, once per model. This does what
+        model_construct does, minus the per-field default and alias handling
+        these models don't need, which makes it faster than validating
+        """
+        field_names = tuple(cls.model_fields)
+        fields_set = frozenset(field_names)
+        # DECIMAL columns are read as Decimal, but modelled as float
+        float_fields = tuple(
+            name for name, field in cls.model_fields.items()
+            if float in (get_args(field.annotation) or (field.annotation,))
+        )
+        new = object.__new__
+        set_attr = object.__setattr__
+
+        def build(row: dict[str, any]):
+            values = {name: row.get(name) for name in field_names}
+            for name in float_fields:
+                value = values[name]
+                if value.__class__ is Decimal:
+                    values[name] = float(value)
+
+            table = new(cls)
+            set_attr(table, "__dict__", values)
+            set_attr(table, "__pydantic_fields_set__", set(fields_set))
+            set_attr(table, "__pydantic_extra__", None)
+            set_attr(table, "__pydantic_private__", None)
+            return table
+
+        return build
+
     @classmethod
     def create_update(cls, **kwargs):
         """
@@ -83,7 +331,9 @@ class Table(BaseModel, ABC):
         :param with_commit: Should the database commit when this function is run?
         """
         from db.DatabaseHandler import DB  # Preventing circular imports
-        return DB.insert(self, with_commit)
+        table = DB.insert(self, with_commit)
+        self._cache_write(DB, self.get_primary_key(), table)
+        return table
 
     def delete(self, with_commit=True):
         """
@@ -93,15 +343,128 @@ class Table(BaseModel, ABC):
         """
         from db.DatabaseHandler import DB
         DB.delete(self, with_commit)
+        self._cache_write(DB, self.get_primary_key(), None)
 
-    def update(self, primary_key_value: str | int, with_commit=True):
+    def update(self, primary_key_value: str | int, with_commit=True, read_back=True):
         """
-        Method to update the table contents in the database
+        Method to update the table contents in the database. The updated row
+        is built from the cached row when there is one, instead of read back
 
         :param with_commit: Should the database commit when this function is run?
+        :param read_back: Should an uncached row be read back? If not, only the
+                          updated columns are returned
+        :return: The updated row, or None if there is no such row
         """
+        self._touch()
         from db.DatabaseHandler import DB
-        return DB.update(self, primary_key_value, with_commit)
+        current = self._cached(DB, primary_key_value)
+        table = DB.update(self, primary_key_value, with_commit, current, read_back)
+        self._cache_write(DB, primary_key_value, table if current is not None or read_back else None)
+        return table
+
+    async def ainsert(self, with_commit=True):
+        """
+        Async counterpart to insert
+
+        :param with_commit: Should the database commit when this function is run?
+        """
+        from db.AsyncDatabaseHandler import ADB
+        table = await ADB.insert(self, with_commit)
+        self._cache_write(ADB, self.get_primary_key(), table)
+        return table
+
+    async def adelete(self, with_commit=True):
+        """
+        Async counterpart to delete
+
+        :param with_commit: Should the database commit when this function is run?
+        """
+        from db.AsyncDatabaseHandler import ADB
+        await ADB.delete(self, with_commit)
+        self._cache_write(ADB, self.get_primary_key(), None)
+
+    async def aupdate(self, primary_key_value: str | int, with_commit=True, read_back=True):
+        """
+        Async counterpart to update
+
+        :param with_commit: Should the database commit when this function is run?
+        :param read_back: Should an uncached row be read back?
+        """
+        self._touch()
+        from db.AsyncDatabaseHandler import ADB
+        current = self._cached(ADB, primary_key_value)
+        table = await ADB.update(self, primary_key_value, with_commit, current, read_back)
+        self._cache_write(ADB, primary_key_value, table if current is not None or read_back else None)
+        return table
+
+    def _touch(self) -> None:
+        """
+        Stamps the row as modified now, before it is updated, so that its
+        ModifiedDate (and so its ETag) changes with it. Microseconds are kept
+        for backends that store them, so edits within a second still differ
+        """
+        if MODIFIED_COL in self.model_fields:
+            self.__dict__[MODIFIED_COL] = datetime.now()
+
+    @classmethod
+    def cache(cls) -> LRUCache:
+        """
+        Returns the model's read-through cache of rows, keyed by
+        (table name, primary key)
+        """
+        cache = ENTITY_CACHES.get(cls.table_name())
+        if cache is None:
+            cache = ENTITY_CACHES.setdefault(
+                cls.table_name(), LRUCache(ENTITY_CACHE_SIZE, ENTITY_CACHE_TTL_SECS)
+            )
+        return cache
+
+    @classmethod
+    def cache_key(cls, primary_key_value: str | int) -> tuple[str, str | int]:
+        return cls.table_name(), primary_key_value
+
+    @classmethod
+    def _cached(cls, handler, primary_key_value: str | int):
+        """
+        Returns the cached row, unless the handler is inside a transaction.
+        Transactions bypass the cache, so they read their own writes
+        """
+        if handler.in_transaction():
+            return None
+        return cls.cache().get(cls.cache_key(primary_key_value))
+
+    @classmethod
+    def _cache_invalidate(cls, handler, primary_key_values) -> None:
+        """
+        Drops cached rows after a write that didn't read them back, and
+        again once it has committed (see _cache_write)
+        """
+        cache = cls.cache()
+        keys = [cls.cache_key(primary_key_value) for primary_key_value in primary_key_values]
+
+        def invalidate() -> None:
+            for key in keys:
+                cache.invalidate(key)
+
+        invalidate()
+        handler.after_commit(invalidate)
+
+    def _cache_write(self, handler, primary_key_value: str | int, table) -> None:
+        """
+        Drops the cached row after a write, and refreshes it once the write
+        has committed, or drops it again if the row is gone (or could not be
+        read back). Other requests are never served a row that a rollback
+        could still undo, and the invalidation after the commit refuses rows
+        they read while the write was uncommitted
+        """
+        cache = self.cache()
+        key = self.cache_key(primary_key_value)
+        cache.invalidate(key)
+        if table is None:
+            handler.after_commit(lambda: cache.invalidate(key))
+        else:
+            row = table.model_copy()
+            handler.after_commit(lambda: cache.refresh(key, row))
 
     @classmethod
     def size_g_validate(cls, field_name: str, value: any, max_size: int) -> None:
@@ -131,11 +494,18 @@ class Table(BaseModel, ABC):
     @classmethod
     def unique_validate(cls, field_name, value):
         """
-        Validating a field to be unique
-        """
-        from db.DatabaseHandler import DB
-        if DB.is_in_db(cls, field_name, value):
-            raise ValidationException(f"{field_name} must be unique")
+        Validating a field to be unique. The value is only collected by the
+        current unique batch (see db/Uniqueness.py), and checked along with
+        the rest of the batch in one query by the write path that opened it.
+        Outside a batch nothing is checked, so validating a model never
+        queries the database
+        """
+        if value is None:
+            return
+        from db.Uniqueness import current_unique_batch
+        batch = current_unique_batch()
+        if batch is not None:
+            batch.add(cls, field_name, value)
 
     @classmethod
     def one_of_validate(cls, field_name, value, items: tuple):
@@ -148,15 +518,73 @@ class Table(BaseModel, ABC):
     @classmethod
     def get_from_id(cls, primary_key_value: int):
         """
-        Retrieves a table from the database with a given primary key ID
+        Retrieves a table from the database with a given primary key ID,
+        serving it from the model's cache when possible
         """
         from db.DatabaseHandler import DB
-        record = DB.record(f"SELECT * FROM {cls.table_name()} WHERE {cls.primary_key_name()} = %s", primary_key_value)
+        cache = cls.cache()
+        key = cls.cache_key(primary_key_value)
+        cached = cls._cached(DB, primary_key_value)
+        if cached is not None:
+            # Copies are handed out so callers can't modify the cached row
+            return cached.model_copy()
+
+        generation = cache.generation
+        record = DB.record(cls.statements().select_by_id, primary_key_value)
         if record is not None:
-            return cls(**record)
+            table = cls.from_row(record)
+            # Rows read inside a transaction may hold its uncommitted writes
+            if not DB.in_transaction():
+                cache.put(key, table.model_copy(), generation)
+            return table
         else:
             return None
 
+    @classmethod
+    async def aget_from_id(cls, primary_key_value: int):
+        """
+        Async counterpart to get_from_id
+        """
+        from db.AsyncDatabaseHandler import ADB
+        cache = cls.cache()
+        key = cls.cache_key(primary_key_value)
+        cached = cls._cached(ADB, primary_key_value)
+        if cached is not None:
+            return cached.model_copy()
+
+        generation = cache.generation
+        record = await ADB.record(
+            cls.statements().select_by_id, primary_key_value
+        )
+        if record is not None:
+            table = cls.from_row(record)
+            if not ADB.in_transaction():
+                cache.put(key, table.model_copy(), generation)
+            return table
+        else:
+            return None
+
+    @classmethod
+    async def awarm_cache(cls, primary_key_values: list) -> int:
+        """
+        Loads rows into the model's cache in one query, so the first
+        requests for them are served from the cache
+
+        Returns:
+            int: Amount of rows cached
+        """
+        if not primary_key_values:
+            return 0
+        cache = cls.cache()
+        generation = cache.generation
+        from db.AsyncDatabaseHandler import ADB
+        records = await ADB.records(
+            cls.statements().select_by_ids(len(primary_key_values)), *primary_key_values
+        ) or []
+        for table in cls.from_rows(records):
+            cache.put(cls.cache_key(table.get_primary_key()), table, generation)
+        return len(records)
+
     @classmethod
     def get_next_id(cls) -> int:
         """
@@ -166,3 +594,11 @@ class Table(BaseModel, ABC):
         """
         from db.DatabaseHandler import DB
         return DB.get_next_id(cls)
+
+    @classmethod
+    async def aget_next_id(cls) -> int:
+        """
+        Async counterpart to get_next_id
+        """
+        from db.AsyncDatabaseHandler import ADB
+        return await ADB.get_next_id(cls)
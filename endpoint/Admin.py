@@ -0,0 +1,58 @@
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
+
+from util.Profiler import PROFILER
+
+PSTATS_MEDIA_TYPE = "application/octet-stream"
+
+
+def require_admin(x_profile: str | None = Header(None, description="Profiling token")) -> None:
+    """
+    Only allows requests sending the profiling token
+    """
+    if not PROFILER.is_authorized(x_profile):
+        raise HTTPException(status_code=403, detail="A valid X-Profile token is required")
+
+
+admin_router = APIRouter(prefix="/admin", dependencies=[Depends(require_admin)], include_in_schema=False)
+
+
+@admin_router.get(
+    "/profiles",
+    summary="List captured request profiles",
+    description="The most recent profiled requests, oldest first"
+)
+async def get_profiles():
+    return [profile.summary() for profile in PROFILER.profiles]
+
+
+@admin_router.get(
+    "/profiles/{profile_id}",
+    summary="Download a captured request profile",
+    description="`collapsed` returns the stacks of a sampled profile for flamegraph.pl or speedscope. "
+                "`pstats` returns a cProfile dump readable by pstats.Stats or snakeviz, and "
+                "`text` a pstats report of the slowest functions"
+)
+async def get_profile(
+        profile_id: int,
+        format: str = Query("text", pattern="^(collapsed|pstats|text)$"),
+        sort: str = Query("cumulative", description="pstats sort key for the text report"),
+        limit: int = Query(50, ge=1)
+):
+    profile = PROFILER.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail=f"Profile {profile_id} not found")
+
+    try:
+        if format == "collapsed":
+            return Response(profile.collapsed(), media_type="text/plain")
+        if format == "pstats":
+            return Response(
+                profile.pstats_dump(),
+                media_type=PSTATS_MEDIA_TYPE,
+                headers={"Content-Disposition": f'attachment; filename="profile-{profile_id}.pstats"'}
+            )
+        if profile.stacks is not None:
+            return Response(profile.collapsed(), media_type="text/plain")
+        return Response(profile.pstats_text(sort, limit), media_type="text/plain")
+    except (KeyError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
@@ -1,50 +1,340 @@
-from fastapi import APIRouter, HTTPException
-from db.DatabaseHandler import DB
+from collections import Counter
+from datetime import datetime
+from typing import Any, Literal
+
+from fastapi import APIRouter, Depends, HTTPException, Path, Query, Request, Response
+from fastapi.exceptions import ValidationException
+from pydantic import BaseModel, ValidationError
+from db.AsyncDatabaseHandler import ADB, request_transaction
+from db.Uniqueness import UniqueBatch, request_unique_batch, unique_batch
 from db.model.SalesCustomer import SalesCustomer
 from db.model.SalesOrderHeader import SalesOrderHeader
+from util.Conditional import (
+    entity_validators, is_not_modified, make_etag, not_modified_response, validator_headers
+)
+from util.Accept import negotiate
+from util.Columnar import COLUMNAR_MEDIA_TYPES, columnar_response
+from util.Cursor import decode_cursor, encode_cursor
+from util.Json import FastJSONResponse
+from util.Prefer import minimal_response, wants_minimal
+from util.Stream import NDJSON_MEDIA_TYPE, ndjson_response
+from util.TimedRoute import TimedRoute
 
-customer_router = APIRouter(prefix="/api/customer")
+customer_router = APIRouter(prefix="/api/customer", route_class=TimedRoute)
+
+MAX_PAGE_SIZE = 500
 
 @customer_router.get(
     "/{customer_id}/purchasehistory/{limit}",
     response_model=list[SalesOrderHeader],
     summary="Retrieve the purchase history for a customer",
+    description="Orders are returned oldest first, one page of `limit` (1 to 500) orders at a time. If there "
+                "are more orders, the response has a `Link: <...>; rel=\"next\"` header pointing at the next page. "
+                "Send `Accept: application/x-ndjson` to stream every remaining order instead. "
+                "Pass `fields` to only return some columns. Send `Accept: application/vnd.columnar+json` or "
+                "`Accept: application/msgpack` for the page as `{\"columns\": [...], \"rows\": [[...]]}`, "
+                "which only names each column once. Responses have an ETag and Last-Modified, so "
+                "`If-None-Match` or `If-Modified-Since` get a 304 while the customer's orders are unchanged"
 )
-def get_customer_purchase_history(
+async def get_customer_purchase_history(
+        request: Request,
+        response: Response,
         customer_id: int,
-        limit: int | None = None
+        limit: int = Path(description="Orders per page", ge=1, le=MAX_PAGE_SIZE),
+        cursor: str | None = Query(None, description="Continuation token from the previous page's next link"),
+        fields: str | None = Query(None, description="Comma separated SalesOrderHeader columns to return")
 ):
-    data = DB.records("SELECT * FROM Sales_SalesOrderHeader WHERE CustomerID = %s LIMIT %s", customer_id, limit or 50)
-    if not data:
+    # Projections are pushed down into the query. The sort key is always
+    # selected, as the next page's cursor is built from it
+    cols = None
+    if fields:
+        try:
+            cols = SalesOrderHeader.get_cols(field.strip() for field in fields.split(",") if field.strip())
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+    select = "*" if cols is None else ", ".join(dict.fromkeys(cols + ["OrderDate", "SalesOrderID"]))
+    model = SalesOrderHeader if cols is None else SalesOrderHeader.partial(cols)
+
+    # Keyset pagination on (OrderDate, SalesOrderID) means every page is
+    # an index range scan, no matter how deep the client has paged
+    statement = f"SELECT {select} FROM {SalesOrderHeader.table_name()} WHERE CustomerID = %s"
+    values = [customer_id]
+    if cursor is not None:
+        try:
+            order_date, order_id = decode_cursor(cursor, 2)
+            order_date, order_id = datetime.fromisoformat(order_date), int(order_id)
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Invalid cursor.")
+
+        statement += " AND (OrderDate > %s OR (OrderDate = %s AND SalesOrderID > %s))"
+        values += [order_date, order_date, order_id]
+    statement += " ORDER BY OrderDate, SalesOrderID"
+
+    # Any insert, update or delete of the customer's orders changes the count
+    # or latest ModifiedDate, so clients holding the current page are answered
+    # from one aggregate, before the page is queried or serialised. The ETag
+    # is weak, as a backend storing ModifiedDate to the second can't tell two
+    # edits within the same second apart
+    summary = await ADB.record(
+        f"SELECT COUNT(*) AS orders, MAX(ModifiedDate) AS modified "
+        f"FROM {SalesOrderHeader.table_name()} WHERE CustomerID = %s",
+        customer_id
+    )
+    if summary and summary["orders"]:
+        modified = summary["modified"]
+        etag = make_etag(str(request.url), request.headers.get("accept"), summary["orders"], modified, weak=True)
+        if is_not_modified(request, etag, modified):
+            return not_modified_response(etag, modified)
+        response.headers.update(validator_headers(etag, modified))
+    response.headers["Vary"] = "Accept"
+
+    accepted = negotiate(request, NDJSON_MEDIA_TYPE, *COLUMNAR_MEDIA_TYPES)
+    if accepted == NDJSON_MEDIA_TYPE:
+        # Streams the rest of the history in one response, without holding it in memory
+        return ndjson_response(ADB.stream(statement, *values), model, headers=dict(response.headers))
+
+    media_type = accepted if accepted in COLUMNAR_MEDIA_TYPES else None
+    if media_type is not None:
+        # Rows are read as tuples and sent as they are, without a dict or model per row
+        columns, data = await ADB.tuples(f"{statement} LIMIT %s", *values, limit + 1)
+    else:
+        data = await ADB.records(f"{statement} LIMIT %s", *values, limit + 1)
+
+    if not data and cursor is None:
         raise HTTPException(status_code=404, detail="No purchase history found for this customer.")
-    return [SalesOrderHeader.create_update(**item) for item in data]
+
+    data = data or []
+    if len(data) > limit:
+        data = data[:limit]
+        last = data[-1] if media_type is None else dict(zip(columns, data[-1]))
+        next_url = request.url.include_query_params(
+            cursor=encode_cursor(last["OrderDate"], last["SalesOrderID"])
+        )
+        response.headers["Link"] = f'<{next_url}>; rel="next"'
+
+    if media_type is not None:
+        if cols is not None:
+            # The sort key is selected after the requested columns, only for the cursor
+            columns, data = columns[:len(cols)], [row[:len(cols)] for row in data]
+        return columnar_response(columns, data, media_type, dict(response.headers))
+
+    # Returned as a response, so FastAPI doesn't validate and encode every
+    # order again. Partial models don't fit the response model either way
+    if cols is not None:
+        return FastJSONResponse([model(**item) for item in data], headers=dict(response.headers))
+    return FastJSONResponse(SalesOrderHeader.from_rows(data), headers=dict(response.headers))
+
+
+class CustomerUpdate(BaseModel):
+    """
+    A customer to update in a bulk update, and the columns to change
+    """
+    CustomerID: int
+    changes: dict[str, Any]
+
+
+class BulkOutcome(BaseModel):
+    """
+    What happened to one customer of a bulk update
+    """
+    CustomerID: int
+    status: Literal["updated", "unchanged", "not_found", "invalid", "conflict"]
+    error: str | None = None
+
+
+# Declared before /{customer_id}, which would otherwise match /bulk
+@customer_router.put(
+    "/bulk",
+    response_model=list[BulkOutcome],
+    summary="Edit the details of many customers",
+    description="Pass in a list of `{\"CustomerID\": ..., \"changes\": {...}}` items, where changes holds the "
+                "SalesCustomer columns to edit. Customers changing the same columns are updated together by "
+                "set-based statements, in a single transaction. Items that are invalid, clash with an existing "
+                "unique value, name a missing customer, or share their CustomerID with another item are skipped, "
+                "and one outcome is returned per item, in request order",
+    dependencies=[Depends(request_transaction)]
+)
+async def put_bulk_customer_details(
+        updates: list[CustomerUpdate]
+):
+    if not updates:
+        raise ValidationException("Please add at least one customer")
+
+    # Every item naming a repeated CustomerID is invalid, as there's no
+    # telling which of its changes should win
+    repeated = {
+        customer_id for customer_id, count in Counter(update.CustomerID for update in updates).items() if count > 1
+    }
+    outcomes: dict[int, BulkOutcome] = {}
+    customers: dict[int, SalesCustomer] = {}
+    with unique_batch() as unique:
+        for update in updates:
+            customer_id = update.CustomerID
+            if customer_id in repeated:
+                outcomes[customer_id] = BulkOutcome(
+                    CustomerID=customer_id, status="invalid", error="CustomerID is given more than once"
+                )
+                continue
+            try:
+                SalesCustomer.get_cols(update.changes)
+                with unique.item():
+                    customers[customer_id] = SalesCustomer(
+                        **(dict.fromkeys(SalesCustomer.model_fields) | update.changes | {"CustomerID": None})
+                    )
+            except (ValueError, ValidationException) as e:
+                outcomes[customer_id] = BulkOutcome(CustomerID=customer_id, status="invalid", error=_error(e))
+
+        # Every unique value is checked in one query per column
+        conflicts = await unique.afind_conflicts({SalesCustomer: [update.CustomerID for update in updates]})
+
+    for (_, col), values in conflicts.items():
+        for customer_id, customer in list(customers.items()):
+            if getattr(customer, col) in values:
+                outcomes[customer_id] = BulkOutcome(
+                    CustomerID=customer_id, status="conflict", error=f"{col} must be unique, already in use"
+                )
+                del customers[customer_id]
+
+    found = await SalesCustomer.aupdate_many(customers)
+
+    statements = SalesCustomer.statements()
+    for customer_id, customer in customers.items():
+        if customer_id not in found:
+            outcomes[customer_id] = BulkOutcome(CustomerID=customer_id, status="not_found")
+        elif statements.changed_cols(customer):
+            outcomes[customer_id] = BulkOutcome(CustomerID=customer_id, status="updated")
+        else:
+            outcomes[customer_id] = BulkOutcome(CustomerID=customer_id, status="unchanged")
+
+    return FastJSONResponse([outcomes[update.CustomerID] for update in updates])
+
+
+def _error(e: Exception) -> str:
+    if isinstance(e, ValidationError):
+        return "; ".join(f"{'.'.join(map(str, error['loc']))}: {error['msg']}" for error in e.errors())
+    if isinstance(e, ValidationException):
+        return str(e.errors())
+    return str(e)
+
+
+@customer_router.get(
+    "/{customer_id}",
+    response_model=SalesCustomer,
+    summary="Get a customer by their CustomerID",
+    description="Responses have an ETag and Last-Modified, so `If-None-Match` or `If-Modified-Since` "
+                "get a 304 while the customer is unchanged"
+)
+async def get_customer(
+        request: Request,
+        response: Response,
+        customer_id: int
+):
+    data = await SalesCustomer.aget_from_id(customer_id)
+    if not data:
+        raise HTTPException(status_code=404, detail="Customer not found.")
+
+    etag, modified = entity_validators(data)
+    if is_not_modified(request, etag, modified):
+        return not_modified_response(etag, modified)
+    response.headers.update(validator_headers(etag, modified))
+    return data
 
 
 @customer_router.put(
     "/{customer_id}",
     response_model=SalesCustomer,
     summary="Edit customer details",
-    description="Pass in a SalesCustomer JSON, any non-null fields will edit the original"
+    description="Pass in a SalesCustomer JSON, any non-null fields will edit the original. "
+                "Send `Prefer: return=minimal` to only get back the CustomerID",
+    dependencies=[Depends(request_transaction)]
 )
-def put_customer_details(
+async def put_customer_details(
+        request: Request,
         customer_id: int,
-        customer: SalesCustomer
+        customer: SalesCustomer,
+        unique: UniqueBatch = Depends(request_unique_batch)
+):
+    # All validations are done when creating SalesCustomer from the input,
+    # apart from uniqueness, which is checked here in one query
+    await unique.acheck({SalesCustomer: [customer_id]})
+    minimal = wants_minimal(request)
+    updated = await customer.aupdate(customer_id, read_back=not minimal)
+    if not updated:
+        raise HTTPException(status_code=404, detail="Customer not found.")
+    if minimal:
+        return minimal_response(updated, "updated")
+    return updated
+
+
+class CustomerDelete(BaseModel):
+    """
+    The customers to delete in a bulk delete
+    """
+    ids: list[int]
+    return_rows: bool = False
+
+
+class BulkDeleteResult(BaseModel):
+    """
+    The outcome of a bulk delete
+    """
+    deleted: int
+    not_found: list[int] = []
+    has_orders: list[int] = []
+    rows: list[SalesCustomer] | None = None
+
+
+# Declared before /{customer_id}, which would otherwise match /bulk
+@customer_router.delete(
+    "/bulk",
+    response_model=BulkDeleteResult,
+    summary="Delete many customers",
+    description="Pass in `ids`, a list of CustomerIDs. Customers are deleted by set-based statements, with each "
+                "chunk of customers in its own transaction. Customers that still have orders are kept and "
+                "listed in `has_orders`. Set `return_rows` to return the deleted customers"
+)
+async def delete_bulk_customer(
+        body: CustomerDelete
 ):
-    # All validations are done when creating SalesCustomer from the input
-    return customer.update(customer_id)
+    if not body.ids:
+        raise ValidationException("Please add at least one customer")
+
+    customer_ids = list(dict.fromkeys(body.ids))
+    # Customers with orders are kept by the DELETE itself, so an order
+    # placed while it runs can't be left without its customer
+    deleted, rows = await SalesCustomer.adelete_many(
+        customer_ids,
+        unless_referenced_by=((SalesOrderHeader.table_name(), "CustomerID"),),
+        return_rows=body.return_rows
+    )
+    deleted_ids = set(deleted)
+    has_orders = await ADB.existing_values(
+        SalesCustomer, "CustomerID", [customer_id for customer_id in customer_ids if customer_id not in deleted_ids]
+    )
+    result = BulkDeleteResult(
+        deleted=len(deleted),
+        not_found=[
+            customer_id for customer_id in customer_ids
+            if customer_id not in deleted_ids and customer_id not in has_orders
+        ],
+        has_orders=[customer_id for customer_id in customer_ids if customer_id in has_orders],
+        rows=rows if body.return_rows else None
+    )
+    return FastJSONResponse(result)
 
 
 @customer_router.delete(
     "/{customer_id}",
     response_model=SalesCustomer,
-    summary="Delete a customer from their CustomerID"
+    summary="Delete a customer from their CustomerID",
+    dependencies=[Depends(request_transaction)]
 )
-def delete_customer(
+async def delete_customer(
         customer_id: int
 ):
-    data = SalesCustomer.get_from_id(customer_id)
+    data = await SalesCustomer.aget_from_id(customer_id)
     if not data:
         raise HTTPException(status_code=404, detail="Order not found.")
-    data.delete()
+    await data.adelete()
 
     return data
@@ -0,0 +1,35 @@
+from fastapi import APIRouter
+
+from util.Json import FastJSONResponse
+from util.Metrics import METRICS, Gauge
+from util.Startup import STARTUP
+
+health_router = APIRouter(prefix="/health", include_in_schema=False)
+
+METRICS.register(Gauge(
+    "startup_phase_seconds", "Time taken by each phase of this worker's start up", ("phase",),
+    lambda: [((name,), secs) for name, secs in STARTUP.phases.items()]
+))
+METRICS.register(Gauge(
+    "startup_ready", "Whether this worker has finished warming up (0 or 1)", (),
+    lambda: [((), int(STARTUP.ready))]
+))
+
+
+@health_router.get(
+    "/live",
+    summary="Liveness probe",
+    description="Succeeds whenever the worker can serve requests, even while it warms up or the database is down"
+)
+async def get_live():
+    return {"status": "alive", "uptime_secs": round(STARTUP.uptime_secs(), 1)}
+
+
+@health_router.get(
+    "/ready",
+    summary="Readiness probe",
+    description="Succeeds once the worker has opened its connection pool and warmed its caches, "
+                "otherwise fails with a 503. Also reports the worker's cold start time"
+)
+async def get_ready():
+    return FastJSONResponse(STARTUP.snapshot(), status_code=200 if STARTUP.ready else 503)
@@ -0,0 +1,70 @@
+from fastapi import APIRouter, Response
+
+from db.AsyncDatabaseHandler import ADB
+from db.DatabaseHandler import DB
+from db.model.base.Table import ENTITY_CACHES
+from util.Metrics import METRICS, PROMETHEUS_MEDIA_TYPE, Gauge
+from util.Resilience import RETRY_BUDGET, STATE_VALUES
+
+metrics_router = APIRouter()
+
+
+def _cache_stat(stat: str):
+    """
+    Collects a stat of every model's cache, with len() used for "size"
+    """
+    def collect():
+        return [
+            ((table,), len(cache) if stat == "size" else getattr(cache, stat))
+            for table, cache in ENTITY_CACHES.items()
+        ]
+    return collect
+
+
+METRICS.register(Gauge("entity_cache_size", "Entries held by each model's cache", ("table",), _cache_stat("size")))
+METRICS.register(Gauge("entity_cache_hits", "Lookups served by each model's cache", ("table",), _cache_stat("hits")))
+METRICS.register(Gauge(
+    "entity_cache_misses", "Lookups missed by each model's cache", ("table",), _cache_stat("misses")
+))
+METRICS.register(Gauge(
+    "entity_cache_evictions", "Entries evicted from each model's cache", ("table",), _cache_stat("evictions")
+))
+
+METRICS.register(Gauge(
+    "db_circuit_state", "Circuit breaker state of each handler (0 closed, 1 half open, 2 open)", ("handler",),
+    lambda: [((handler.breaker.name,), STATE_VALUES[handler.breaker.state]) for handler in (DB, ADB)]
+))
+METRICS.register(Gauge(
+    "db_circuit_opened", "Times each handler's circuit breaker has opened", ("handler",),
+    lambda: [((handler.breaker.name,), handler.breaker.opened) for handler in (DB, ADB)]
+))
+METRICS.register(Gauge(
+    "db_retry_budget_tokens", "Retries left in the retry budget", (), lambda: [((), RETRY_BUDGET.tokens)]
+))
+METRICS.register(Gauge(
+    "db_retry_budget_exhausted", "Retries refused by the retry budget", (), lambda: [((), RETRY_BUDGET.exhausted)]
+))
+
+
+@metrics_router.get(
+    "/metrics",
+    summary="Prometheus metrics",
+    description="Statement latency and row counts, slow queries, retries, commits, pool waits, "
+                "request latency and entity cache stats, in the Prometheus text format",
+    include_in_schema=False
+)
+async def get_metrics():
+    return Response(METRICS.render(), media_type=PROMETHEUS_MEDIA_TYPE)
+
+
+@metrics_router.get(
+    "/metrics/circuit",
+    summary="Circuit breaker state",
+    description="State of each database handler's circuit breaker, and the retry budget",
+    include_in_schema=False
+)
+async def get_circuit():
+    return {
+        "circuits": [DB.breaker.snapshot(), ADB.breaker.snapshot()],
+        "retry_budget": {"tokens": round(RETRY_BUDGET.tokens, 2), "exhausted": RETRY_BUDGET.exhausted},
+    }
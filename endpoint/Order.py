@@ -1,21 +1,140 @@
-from fastapi import APIRouter, HTTPException
+from datetime import datetime
+
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from fastapi.exceptions import ValidationException
+from pydantic import BaseModel
+from db.AsyncDatabaseHandler import ADB, request_transaction
+from db.Config import STREAM_BATCH_SIZE
+from db.PopularityIndex import ORDER_DETAIL_TABLE, POPULARITY
 from db.model.SalesOrderHeader import SalesOrderHeader
+from util.Conditional import entity_validators, is_not_modified, not_modified_response, validator_headers
+from util.Json import FastJSONResponse
+from util.Prefer import minimal_response, wants_minimal
+from util.Stream import batched, ndjson_response, wants_ndjson
+from util.TimedRoute import TimedRoute
+
+order_router = APIRouter(prefix="/api/order", route_class=TimedRoute)
+
+
+class OrderDelete(BaseModel):
+    """
+    The orders to delete in a bulk delete, either by ID or by a filter
+    """
+    ids: list[int] | None = None
+    CustomerID: int | None = None
+    before: datetime | None = None
+    return_rows: bool = False
+
+
+class BulkDeleteResult(BaseModel):
+    """
+    The outcome of a bulk delete
+    """
+    deleted: int
+    not_found: list[int] = []
+    rows: list[SalesOrderHeader] | None = None
+
+
+# Declared before /{order_id}, which would otherwise match /bulk
+@order_router.delete(
+    "/bulk",
+    response_model=BulkDeleteResult,
+    summary="Delete many orders",
+    description="Pass in either `ids`, a list of SalesOrderIDs, or a filter of a `CustomerID` and/or orders "
+                "placed `before` a date. Orders and their lines are deleted by set-based statements, with each "
+                "chunk of orders in its own transaction. Set `return_rows` to return the deleted orders"
+)
+async def delete_bulk_order(
+        body: OrderDelete
+):
+    if body.ids is not None:
+        order_ids = body.ids
+    elif body.CustomerID is not None or body.before is not None:
+        order_ids = await _filter_order_ids(body.CustomerID, body.before)
+    else:
+        raise ValidationException("Please give either ids or a CustomerID / before filter")
+
+    # Lines are counted in the same transaction as they are deleted, and
+    # uncounted from the popularity index once it has committed
+    async def remove_sales(chunk: list[int]) -> None:
+        lines = await POPULARITY.orders_lines(chunk)
+        ADB.after_commit(lambda: POPULARITY.remove_sales(lines))
+
+    deleted, rows = await SalesOrderHeader.adelete_many(
+        order_ids,
+        dependents=((ORDER_DETAIL_TABLE, "SalesOrderID"),),
+        return_rows=body.return_rows,
+        before_delete=remove_sales
+    )
+    deleted_ids = set(deleted)
+    result = BulkDeleteResult(
+        deleted=len(deleted),
+        not_found=[order_id for order_id in dict.fromkeys(order_ids) if order_id not in deleted_ids],
+        rows=rows if body.return_rows else None
+    )
+    return FastJSONResponse(result)
+
+
+async def _filter_order_ids(customer_id: int | None, before: datetime | None) -> list[int]:
+    conditions, values = [], []
+    if customer_id is not None:
+        conditions.append("CustomerID = %s")
+        values.append(customer_id)
+    if before is not None:
+        conditions.append("OrderDate < %s")
+        values.append(before)
+    # NOTE: SQL injection is not possible as the f string values
+    # are constants set in code. No user inputs are inserted
+    rows = await ADB.records(
+        f"SELECT SalesOrderID FROM {SalesOrderHeader.table_name()} WHERE {' AND '.join(conditions)}",
+        *values
+    ) or []
+    return [row["SalesOrderID"] for row in rows]
+
+@order_router.get(
+    "/{order_id}",
+    response_model=SalesOrderHeader,
+    summary="Get an order by its OrderID",
+    description="Responses have an ETag and Last-Modified, so `If-None-Match` or `If-Modified-Since` "
+                "get a 304 while the order is unchanged"
+)
+async def get_order(
+        request: Request,
+        response: Response,
+        order_id: int
+):
+    data = await SalesOrderHeader.aget_from_id(order_id)
+    if not data:
+        raise HTTPException(status_code=404, detail="Order not found.")
+
+    etag, modified = entity_validators(data)
+    if is_not_modified(request, etag, modified):
+        return not_modified_response(etag, modified)
+    response.headers.update(validator_headers(etag, modified))
+    return data
 
-order_router = APIRouter(prefix="/api/order")
 
 @order_router.delete(
     "/{order_id}",
     response_model=SalesOrderHeader,
-    summary="Delete an order by its OrderID"
+    summary="Delete an order by its OrderID",
+    dependencies=[Depends(request_transaction)]
 )
-def delete_order(
+async def delete_order(
         order_id: int
 ):
-    data = SalesOrderHeader.get_from_id(order_id)
+    data = await SalesOrderHeader.aget_from_id(order_id)
     if not data:
         raise HTTPException(status_code=404, detail="Order not found.")
-    data.delete()
+
+    # The order's lines are deleted with it, in the request's transaction,
+    # and uncounted from the popularity index once it has committed
+    lines = await POPULARITY.order_lines(order_id)
+    # NOTE: SQL injection is not possible as the f string values
+    # are constants set in code. No user inputs are inserted
+    await ADB.execute(f"DELETE FROM {ORDER_DETAIL_TABLE} WHERE SalesOrderID = %s", order_id)
+    await data.adelete()
+    ADB.after_commit(lambda: POPULARITY.remove_sales(lines))
 
     return data
 
@@ -24,19 +143,21 @@ def delete_order(
 @order_router.post(
     "/bulk",
     response_model=list[SalesOrderHeader],
-    summary="Add one or many orders to the database"
+    summary="Add one or many orders to the database",
+    description="Send `Prefer: return=minimal` to only get back the new SalesOrderIDs"
 )
-def post_bulk_order(
+async def post_bulk_order(
+        request: Request,
         orders: list[SalesOrderHeader]
 ):
     if not orders:
         raise ValidationException("Please add at least one order")
 
-    data = []
-
-    for order in orders:
-        # All validations for orders are done at the tabel level
-        table = SalesOrderHeader.create(**order.dict())
-        data.append(table)
-
-    return data
+    # All validations for orders are done at the table level, before
+    # any of them are written
+    data = await SalesOrderHeader.acreate_many([order.dict() for order in orders])
+    if wants_minimal(request):
+        return minimal_response(data, "created")
+    if wants_ndjson(request):
+        return ndjson_response(batched(data, STREAM_BATCH_SIZE))
+    return FastJSONResponse(data)
@@ -1,10 +1,19 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, Request, Response
 
-from db.DatabaseHandler import DB
+from db.Config import STREAM_BATCH_SIZE
+from db.PopularityIndex import POPULARITY
 from db.model.ProductionProduct import ProductionProduct
-from fastapi.responses import JSONResponse
+from util.Accept import negotiate
+from util.Columnar import COLUMNAR_MEDIA_TYPES, columnar_response
+from util.Conditional import (
+    entity_validators, is_not_modified, make_etag, not_modified_response, validator_headers
+)
+from util.Json import FastJSONResponse
+from util.Prefer import minimal_response, wants_minimal
+from util.Stream import NDJSON_MEDIA_TYPE, batched, ndjson_response
+from util.TimedRoute import TimedRoute
 
-product_router = APIRouter(prefix="/api/product")
+product_router = APIRouter(prefix="/api/product", route_class=TimedRoute)
 
 
 @product_router.get(
@@ -12,44 +21,101 @@ product_router = APIRouter(prefix="/api/product")
     response_model=dict,
     summary="Get the most popular products by their sales",
     description="This will output the product name, number, and the amount sold (Also evidence of providing a "
-                "response that isn't a BaseModel"
+                "response that isn't a BaseModel). Send `Accept: application/x-ndjson` to stream the ranking. "
+                "Send `Accept: application/vnd.columnar+json` or `Accept: application/msgpack` for the ranking "
+                "as `{\"columns\": [...], \"rows\": [[...]]}`. "
+                "Responses have an ETag, and `If-None-Match` gets a 304 until the ranking changes"
 )
-def get_popular():
-    statement = f"SELECT p.Name, p.ProductNumber, COUNT(s.ProductId) as sales FROM {ProductionProduct.table_name()} p LEFT JOIN Sales_SalesOrderDetail s ON p.ProductId = s.ProductID GROUP BY p.ProductID ORDER BY COUNT(s.ProductId) DESC"
-    data = DB.records(statement)
-    return JSONResponse(
+async def get_popular(
+        request: Request,
+        limit: int | None = Query(None, ge=1, description="Only return the top N products")
+):
+    if not POPULARITY.is_built:
+        await POPULARITY.build()
+
+    # The ranking is versioned in memory, so no query is needed to validate it.
+    # There is no Last-Modified, as each worker's index changes at its own times
+    etag = make_etag(POPULARITY.id, POPULARITY.version, limit, request.headers.get("accept"))
+    if is_not_modified(request, etag):
+        return not_modified_response(etag)
+
+    media_type = negotiate(request, NDJSON_MEDIA_TYPE, *COLUMNAR_MEDIA_TYPES)
+    if media_type in COLUMNAR_MEDIA_TYPES:
+        return columnar_response(*POPULARITY.top_columns(limit), media_type, headers={"ETag": etag, "Vary": "Accept"})
+
+    if media_type == NDJSON_MEDIA_TYPE:
+        return ndjson_response(
+            batched(POPULARITY.iter_top(limit), STREAM_BATCH_SIZE), headers={"ETag": etag, "Vary": "Accept"}
+        )
+
+    return FastJSONResponse(
         status_code=200,
         content={
-            "data": data
+            "data": POPULARITY.top(limit)
         },
+        headers={"ETag": etag, "Vary": "Accept"},
     )
 
 
+@product_router.get(
+    "/{product_id}",
+    response_model=ProductionProduct,
+    summary="Get a product by its ProductID",
+    description="Responses have an ETag and Last-Modified, so `If-None-Match` or `If-Modified-Since` "
+                "get a 304 while the product is unchanged"
+)
+async def get_product(
+        request: Request,
+        response: Response,
+        product_id: int
+):
+    product = await ProductionProduct.aget_from_id(product_id)
+    if not product:
+        raise HTTPException(status_code=404, detail="Product not found.")
+
+    etag, modified = entity_validators(product)
+    if is_not_modified(request, etag, modified):
+        return not_modified_response(etag, modified)
+    response.headers.update(validator_headers(etag, modified))
+    return product
+
+
 @product_router.post(
     "/",
     response_model=ProductionProduct,
-    summary="Add a new product to the database"
+    summary="Add a new product to the database",
+    description="Send `Prefer: return=minimal` to only get back the new ProductID"
 )
-def post_product(
+async def post_product(
+        request: Request,
         product: ProductionProduct
 ):
     # All validations are done at a table level
-    return ProductionProduct.create(**product.dict())
+    product = await ProductionProduct.acreate(**product.dict())
+    POPULARITY.add_product(product)
+    if wants_minimal(request):
+        return minimal_response(product, "created")
+    return product
 
 
 @product_router.put(
     "/{product_id}/safety_stock}",
     response_model=ProductionProduct,
     summary="Adjust the safety stock of a product",
-    description="This is evidence of editing a single variable, instead of an entire BaseModel"
+    description="This is evidence of editing a single variable, instead of an entire BaseModel. "
+                "Send `Prefer: return=minimal` to only get back the ProductID"
 )
-def put_stock(
+async def put_stock(
+        request: Request,
         product_id: int,
         safety_stock: int
 ):
-    product = ProductionProduct.get_from_id(product_id)
+    product = await ProductionProduct.aget_from_id(product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found.")
 
     setattr(product, "SafetyStockLevel", safety_stock)
-    return product.update(product_id, product)
+    product = await product.aupdate(product_id)
+    if wants_minimal(request):
+        return minimal_response(product, "updated")
+    return product
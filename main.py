@@ -1,13 +1,91 @@
+# Imported first, so the cold start time includes importing the app
+from util.Startup import STARTUP
+
+import asyncio
+import logging
+import math
+from contextlib import asynccontextmanager, suppress
+
 import uvicorn
 from pydantic import ValidationError
 
+from db.AsyncDatabaseHandler import ADB
+from db.Config import LOG_LEVEL, POPULARITY_RECONCILE_SECS, WARMUP_HOT_PRODUCTS, WARMUP_RETRY_SECS
+from db.DatabaseHandler import DB
+from db.PopularityIndex import POPULARITY
+from db.model.ProductionProduct import ProductionProduct
+from db.model.SalesCustomer import SalesCustomer
+from db.model.SalesOrderHeader import SalesOrderHeader
+from endpoint.Admin import admin_router
 from endpoint.Customer import customer_router
+from endpoint.Health import health_router
+from endpoint.Metrics import metrics_router
 from endpoint.Order import order_router
 from endpoint.Product import product_router
 from fastapi import FastAPI, Request
+from fastapi.exceptions import ValidationException
 from fastapi.responses import JSONResponse
+from util.Json import FastJSONResponse
+from util.Profiler import ProfilingMiddleware
+from util.Resilience import DatabaseUnavailableError
+
+logger = logging.getLogger(__name__)
+
+
+async def warm_up() -> None:
+    """
+    Opens the worker's connection pool, creates any missing indexes, builds
+    the popularity index and caches the best selling products, retrying
+    until the database can be reached. The worker is ready once it finishes
+    """
+    while True:
+        try:
+            with STARTUP.phase("connect"):
+                await ADB.connect()
+            with STARTUP.phase("indexes"):
+                for table in (SalesOrderHeader, SalesCustomer, ProductionProduct):
+                    await ADB.ensure_indexes(table)
+            with STARTUP.phase("popularity"):
+                await POPULARITY.build()
+            with STARTUP.phase("product_cache"):
+                await ProductionProduct.awarm_cache(POPULARITY.top_ids(WARMUP_HOT_PRODUCTS))
+            break
+        except Exception as e:
+            STARTUP.failed(e)
+            logger.error(f"Warm-up failed, retrying in {WARMUP_RETRY_SECS}s: {repr(e)}")
+            await asyncio.sleep(WARMUP_RETRY_SECS)
+
+    POPULARITY.start_reconciling(POPULARITY_RECONCILE_SECS)
+    STARTUP.mark_ready()
 
-app = FastAPI(debug=True)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Runs once per worker, after it has been forked, so every worker opens
+    its own pools on its own event loop rather than inheriting connections.
+    Warm-up runs in the background, so liveness probes are answered while
+    it runs, and /health/ready fails until it finishes
+    """
+    logging.basicConfig(level=LOG_LEVEL)
+    STARTUP.imported()
+    warm_up_task = asyncio.create_task(warm_up())
+    try:
+        yield
+    finally:
+        # Waited for, so an unfinished warm-up can't use the pools as they close
+        warm_up_task.cancel()
+        with suppress(asyncio.CancelledError):
+            await warm_up_task
+        POPULARITY.stop_reconciling()
+        await ADB.close()
+        # The sync pool is only opened by code that uses it
+        if DB.pool is not None:
+            DB.close()
+
+
+app = FastAPI(debug=True, default_response_class=FastJSONResponse, lifespan=lifespan)
+app.add_middleware(ProfilingMiddleware)
 
 
 @app.exception_handler(ValidationError)
@@ -23,10 +101,45 @@ async def validation_error_handler(request: Request, exc: ValidationError):
         },
     )
 
+
+@app.exception_handler(DatabaseUnavailableError)
+async def database_unavailable_handler(request: Request, exc: DatabaseUnavailableError):
+    """
+    Error handler failing requests with a 503 while the database is down,
+    so clients (and load balancers) back off instead of seeing a 500
+    """
+    headers = {}
+    if exc.retry_after_secs:
+        headers["Retry-After"] = str(math.ceil(exc.retry_after_secs))
+    return JSONResponse(
+        status_code=503,
+        content={
+            "detail": "Database unavailable, try again later.",
+        },
+        headers=headers,
+    )
+
+
+@app.exception_handler(ValidationException)
+async def validation_exception_handler(request: Request, exc: ValidationException):
+    """
+    Error handler for the ValidationExceptions raised by Table validators
+    """
+
+    return JSONResponse(
+        status_code=422,
+        content={
+            "validation_error": str(exc.errors()),
+        },
+    )
+
 routers = [
     customer_router,
     order_router,
     product_router,
+    metrics_router,
+    health_router,
+    admin_router,
 ]
 
 for router in routers:
@@ -0,0 +1,51 @@
+import shutil
+import tempfile
+from pathlib import Path
+
+import pytest
+
+import db.Config
+
+"""
+Runs the tests against a generated SQLite database, so that they need no
+MySQL server. The backend is chosen here, before any module reads db.Config
+
+Usage (needs pytest and httpx):
+    python -m pytest tests
+"""
+DATA_DIR = Path(tempfile.mkdtemp(prefix="adventure-works-tests-"))
+db.Config.DB_BACKEND = "sqlite"
+db.Config.SQLITE_PATH = str(DATA_DIR / "adventureworks.sqlite3")
+
+# Customers 1 to CUSTOMER_COUNT each have about ORDER_COUNT / CUSTOMER_COUNT orders
+ORDER_COUNT = 2_000
+CUSTOMER_COUNT = 20
+PRODUCT_COUNT = 50
+
+
+@pytest.fixture(scope="session", autouse=True)
+def database():
+    from benchmark.Seed import seed
+    from db.DatabaseHandler import DB
+    from db.backend.Backend import load_backend
+
+    seed(
+        load_backend(),
+        order_count=ORDER_COUNT,
+        customer_count=CUSTOMER_COUNT,
+        product_count=PRODUCT_COUNT,
+        lines_per_order=2,
+        random_seed=2019,
+    )
+    yield
+    DB.close(log=False)
+    shutil.rmtree(DATA_DIR, ignore_errors=True)
+
+
+@pytest.fixture
+def client():
+    from fastapi.testclient import TestClient
+
+    import main
+    with TestClient(main.app) as client:
+        yield client
@@ -0,0 +1,56 @@
+from db.model.SalesCustomer import SalesCustomer
+
+BULK_URL = "/api/customer/bulk"
+
+
+def test_every_item_gets_its_own_outcome(client):
+    taken = SalesCustomer.get_from_id(9).AccountNumber
+    response = client.put(BULK_URL, json=[
+        {"CustomerID": 10, "changes": {"TerritoryID": 4}},
+        {"CustomerID": 11, "changes": {}},
+        {"CustomerID": 99_999_999, "changes": {"TerritoryID": 1}},
+        {"CustomerID": 12, "changes": {"Missing": 1}},
+        {"CustomerID": 13, "changes": {"AccountNumber": "X" * 20}},
+        {"CustomerID": 14, "changes": {"AccountNumber": taken}},
+        {"CustomerID": 15, "changes": {"AccountNumber": "BULK15"}},
+        {"CustomerID": 16, "changes": {"AccountNumber": "BULK15"}},
+        {"CustomerID": 17, "changes": {"TerritoryID": 1}},
+        {"CustomerID": 17, "changes": {"TerritoryID": 2}},
+    ])
+    assert response.status_code == 200
+    outcomes = response.json()
+    assert [(outcome["CustomerID"], outcome["status"]) for outcome in outcomes] == [
+        (10, "updated"),
+        (11, "unchanged"),
+        (99_999_999, "not_found"),
+        (12, "invalid"),
+        (13, "invalid"),
+        (14, "conflict"),
+        (15, "updated"),
+        (16, "invalid"),
+        (17, "invalid"),
+        (17, "invalid"),
+    ]
+    assert "given more than once" in outcomes[7]["error"]
+    assert "CustomerID is given more than once" == outcomes[8]["error"]
+
+    assert SalesCustomer.get_from_id(10).TerritoryID == 4
+    assert SalesCustomer.get_from_id(14).AccountNumber != taken
+    assert SalesCustomer.get_from_id(15).AccountNumber == "BULK15"
+    assert SalesCustomer.get_from_id(16).AccountNumber != "BULK15"
+
+
+def test_invalid_item_does_not_claim_its_unique_values(client):
+    # The first item's AccountNumber is valid, but the item isn't, so the
+    # same AccountNumber is still free for the next item
+    response = client.put(BULK_URL, json=[
+        {"CustomerID": 18, "changes": {"AccountNumber": "BULK18", "ModifiedDate": "yesterday"}},
+        {"CustomerID": 19, "changes": {"AccountNumber": "BULK18"}},
+    ])
+    assert response.status_code == 200
+    assert [outcome["status"] for outcome in response.json()] == ["invalid", "updated"]
+    assert SalesCustomer.get_from_id(19).AccountNumber == "BULK18"
+
+
+def test_empty_bulk_update_is_rejected(client):
+    assert client.put(BULK_URL, json=[]).status_code == 422
@@ -0,0 +1,59 @@
+from benchmark.Sample import order_row
+from db.DatabaseHandler import DB
+from db.model.SalesOrderHeader import SalesOrderHeader
+
+CUSTOMER_URL = "/api/customer/3"
+HISTORY_URL = "/api/customer/4/purchasehistory/10"
+
+
+def customer_update(**changes) -> dict:
+    return {
+        "CustomerID": None, "PersonID": None, "StoreID": None, "TerritoryID": None,
+        "AccountNumber": None, "rowguid": None, "ModifiedDate": None,
+    } | changes
+
+
+def test_unchanged_customer_is_not_modified(client):
+    response = client.get(CUSTOMER_URL)
+    assert response.status_code == 200
+    etag, last_modified = response.headers["etag"], response.headers["last-modified"]
+
+    response = client.get(CUSTOMER_URL, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == etag
+
+    assert client.get(CUSTOMER_URL, headers={"If-None-Match": f'W/{etag}, "other"'}).status_code == 304
+    assert client.get(CUSTOMER_URL, headers={"If-Modified-Since": last_modified}).status_code == 304
+    assert client.get(CUSTOMER_URL, headers={"If-None-Match": '"other"'}).status_code == 200
+
+
+def test_edits_within_a_second_change_the_etag(client):
+    etags = [client.get(CUSTOMER_URL).headers["etag"]]
+    for store_id in (70, 71):
+        assert client.put(CUSTOMER_URL, json=customer_update(StoreID=store_id)).status_code == 200
+        etags.append(client.get(CUSTOMER_URL).headers["etag"])
+    assert len(set(etags)) == 3
+
+    response = client.get(CUSTOMER_URL, headers={"If-None-Match": etags[1]})
+    assert response.status_code == 200
+    assert response.json()["StoreID"] == 71
+
+
+def test_purchase_history_etag_follows_orders(client):
+    response = client.get(HISTORY_URL)
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+    # COUNT and MAX(ModifiedDate) only summarise the orders
+    assert etag.startswith("W/")
+
+    assert client.get(HISTORY_URL, headers={"If-None-Match": etag}).status_code == 304
+    assert client.get(HISTORY_URL, headers={"If-None-Match": etag[2:]}).status_code == 304
+    assert client.get(HISTORY_URL, headers={"Accept": "application/x-ndjson"}).headers["etag"] != etag
+
+    statements = SalesOrderHeader.statements()
+    row = order_row(0) | {"SalesOrderID": 910_000, "CustomerID": 4}
+    DB.execute(statements.insert, *statements.insert_values(row))
+    response = client.get(HISTORY_URL, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
@@ -0,0 +1,63 @@
+from datetime import timedelta
+
+import pytest
+
+from benchmark.Sample import BASE_DATE, order_row
+from db.DatabaseHandler import DB
+from db.model.SalesOrderHeader import SalesOrderHeader
+from util.Cursor import decode_cursor, encode_cursor
+
+HISTORY_SQL = "SELECT SalesOrderID FROM Sales_SalesOrderHeader WHERE CustomerID = %s ORDER BY OrderDate, SalesOrderID"
+
+
+def purchase_history(client, url: str) -> list[int]:
+    """
+    Follows the next links from the first page to the last, returning the
+    SalesOrderID of every order in the order they were served
+    """
+    order_ids = []
+    while url:
+        response = client.get(url)
+        assert response.status_code == 200
+        order_ids.extend(order["SalesOrderID"] for order in response.json())
+        link = response.headers.get("link")
+        url = link[1:link.index(">")] if link else None
+    return order_ids
+
+
+def test_cursor_round_trip():
+    order_date = BASE_DATE + timedelta(hours=6, minutes=37)
+    token = encode_cursor(order_date, 398)
+    assert "=" not in token
+    assert decode_cursor(token, 2) == [order_date.isoformat(), 398]
+
+
+@pytest.mark.parametrize("token", ["", "bm90IGpzb24", encode_cursor(398), encode_cursor({"OrderDate": 1}, 398)[:-4]])
+def test_invalid_cursor(token):
+    with pytest.raises(ValueError):
+        decode_cursor(token, 2)
+
+
+def test_pages_cover_every_order_once(client):
+    order_ids = purchase_history(client, "/api/customer/1/purchasehistory/7")
+    assert order_ids == [row["SalesOrderID"] for row in DB.records(HISTORY_SQL, 1)]
+
+
+def test_pages_break_order_date_ties(client):
+    # Orders sharing an OrderDate are ordered by SalesOrderID, even when a
+    # page ends between them. They are inserted in reverse, so that the
+    # table's own order can't pass for the sort order
+    statements = SalesOrderHeader.statements()
+    rows = []
+    for order_id in reversed(range(900_000, 900_007)):
+        row = order_row(order_id)
+        row.update(SalesOrderID=order_id, CustomerID=900, OrderDate=BASE_DATE)
+        rows.append(statements.insert_values(row))
+    DB.executemany(statements.insert, rows)
+
+    assert purchase_history(client, "/api/customer/900/purchasehistory/3") == list(range(900_000, 900_007))
+
+
+def test_malformed_cursor_is_rejected(client):
+    response = client.get("/api/customer/1/purchasehistory/7", params={"cursor": encode_cursor(398)})
+    assert response.status_code == 400
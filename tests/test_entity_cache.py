@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+
+from db.AsyncDatabaseHandler import ADB
+from db.DatabaseHandler import DB
+from db.model.SalesCustomer import SalesCustomer
+
+CUSTOMER_ID = 5
+
+
+def customer_change(**changes) -> SalesCustomer:
+    return SalesCustomer(**(dict.fromkeys(SalesCustomer.model_fields) | changes))
+
+
+def cached_store_id() -> int | None:
+    cached = SalesCustomer.cache().get(SalesCustomer.cache_key(CUSTOMER_ID))
+    return None if cached is None else cached.StoreID
+
+
+def test_rollback_leaves_cache_unchanged():
+    store_id = SalesCustomer.get_from_id(CUSTOMER_ID).StoreID
+    assert cached_store_id() == store_id
+
+    with pytest.raises(RuntimeError):
+        with DB.transaction():
+            updated = customer_change(StoreID=store_id + 1).update(CUSTOMER_ID)
+            assert updated.StoreID == store_id + 1
+            # The transaction reads its own write, which isn't cached yet
+            assert SalesCustomer.get_from_id(CUSTOMER_ID).StoreID == store_id + 1
+            assert cached_store_id() is None
+            raise RuntimeError("Rolled back")
+
+    assert cached_store_id() in (None, store_id)
+    assert SalesCustomer.get_from_id(CUSTOMER_ID).StoreID == store_id
+
+
+def test_bulk_rollback_leaves_cache_unchanged():
+    store_id = SalesCustomer.get_from_id(CUSTOMER_ID).StoreID
+
+    with pytest.raises(RuntimeError):
+        with DB.transaction():
+            assert SalesCustomer.update_many({CUSTOMER_ID: customer_change(StoreID=store_id + 1)}) == {CUSTOMER_ID}
+            raise RuntimeError("Rolled back")
+
+    assert cached_store_id() in (None, store_id)
+    assert SalesCustomer.get_from_id(CUSTOMER_ID).StoreID == store_id
+
+
+def test_async_rollback_leaves_cache_unchanged():
+    async def main():
+        await ADB.connect()
+        try:
+            store_id = (await SalesCustomer.aget_from_id(CUSTOMER_ID)).StoreID
+            with pytest.raises(RuntimeError):
+                async with ADB.transaction():
+                    await customer_change(StoreID=store_id + 1).aupdate(CUSTOMER_ID)
+                    assert cached_store_id() is None
+                    raise RuntimeError("Rolled back")
+
+            assert cached_store_id() in (None, store_id)
+            assert (await SalesCustomer.aget_from_id(CUSTOMER_ID)).StoreID == store_id
+        finally:
+            await ADB.close(log=False)
+
+    asyncio.run(main())
+
+
+def test_commit_refreshes_cache():
+    store_id = SalesCustomer.get_from_id(CUSTOMER_ID).StoreID
+
+    with DB.transaction():
+        customer_change(StoreID=store_id + 2).update(CUSTOMER_ID)
+        assert cached_store_id() is None
+
+    assert cached_store_id() in (None, store_id + 2)
+    assert SalesCustomer.get_from_id(CUSTOMER_ID).StoreID == store_id + 2
+    assert cached_store_id() == store_id + 2
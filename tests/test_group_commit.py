@@ -0,0 +1,77 @@
+import asyncio
+import sqlite3
+
+from db.AsyncDatabaseHandler import ADB
+from db.GroupCommit import GroupCommitAbortedError, GroupCommitter
+
+PROBE_TABLE = "GroupCommitProbe"
+INSERT_SQL = f"INSERT INTO {PROBE_TABLE} (ProbeID) VALUES (%s)"
+
+
+def run_batches(test) -> None:
+    """
+    Runs a test against a fresh committer and an empty probe table, on
+    its own event loop
+    """
+    async def main():
+        await ADB.connect()
+        committer = GroupCommitter(ADB, max_batch=8, max_delay_secs=0.05)
+        try:
+            await ADB.execute(f"CREATE TABLE IF NOT EXISTS {PROBE_TABLE} (ProbeID INTEGER PRIMARY KEY)")
+            await ADB.execute(f"DELETE FROM {PROBE_TABLE}")
+            await test(committer)
+        finally:
+            await committer.close()
+            await ADB.close(log=False)
+
+    asyncio.run(main())
+
+
+async def probe_count() -> int:
+    return await ADB.count(f"SELECT COUNT(*) FROM {PROBE_TABLE}")
+
+
+def test_batch_commits_together():
+    async def test(committer):
+        assert await asyncio.gather(*(committer.execute(INSERT_SQL, (i,)) for i in range(5))) == [1] * 5
+        assert await probe_count() == 5
+
+    run_batches(test)
+
+
+def test_failed_statement_fails_every_writer():
+    async def test(committer):
+        results = await asyncio.gather(
+            committer.execute(INSERT_SQL, (1,)),
+            committer.execute(INSERT_SQL, (2,)),
+            committer.execute(f"INSERT INTO {PROBE_TABLE} (Missing) VALUES (%s)", (3,)),
+            return_exceptions=True
+        )
+        # Earlier writers are rolled back with the failing one, which gets its own error
+        assert isinstance(results[0], GroupCommitAbortedError)
+        assert isinstance(results[1], GroupCommitAbortedError)
+        assert isinstance(results[2], sqlite3.OperationalError)
+        assert await probe_count() == 0
+
+        # The next batch starts on a new transaction
+        assert await asyncio.gather(committer.execute(INSERT_SQL, (3,)), committer.execute(INSERT_SQL, (4,))) == [1, 1]
+        assert await probe_count() == 2
+
+    run_batches(test)
+
+
+def test_failed_commit_fails_every_writer():
+    async def test(committer):
+        async def failing_commit():
+            raise sqlite3.OperationalError("disk I/O error")
+
+        writers = [asyncio.create_task(committer.execute(INSERT_SQL, (i,))) for i in range(3)]
+        while len(committer._waiters) < 3:
+            await asyncio.sleep(0)
+        committer._cxn.commit = failing_commit
+
+        results = await asyncio.gather(*writers, return_exceptions=True)
+        assert all(isinstance(result, GroupCommitAbortedError) for result in results)
+        assert await probe_count() == 0
+
+    run_batches(test)
@@ -0,0 +1,76 @@
+from fastapi import Request
+
+JSON_MEDIA_TYPE = "application/json"
+
+# Older clients still ask for msgpack by its unregistered names
+ALIASES = {
+    "application/x-msgpack": "application/msgpack",
+    "application/vnd.msgpack": "application/msgpack",
+}
+
+
+def parse_accept(header: str | None) -> list[tuple[str, float]]:
+    """
+    Parses an Accept header into (media range, q) pairs, in header order.
+    Media ranges without a q are given 1. Parameters other than q are
+    dropped, and ranges with an invalid q are ignored
+
+    Args:
+        header (str, optional): Accept header value
+    """
+    ranges = []
+    for item in (header or "").split(","):
+        media_range, *params = (part.strip() for part in item.split(";"))
+        if not media_range:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = None
+        if q is None or not 0 <= q <= 1:
+            continue
+        media_range = media_range.lower()
+        ranges.append((ALIASES.get(media_range, media_range), q))
+    return ranges
+
+
+def negotiate(request: Request, *media_types: str) -> str:
+    """
+    Picks the representation to respond with, out of JSON (the default) and
+    `media_types`, from the request's Accept header. Each type gets the q of
+    the most specific range matching it, so `application/json,
+    application/msgpack;q=0.1` picks JSON. Types with a q of 0 are never
+    picked. JSON wins ties, and is also returned when the client accepts
+    none of the types, or sends no Accept header
+
+    Args:
+        request (Request): Incoming request
+        media_types (str): Media types the endpoint can respond with, other than JSON
+    """
+    ranges = parse_accept(request.headers.get("accept"))
+    if not ranges:
+        return JSON_MEDIA_TYPE
+
+    best, best_q = JSON_MEDIA_TYPE, _quality(JSON_MEDIA_TYPE, ranges)
+    for media_type in media_types:
+        q = _quality(media_type, ranges)
+        if q > best_q:
+            best, best_q = media_type, q
+    return best
+
+
+def _quality(media_type: str, ranges: list[tuple[str, float]]) -> float:
+    # Exact matches take precedence over type/*, which takes precedence over */*
+    main_type = media_type.split("/")[0]
+    matches = {media_type: None, f"{main_type}/*": None, "*/*": None}
+    for media_range, q in ranges:
+        if media_range in matches and matches[media_range] is None:
+            matches[media_range] = q
+    for q in matches.values():
+        if q is not None:
+            return q
+    return 0.0
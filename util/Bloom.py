@@ -0,0 +1,49 @@
+import hashlib
+import math
+import threading
+from typing import Hashable
+
+
+class BloomFilter:
+    """
+    Bloom Filter
+
+    A set that can only be added to, answering membership with no false
+    negatives and roughly `error_rate` false positives once it holds
+    `capacity` values, in about 10 bits per value at 1%.
+
+    Values are hashed by their repr, so 1 and "1" are different values
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.01) -> None:
+        if capacity < 1:
+            raise ValueError(f"Invalid bloom filter capacity: {capacity}")
+        if not 0 < error_rate < 1:
+            raise ValueError(f"Invalid bloom filter error rate: {error_rate}")
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2), 8)
+        self.hashes = max(round(self.size / capacity * math.log(2)), 1)
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __contains__(self, value: Hashable) -> bool:
+        bits = self._bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+    def add(self, value: Hashable) -> None:
+        positions = list(self._positions(value))
+        with self._lock:
+            for position in positions:
+                self._bits[position >> 3] |= 1 << (position & 7)
+            self.count += 1
+
+    def _positions(self, value: Hashable):
+        # Double hashing, deriving every position from one 128 bit digest
+        digest = hashlib.blake2b(repr(value).encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
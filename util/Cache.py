@@ -0,0 +1,120 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Hashable
+
+MISSING = object()
+
+
+class LRUCache:
+    """
+    LRU Cache
+
+    A thread-safe, size-bounded cache that evicts the least recently used entry
+    once full, with an optional time to live for every entry.
+
+    Writes bump a generation counter, so that a value read from the database
+    before a write can be refused instead of overwriting the fresher entry
+    """
+
+    def __init__(self, max_size: int = 1024, ttl_secs: float | None = None) -> None:
+        if max_size < 1:
+            raise ValueError(f"Invalid cache size: {max_size}")
+        self.max_size = max_size
+        self.ttl_secs = ttl_secs
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: OrderedDict[Hashable, tuple[any, float | None]] = OrderedDict()
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def generation(self) -> int:
+        """
+        Counter bumped by every invalidation. Capture it before reading
+        from the source and pass it to put to avoid caching stale data
+        """
+        return self._generation
+
+    def get(self, key: Hashable, default: any = None) -> any:
+        """
+        Returns the cached value of a key, or `default` if it is not
+        cached or has expired
+        """
+        with self._lock:
+            entry = self._entries.get(key, MISSING)
+            if entry is MISSING:
+                self.misses += 1
+                return default
+
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                self.misses += 1
+                return default
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: any, generation: int | None = None) -> bool:
+        """
+        Caches a value, evicting the least recently used entry if full
+
+        Args:
+            key (Hashable): Cache key
+            value (any): Value to cache
+            generation (int, optional): The generation captured before the value was read.
+            The value is not cached if an invalidation has happened since.
+
+        Returns:
+            bool: If the value was cached
+        """
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return False
+
+            expires_at = time.monotonic() + self.ttl_secs if self.ttl_secs else None
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            return True
+
+    def refresh(self, key: Hashable, value: any) -> None:
+        """
+        Replaces a cached value after a write, invalidating any reads in flight
+        """
+        with self._lock:
+            self._generation += 1
+        self.put(key, value)
+
+    def invalidate(self, key: Hashable) -> None:
+        """
+        Removes a key after a write, invalidating any reads in flight
+        """
+        with self._lock:
+            self._generation += 1
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def stats(self) -> dict[str, int]:
+        """
+        Returns the hit, miss and eviction counters
+        """
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,49 @@
+from datetime import date
+from decimal import Decimal
+from typing import Any
+
+import msgpack
+from fastapi.responses import Response
+
+from util.Json import dumps
+
+# Both hold {"columns": [...], "rows": [[...], ...]}, so column names are
+# only sent once rather than once per row. Clients ask for them in their
+# Accept header, see util/Accept.py
+COLUMNAR_JSON_MEDIA_TYPE = "application/vnd.columnar+json"
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+COLUMNAR_MEDIA_TYPES = (COLUMNAR_JSON_MEDIA_TYPE, MSGPACK_MEDIA_TYPE)
+
+
+def columnar_response(
+        columns: list[str],
+        rows: list[tuple] | list[list],
+        media_type: str,
+        headers: dict[str, str] | None = None
+) -> Response:
+    """
+    Responds with rows in one of the COLUMNAR_MEDIA_TYPES.
+    The caller's headers should include `Vary: Accept`
+
+    Args:
+        columns (list[str]): Column names
+        rows (list): Rows as tuples, in column order, such as those read by ADB.tuples
+        media_type (str): COLUMNAR_JSON_MEDIA_TYPE or MSGPACK_MEDIA_TYPE
+        headers (dict, optional): Other response headers. Defaults to None.
+    """
+    content = {"columns": columns, "rows": rows}
+    if media_type == MSGPACK_MEDIA_TYPE:
+        body = msgpack.packb(content, default=_msgpack_default)
+    else:
+        body = dumps(content)
+    return Response(body, media_type=media_type, headers=headers)
+
+
+def _msgpack_default(value: Any) -> Any:
+    # msgpack only has timestamps for timezone aware datetimes, so
+    # dates are sent as ISO 8601 strings, as they are in JSON
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Cannot serialise {type(value).__name__}")
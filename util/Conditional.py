@@ -0,0 +1,84 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+from fastapi import Request, Response
+
+from db.model.base.Table import MODIFIED_COL
+
+
+def make_etag(*parts, weak: bool = False) -> str:
+    """
+    Builds an ETag from the values identifying one version of a resource
+
+    Args:
+        parts: Values that change whenever the resource does
+        weak (bool, optional): Marks the ETag weak, for values that summarise
+        the resource and may miss a change to it. Defaults to False.
+    """
+    etag = f'"{hashlib.blake2b(repr(parts).encode(), digest_size=12).hexdigest()}"'
+    return f"W/{etag}" if weak else etag
+
+
+def entity_validators(table) -> tuple[str, datetime | str | None]:
+    """
+    Returns the ETag and Last-Modified of a row. The ETag is taken from
+    every column, so two edits within the same second still differ, as
+    ModifiedDate may only be stored to the second
+
+    Args:
+        table (Table): Db row
+    """
+    return make_etag(table.table_name(), table.__dict__), table.__dict__.get(MODIFIED_COL)
+
+
+def validator_headers(etag: str, last_modified: datetime | str | None = None) -> dict[str, str]:
+    """
+    Returns the ETag and Last-Modified headers of a response
+    """
+    headers = {"ETag": etag}
+    if last_modified is not None:
+        headers["Last-Modified"] = format_datetime(_utc(last_modified), usegmt=True)
+    return headers
+
+
+def is_not_modified(request: Request, etag: str, last_modified: datetime | str | None = None) -> bool:
+    """
+    Checks if the client already has this version of a resource, from its
+    If-None-Match header, or its If-Modified-Since header when it sends no
+    If-None-Match, as RFC 9110 requires
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        # If-None-Match uses the weak comparison
+        return "*" in tags or etag.removeprefix("W/") in (tag.removeprefix("W/") for tag in tags)
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is None or last_modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    # HTTP dates only have whole seconds
+    return _utc(last_modified).replace(microsecond=0) <= since
+
+
+def not_modified_response(etag: str, last_modified: datetime | str | None = None) -> Response:
+    """
+    An empty 304 response, sent instead of querying and serialising the resource again
+    """
+    return Response(status_code=304, headers=validator_headers(etag, last_modified))
+
+
+def _utc(value: datetime | str) -> datetime:
+    # SQLite returns DATETIME columns as text. Naive datetimes are
+    # taken to be UTC
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
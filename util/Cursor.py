@@ -0,0 +1,41 @@
+import base64
+import binascii
+import json
+from datetime import date
+
+
+def encode_cursor(*values) -> str:
+    """
+    Encodes the sort key of the last row on a page into an opaque,
+    URL safe continuation token
+    """
+    payload = json.dumps(values, default=_to_json, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str, size: int) -> list:
+    """
+    Decodes a continuation token back into its sort key values
+
+    Args:
+        token (str): Continuation token
+        size (int): Amount of values the token must hold
+
+    Raises:
+        ValueError: If the token is malformed
+    """
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {token}") from e
+
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError(f"Invalid cursor: {token}")
+    return values
+
+
+def _to_json(value):
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f"Cannot encode {type(value).__name__} in a cursor")
@@ -0,0 +1,335 @@
+import logging
+import re
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Iterable, Iterator
+
+from db.Config import METRICS_ENABLED, SLOW_QUERY_SECS
+
+logger = logging.getLogger(__name__)
+
+PROMETHEUS_MEDIA_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+SECONDS_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ROWS_BUCKETS = (0, 1, 5, 10, 50, 100, 500, 1_000, 5_000, 10_000, 50_000)
+COMMITS_BUCKETS = (0, 1, 2, 3, 5, 10, 25)
+
+# Normalised statements are cached up to this many distinct SQL strings
+MAX_NORMALISED = 4_096
+# Each metric keeps at most this many series. Observations with label values
+# beyond them are recorded under OVERFLOW_LABEL, so a runaway label can't grow
+# the metrics (and /metrics) without bound
+MAX_SERIES = 1_000
+OVERFLOW_LABEL = "__overflow__"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _series_key(series: dict, label_values: tuple) -> tuple:
+    """
+    Returns the key to record label values under: themselves, or the
+    overflow labels once the metric holds MAX_SERIES other series
+    """
+    if label_values in series or len(series) < MAX_SERIES:
+        return label_values
+    return (OVERFLOW_LABEL,) * len(label_values)
+
+
+class Counter:
+    """
+    A monotonically increasing count per set of label values
+    """
+
+    def __init__(self, name: str, description: str, labels: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount: float = 1) -> None:
+        with self._lock:
+            key = _series_key(self._values, label_values)
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.description}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            items = list(self._values.items())
+        for label_values, value in items:
+            yield f"{self.name}{_format_labels(self.labels, label_values)} {value}"
+
+
+class Histogram:
+    """
+    Counts of observations per bucket, along with their sum, per set of label values
+    """
+
+    def __init__(
+            self,
+            name: str,
+            description: str,
+            labels: tuple[str, ...] = (),
+            buckets: tuple[float, ...] = SECONDS_BUCKETS
+    ) -> None:
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.buckets = buckets
+        # Per label values: [count per bucket..., count above the last bucket, sum]
+        self._series: dict[tuple, list[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            key = _series_key(self._series, label_values)
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.description}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            items = [(label_values, list(series)) for label_values, series in self._series.items()]
+        for label_values, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                labels = _format_labels(self.labels, label_values, f'le="{bound}"')
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            cumulative += series[-2]
+            labels = _format_labels(self.labels, label_values, 'le="+Inf"')
+            yield f"{self.name}_bucket{labels} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labels, label_values)} {series[-1]}"
+            yield f"{self.name}_count{_format_labels(self.labels, label_values)} {cumulative}"
+
+
+class Gauge:
+    """
+    A value read when the metrics are rendered, from a callback returning
+    (label values, value) pairs
+    """
+
+    def __init__(
+            self,
+            name: str,
+            description: str,
+            labels: tuple[str, ...],
+            collect: Callable[[], Iterable[tuple[tuple, float]]]
+    ) -> None:
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.collect = collect
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.description}"
+        yield f"# TYPE {self.name} gauge"
+        for label_values, value in self.collect():
+            yield f"{self.name}{_format_labels(self.labels, label_values)} {value}"
+
+
+class RequestTimings:
+    """
+    Time spent by the current request, split into database work, the
+    endpoint's own code and serialisation of its response
+    """
+
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.db_secs = 0.0
+        self.commits = 0
+        # Clock and database time when the endpoint was called and returned
+        self._endpoint_started: tuple[float, float] | None = None
+        self._endpoint_finished: tuple[float, float] | None = None
+
+    def start_endpoint(self) -> None:
+        self._endpoint_started = (time.perf_counter(), self.db_secs)
+
+    def finish_endpoint(self) -> None:
+        self._endpoint_finished = (time.perf_counter(), self.db_secs)
+
+    def server_timing(self, total_secs: float) -> str:
+        """
+        Formats the timings as a Server-Timing header value, in milliseconds.
+        Serialisation is everything after the endpoint returned, apart from
+        database work (the commit of a request transaction)
+        """
+        app_secs = serialize_secs = 0.0
+        if self._endpoint_started is not None and self._endpoint_finished is not None:
+            (started, db_at_start), (finished, db_at_finish) = self._endpoint_started, self._endpoint_finished
+            app_secs = (finished - started) - (db_at_finish - db_at_start)
+            serialize_secs = (self.started + total_secs - finished) - (self.db_secs - db_at_finish)
+        return (
+            f"db;dur={self.db_secs * 1e3:.2f}, "
+            f"app;dur={max(app_secs, 0) * 1e3:.2f}, "
+            f"serialize;dur={max(serialize_secs, 0) * 1e3:.2f}, "
+            f"total;dur={total_secs * 1e3:.2f}"
+        )
+
+
+class Metrics:
+    """
+    Metrics
+
+    In-process instrumentation of the database layer and the API, rendered
+    in the Prometheus text format by /metrics. Recording a metric is a lock
+    and a few additions, so it stays cheap next to a database round trip.
+
+    Statements are keyed by their SQL with whitespace collapsed, literals
+    replaced by ? and repeated lists of them (IN lists, CASE arms) collapsed
+    to one, so that every execution of the same query shares a series
+    """
+
+    def __init__(self, enabled: bool = METRICS_ENABLED, slow_query_secs: float | None = SLOW_QUERY_SECS) -> None:
+        self.enabled = enabled
+        self.slow_query_secs = slow_query_secs
+        self._normalised: dict[str, str] = {}
+        self._request: ContextVar[RequestTimings | None] = ContextVar("request_timings", default=None)
+
+        self.statement_seconds = Histogram(
+            "db_statement_duration_seconds", "Time taken by each SQL statement", ("statement",)
+        )
+        self.statement_rows = Histogram(
+            "db_statement_rows", "Rows returned by each SQL statement", ("statement",), ROWS_BUCKETS
+        )
+        self.slow_statements = Counter(
+            "db_slow_statements_total", "Statements slower than the slow query threshold", ("statement",)
+        )
+        self.retries = Counter("db_retries_total", "Retries taken by @repeat", ("function",))
+        self.commits = Counter("db_commits_total", "Commits, by how they were made", ("mode",))
+        self.pool_wait_seconds = Histogram(
+            "db_pool_wait_seconds", "Time spent waiting to check out a connection", ("pool",)
+        )
+        self.request_seconds = Histogram(
+            "http_request_duration_seconds", "Request latency per endpoint", ("method", "route", "status")
+        )
+        self.request_commits = Histogram(
+            "http_request_commits", "Commits made per request", ("method", "route"), COMMITS_BUCKETS
+        )
+        self._metrics: list = [
+            self.statement_seconds, self.statement_rows, self.slow_statements, self.retries,
+            self.commits, self.pool_wait_seconds, self.request_seconds, self.request_commits,
+        ]
+
+    def register(self, metric) -> None:
+        """
+        Adds a metric (usually a Gauge) to the rendered output
+        """
+        self._metrics.append(metric)
+
+    def normalise(self, command: str) -> str:
+        """
+        Collapses an SQL command into the key its metrics are recorded under
+        """
+        normalised = self._normalised.get(command)
+        if normalised is None:
+            normalised = " ".join(command.split())
+            normalised = re.sub(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b|%s", "?", normalised)
+            normalised = re.sub(r"\((?:\?\s*,\s*)+\?\)", "(?)", normalised)
+            normalised = re.sub(r"(?:WHEN \? THEN \? )+", "WHEN ? THEN ? ", normalised)
+            if len(self._normalised) < MAX_NORMALISED:
+                self._normalised[command] = normalised
+        return normalised
+
+    def observe_statement(self, command: str, secs: float) -> None:
+        """
+        Records the duration of a statement, logging it if it was slow
+        """
+        if not self.enabled:
+            return
+        statement = self.normalise(command)
+        self.statement_seconds.observe(secs, statement)
+        timings = self._request.get()
+        if timings is not None:
+            timings.db_secs += secs
+        if self.slow_query_secs is not None and secs >= self.slow_query_secs:
+            self.slow_statements.inc(statement)
+            logger.warning(f"Slow query ({secs * 1e3:,.1f}ms): {statement}")
+
+    def observe_rows(self, command: str, data: any) -> None:
+        """
+        Records how many rows a statement returned, given its fetched data
+        """
+        if not self.enabled:
+            return
+        if isinstance(data, list):
+            count = len(data)
+        else:
+            count = 0 if data is None else 1
+        self.statement_rows.observe(count, self.normalise(command))
+
+    def retry(self, function_name: str) -> None:
+        if self.enabled:
+            self.retries.inc(function_name)
+
+    def commit(self, mode: str) -> None:
+        """
+        Counts a commit. Modes are "transaction", "autocommit" and "group"
+        """
+        if not self.enabled:
+            return
+        self.commits.inc(mode)
+        timings = self._request.get()
+        if timings is not None:
+            timings.commits += 1
+
+    def pool_wait(self, pool: str, secs: float) -> None:
+        if self.enabled:
+            self.pool_wait_seconds.observe(secs, pool)
+
+    def start_request(self) -> tuple[RequestTimings | None, any]:
+        """
+        Starts timing a request in the current context
+
+        Returns:
+            tuple: The request's timings (None if disabled), and the token to finish it with
+        """
+        if not self.enabled:
+            return None, None
+        timings = RequestTimings()
+        return timings, self._request.set(timings)
+
+    def finish_request(self, timings: RequestTimings, token: any, method: str, route: str, status: int) -> float:
+        """
+        Records a finished request
+
+        Returns:
+            float: Total time taken by the request, in seconds
+        """
+        total_secs = time.perf_counter() - timings.started
+        self._request.reset(token)
+        self.request_seconds.observe(total_secs, method, route, status)
+        self.request_commits.observe(timings.commits, method, route)
+        return total_secs
+
+    def current_request(self) -> RequestTimings | None:
+        return self._request.get()
+
+    def render(self) -> str:
+        """
+        Renders every metric in the Prometheus text format
+        """
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+METRICS = Metrics()
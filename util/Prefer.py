@@ -0,0 +1,37 @@
+from fastapi import Request
+
+from db.model.base.Table import Table
+from util.Json import FastJSONResponse
+
+RETURN_MINIMAL = "return=minimal"
+
+
+def wants_minimal(request: Request) -> bool:
+    """
+    Checks if the client sent `Prefer: return=minimal`, asking for only the
+    ID and status of the rows it wrote, rather than the rows themselves
+    """
+    return any(
+        preference.split(";")[0].strip().lower() == RETURN_MINIMAL
+        for header in request.headers.getlist("prefer")
+        for preference in header.split(",")
+    )
+
+
+def minimal_response(tables: Table | list[Table], status: str, status_code: int = 200) -> FastJSONResponse:
+    """
+    Responds with the primary key and status of each written row
+
+    Args:
+        tables (Table | list[Table]): The written row(s). A list is answered with a list
+        status (str): What happened to the rows, e.g. "created"
+        status_code (int, optional): Response status. Defaults to 200.
+    """
+    def summary(table: Table) -> dict[str, any]:
+        return {table.primary_key_name(): table.get_primary_key(), "status": status}
+
+    return FastJSONResponse(
+        status_code=status_code,
+        content=[summary(table) for table in tables] if isinstance(tables, list) else summary(tables),
+        headers={"Preference-Applied": RETURN_MINIMAL}
+    )
@@ -0,0 +1,265 @@
+import cProfile
+import hmac
+import io
+import itertools
+import logging
+import marshal
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime
+
+from db.Config import (
+    PROFILE_KEEP, PROFILE_MODE, PROFILE_SAMPLE_EVERY, PROFILE_SAMPLE_INTERVAL_SECS, PROFILE_TOKEN
+)
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = b"x-profile"
+PROFILE_MODE_HEADER = b"x-profile-mode"
+PROFILE_ID_HEADER = b"x-profile-id"
+MODES = ("cprofile", "sample")
+# Fetching profiles sends the token too, but isn't worth profiling
+UNPROFILED_PREFIX = "/admin/"
+
+
+class StackSampler:
+    """
+    Stack Sampler
+
+    A statistical profiler that records the stack of one thread every
+    `interval_secs` from a background thread. Stacks are kept collapsed
+    (outermost frame first, separated by ;) with the number of samples seen,
+    the format read by flamegraph.pl and speedscope. As it samples wall
+    clock time, time spent by the event loop waiting on the database shows
+    up under the loop's selector
+    """
+
+    def __init__(self, thread_id: int, interval_secs: float = 0.001) -> None:
+        self.thread_id = thread_id
+        self.interval_secs = interval_secs
+        self.counts: Counter[str] = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> Counter[str]:
+        self._stop.set()
+        self._thread.join()
+        return self.counts
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_secs):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.counts[";".join(reversed(stack))] += 1
+
+
+class Profile:
+    """
+    A captured profile of one request
+    """
+
+    def __init__(self, profile_id: int, method: str, path: str, mode: str) -> None:
+        self.id = profile_id
+        self.method = method
+        self.path = path
+        self.mode = mode
+        self.started = datetime.now()
+        self.duration_secs = 0.0
+        self.status: int | None = None
+        # pstats data for cProfile profiles, collapsed stacks for sampled ones
+        self.stats: dict | None = None
+        self.stacks: Counter[str] | None = None
+        self._profiler: cProfile.Profile | StackSampler | None = None
+        self._started = 0.0
+
+    def summary(self) -> dict[str, any]:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "mode": self.mode,
+            "status": self.status,
+            "started": self.started.isoformat(timespec="milliseconds"),
+            "duration_ms": round(self.duration_secs * 1e3, 2),
+        }
+
+    def collapsed(self) -> str:
+        """
+        Renders sampled stacks as "frame;frame;frame count" lines
+        """
+        if self.stacks is None:
+            raise ValueError("Only sampled profiles have collapsed stacks")
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def pstats_dump(self) -> bytes:
+        """
+        Renders a cProfile profile in the format written by pstats.Stats.dump_stats,
+        readable by pstats.Stats(path) and snakeviz
+        """
+        if self.stats is None:
+            raise ValueError("Only cProfile profiles have a pstats dump")
+        return marshal.dumps(self.stats)
+
+    def pstats_text(self, sort: str = "cumulative", limit: int = 50) -> str:
+        if self.stats is None:
+            raise ValueError("Only cProfile profiles have pstats")
+        stream = io.StringIO()
+        stats = pstats.Stats(stream=stream)
+        stats.stats = self.stats
+        stats.get_top_level_stats()
+        stats.sort_stats(sort).print_stats(limit)
+        return stream.getvalue()
+
+
+class Profiler:
+    """
+    Profiler
+
+    Decides which requests to profile, and keeps the last `keep` profiles.
+    A request is profiled if it sends the profiling token in an X-Profile
+    header, or if it is one of every `sample_every` requests. Only one
+    request is profiled at a time, as both profilers observe the whole
+    event loop thread, so anything else the loop runs meanwhile (other
+    requests, background tasks) is included in the profile
+
+    NOTE: Profiling is disabled unless a token or sampling rate is set
+    """
+
+    def __init__(
+            self,
+            token: str | None = PROFILE_TOKEN,
+            sample_every: int = PROFILE_SAMPLE_EVERY,
+            keep: int = PROFILE_KEEP,
+            mode: str = PROFILE_MODE,
+            interval_secs: float = PROFILE_SAMPLE_INTERVAL_SECS
+    ) -> None:
+        if mode not in MODES:
+            raise ValueError(f"Invalid profiling mode: {mode}")
+        self.token = token
+        self.sample_every = sample_every
+        self.mode = mode
+        self.interval_secs = interval_secs
+        self.profiles: deque[Profile] = deque(maxlen=keep)
+        self._ids = itertools.count(1)
+        self._requests = itertools.count(1)
+        self._busy = False
+
+    @property
+    def enabled(self) -> bool:
+        return self.token is not None or self.sample_every > 0
+
+    def is_authorized(self, token: str | bytes | None) -> bool:
+        if self.token is None or token is None:
+            return False
+        if isinstance(token, bytes):
+            token = token.decode("latin-1")
+        return hmac.compare_digest(token, self.token)
+
+    def should_profile(self, token: bytes | None) -> bool:
+        """
+        Checks if a request should be profiled, given its X-Profile header
+        """
+        if self._busy:
+            return False
+        if token is not None and self.is_authorized(token):
+            return True
+        return self.sample_every > 0 and next(self._requests) % self.sample_every == 0
+
+    def get(self, profile_id: int) -> Profile | None:
+        for profile in self.profiles:
+            if profile.id == profile_id:
+                return profile
+        return None
+
+    def start(self, method: str, path: str, mode: str | None = None) -> Profile:
+        """
+        Starts profiling the current thread
+        """
+        profile = Profile(next(self._ids), method, path, mode if mode in MODES else self.mode)
+        self._busy = True
+        if profile.mode == "sample":
+            profile._profiler = StackSampler(threading.get_ident(), self.interval_secs)
+            profile._profiler.start()
+        else:
+            profile._profiler = cProfile.Profile()
+            profile._profiler.enable()
+        profile._started = time.perf_counter()
+        return profile
+
+    def finish(self, profile: Profile, status: int | None) -> None:
+        """
+        Stops profiling, and stores the profile
+        """
+        profile.duration_secs = time.perf_counter() - profile._started
+        profile.status = status
+        if profile.mode == "sample":
+            profile.stacks = profile._profiler.stop()
+        else:
+            profile._profiler.disable()
+            profile._profiler.create_stats()
+            profile.stats = profile._profiler.stats
+        profile._profiler = None
+        self._busy = False
+        self.profiles.append(profile)
+        logger.info(
+            f"Profiled {profile.method} {profile.path} in {profile.duration_secs * 1e3:,.1f}ms "
+            f"({profile.mode}, id {profile.id})"
+        )
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware that profiles the requests chosen by the profiler. A
+    profiled response has an X-Profile-ID header, which identifies the
+    profile on /admin/profiles.
+
+    It is plain ASGI rather than an @app.middleware function, so a request
+    that isn't profiled only pays for a header lookup and a counter
+    """
+
+    def __init__(self, app, profiler: "Profiler | None" = None) -> None:
+        self.app = app
+        self.profiler = profiler or PROFILER
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http" or not self.profiler.enabled or scope["path"].startswith(UNPROFILED_PREFIX):
+            return await self.app(scope, receive, send)
+
+        token = mode = None
+        for name, value in scope["headers"]:
+            if name == PROFILE_HEADER:
+                token = value
+            elif name == PROFILE_MODE_HEADER:
+                mode = value.decode("latin-1")
+        if not self.profiler.should_profile(token):
+            return await self.app(scope, receive, send)
+
+        profile = self.profiler.start(scope["method"], scope["path"], mode)
+        status = None
+
+        async def send_with_id(message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = [*message.get("headers", []), (PROFILE_ID_HEADER, str(profile.id).encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            self.profiler.finish(profile, status)
+
+
+PROFILER = Profiler()
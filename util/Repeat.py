@@ -1,48 +1,68 @@
 from functools import wraps
 from typing import Callable
-from random import random as rand_float
-import logging, time
+import asyncio, inspect, logging, time
+
+from util.Metrics import METRICS
+from util.Resilience import backoff
 
 logger = logging.getLogger("Repeat")
 
 
-def repeat(retries: int = 3, delay_secs: float = 0.5, max_delay_secs: float | None = None):
+def repeat(
+        retries: int = 3,
+        delay_secs: float = 0.5,
+        max_delay_secs: float | None = None,
+        exceptions: tuple[type[Exception], ...] = (Exception,)
+):
     """
     A decorator that repeats a function a select amount of times
 
     This is an extension to https://github.com/indently/five_decorators/blob/main/decorators/001_retry.py
     where I have added further error handling, as well as a scalable jitter, found in real life APIs
+
+    Coroutine functions are awaited, and back off with asyncio.sleep so the event loop
+    is never blocked between attempts. Once every attempt has failed, the last error is raised
+
+    NOTE: Database calls use util.Resilience.resilient instead, which only retries transient
+    errors, within a retry budget and circuit breaker
     """
+    if retries < 1:
+        raise ValueError(f"Invalid retry count: {retries}")
+
     def decorator(func: Callable):
+        max_delay = max_delay_secs if max_delay_secs else delay_secs * 10
+
+        if inspect.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                for i in range(1, retries + 1):
+                    logger.debug(f"Attempt: {i:,} - {repr(func)}")
+                    try:
+                        return await func(*args, **kwargs)
+                    except exceptions as e:
+                        if i == retries:
+                            logger.critical(f"Attempt failed: {repr(e)}")
+                            raise
+
+                        METRICS.retry(func.__qualname__)
+                        await asyncio.sleep(backoff(i, delay_secs, max_delay))
+
+            return async_wrapper
+
         @wraps(func)  # Ensures docs transfer properly
         def wrapper(*args, **kwargs):
-            exceptions = set()
-            delay = delay_secs
-            max_delay = max_delay_secs if max_delay_secs else delay * 10
-            for i in range(1, retries - 1):
+            for i in range(1, retries + 1):
                 logger.debug(f"Attempt: {i:,} - {repr(func)}")
                 try:
                     return func(*args, **kwargs)
-                except Exception as e:
+                except exceptions as e:
                     if i == retries:
-                        break
-
-                    exceptions.add(repr(e))
-                    # NOTE: This would be asyncio.sleep if the assignment allowed for asynchronous
-                    # database connections
-                    time.sleep(_get_delay(delay, max_delay, i - 1))
+                        logger.critical(f"Attempt failed: {repr(e)}")
+                        raise
 
-            formatted_exceptions = "\n- ".join(exceptions)
-            logger.critical(f"Attempt failed: {formatted_exceptions}")
+                    METRICS.retry(func.__qualname__)
+                    time.sleep(backoff(i, delay_secs, max_delay))
 
         return wrapper
 
     return decorator
-
-
-def _get_delay(delay, max_delay, iteration):
-    """
-    Adds an exponential jitter for failed requests
-    """
-    delay *= 2 ** iteration
-    return min(delay, max_delay) + rand_float()
@@ -0,0 +1,297 @@
+import asyncio
+import inspect
+import logging
+import threading
+import time
+from functools import wraps
+from random import uniform
+from typing import Callable
+
+from db.Config import (
+    RETRY_ATTEMPTS, RETRY_DELAY_SECS, RETRY_MAX_DELAY_SECS, RETRY_BUDGET_RATIO, RETRY_BUDGET_MIN_PER_SEC,
+    CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_SECS,
+)
+from util.Metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+# Gauge values of each breaker state
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class DatabaseUnavailableError(ConnectionError):
+    """
+    Raised when the database can't serve a request right now, but may
+    shortly. The API answers these with a 503
+    """
+
+    def __init__(self, message: str, retry_after_secs: float | None = None) -> None:
+        super().__init__(message)
+        self.retry_after_secs = retry_after_secs
+
+
+class CircuitOpenError(DatabaseUnavailableError):
+    """
+    Raised instead of calling the database while its circuit breaker is open
+    """
+
+
+def backoff(attempt: int, delay_secs: float, max_delay_secs: float) -> float:
+    """
+    Exponential backoff with full jitter, so that callers failing together
+    spread their retries out instead of retrying in lockstep
+    """
+    return uniform(0, min(delay_secs * 2 ** (attempt - 1), max_delay_secs))
+
+
+class CircuitBreaker:
+    """
+    Circuit Breaker
+
+    Counts consecutive failures of a handler to reach the database. Once
+    `failure_threshold` are seen the circuit opens, and every call fails
+    fast with CircuitOpenError for `reset_secs`, instead of queueing up
+    behind connect timeouts. After that a single probe is let through
+    (half open): if it succeeds the circuit closes, otherwise it opens
+    again. A probe that never reports back is replaced after `reset_secs`
+    """
+
+    def __init__(
+            self,
+            name: str,
+            failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+            reset_secs: float = CIRCUIT_RESET_SECS
+    ) -> None:
+        if failure_threshold < 1:
+            raise ValueError(f"Invalid circuit breaker threshold: {failure_threshold}")
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_secs = reset_secs
+        self.state = CLOSED
+        self.failures = 0
+        self.opened = 0
+        self._opened_at = 0.0
+        self._probe_started: float | None = None
+        self._lock = threading.Lock()
+
+    def retry_after(self) -> float:
+        """
+        Seconds until the circuit lets a probe through
+        """
+        return max(self._opened_at + self.reset_secs - time.monotonic(), 0.0)
+
+    def raise_if_open(self) -> None:
+        """
+        Fails fast while the circuit is open, without claiming the probe
+        """
+        if self.state == OPEN and self.retry_after() > 0:
+            raise CircuitOpenError(f"Database circuit {self.name} is open", self.retry_after())
+
+    def allow(self) -> None:
+        """
+        Checks that a call may go ahead, letting one probe through once the
+        circuit has been open for `reset_secs`
+
+        Raises:
+            CircuitOpenError: If the circuit is open, or a probe is already running
+        """
+        if self.state == CLOSED:
+            return
+        with self._lock:
+            now = time.monotonic()
+            if self.state == OPEN and now - self._opened_at >= self.reset_secs:
+                self.state = HALF_OPEN
+                self._probe_started = None
+            if self.state == HALF_OPEN and (
+                    self._probe_started is None or now - self._probe_started >= self.reset_secs
+            ):
+                self._probe_started = now
+                return
+            if self.state == CLOSED:
+                return
+        raise CircuitOpenError(f"Database circuit {self.name} is open", self.retry_after() or self.reset_secs)
+
+    def record_success(self) -> None:
+        if self.state == CLOSED and not self.failures:
+            return
+        with self._lock:
+            if self.state != CLOSED:
+                logger.warning(f"Database circuit {self.name} closed")
+            self.state = CLOSED
+            self.failures = 0
+            self._probe_started = None
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= self.failure_threshold):
+                self.state = OPEN
+                self.opened += 1
+                self._opened_at = time.monotonic()
+                self._probe_started = None
+                logger.error(
+                    f"Database circuit {self.name} opened after {self.failures} failure(s), "
+                    f"failing fast for {self.reset_secs}s"
+                )
+
+    def snapshot(self) -> dict[str, any]:
+        return {
+            "name": self.name,
+            "state": self.state,
+            "failures": self.failures,
+            "opened": self.opened,
+            "retry_after_secs": round(self.retry_after(), 3) if self.state == OPEN else 0.0,
+        }
+
+
+class RetryBudget:
+    """
+    Retry Budget
+
+    Caps retries at a fraction of calls, so that a failing database sees at
+    most (1 + ratio) times its usual load rather than a multiple of it.
+    Every call deposits `ratio` tokens and every retry spends one. A trickle
+    of `min_per_sec` tokens lets quiet processes retry too
+    """
+
+    def __init__(
+            self,
+            ratio: float = RETRY_BUDGET_RATIO,
+            min_per_sec: float = RETRY_BUDGET_MIN_PER_SEC,
+            max_tokens: float = 100.0
+    ) -> None:
+        self.ratio = ratio
+        self.min_per_sec = min_per_sec
+        self.max_tokens = max_tokens
+        self.exhausted = 0
+        self._tokens = max_tokens
+        self._refilled_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    @property
+    def tokens(self) -> float:
+        return self._tokens
+
+    def deposit(self) -> None:
+        with self._lock:
+            self._tokens = min(self._tokens + self.ratio, self.max_tokens)
+
+    def withdraw(self) -> bool:
+        """
+        Spends a token on a retry
+
+        Returns:
+            bool: If the retry is within budget
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self._tokens + (now - self._refilled_at) * self.min_per_sec, self.max_tokens)
+            self._refilled_at = now
+            if self._tokens < 1:
+                self.exhausted += 1
+                return False
+            self._tokens -= 1
+            return True
+
+
+# Shared by every handler, so retries are capped across the whole process
+RETRY_BUDGET = RetryBudget()
+
+
+def resilient(
+        writes: bool = False,
+        retries: int = RETRY_ATTEMPTS,
+        delay_secs: float = RETRY_DELAY_SECS,
+        max_delay_secs: float = RETRY_MAX_DELAY_SECS
+):
+    """
+    A decorator for database handler methods, retrying transient errors
+    with backoff, within the retry budget and the handler's circuit breaker.
+
+    Errors are classified by the handler's backend: errors reaching the
+    database count towards the circuit breaker, and only transient errors
+    are retried. Other errors are raised as they are. Statements inside a
+    transaction are never retried, as the transaction may already be gone.
+    A transient or connection error that isn't retried is raised as
+    DatabaseUnavailableError
+
+    The handler must have `breaker`, `backend` and `in_transaction()`
+
+    Args:
+        writes (bool, optional): The method may write, so errors after which the
+        write may have been applied are not retried. Defaults to False.
+        retries (int, optional): Attempts in total. Defaults to RETRY_ATTEMPTS.
+    """
+    def classify(self, e: Exception, attempt: int) -> DatabaseUnavailableError | None:
+        """
+        Returns the error to raise instead of retrying, or None to retry
+        """
+        unavailable = self.backend.is_unavailable(e)
+        if unavailable:
+            self.breaker.record_failure()
+        else:
+            # The database answered, even if only with an error
+            self.breaker.record_success()
+
+        if not self.backend.is_transient(e, writes):
+            if unavailable:
+                return DatabaseUnavailableError(f"Database unavailable: {repr(e)}", self.breaker.retry_after() or None)
+            raise e
+        if attempt >= retries or self.in_transaction() or not RETRY_BUDGET.withdraw():
+            return DatabaseUnavailableError(f"Database unavailable: {repr(e)}", self.breaker.retry_after() or None)
+        logger.warning(f"Retrying after a transient error ({attempt}/{retries}): {repr(e)}")
+        return None
+
+    def decorator(func: Callable):
+        if inspect.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(self, *args, **kwargs):
+                self.breaker.allow()
+                RETRY_BUDGET.deposit()
+                attempt = 1
+                while True:
+                    try:
+                        result = await func(self, *args, **kwargs)
+                    except DatabaseUnavailableError:
+                        raise
+                    except Exception as e:
+                        error = classify(self, e, attempt)
+                        if error is not None:
+                            raise error from e
+                        METRICS.retry(func.__qualname__)
+                        await asyncio.sleep(backoff(attempt, delay_secs, max_delay_secs))
+                        attempt += 1
+                        self.breaker.allow()
+                        continue
+                    self.breaker.record_success()
+                    return result
+
+            return async_wrapper
+
+        @wraps(func)
+        def wrapper(self, *args, **kwargs):
+            self.breaker.allow()
+            RETRY_BUDGET.deposit()
+            attempt = 1
+            while True:
+                try:
+                    result = func(self, *args, **kwargs)
+                except DatabaseUnavailableError:
+                    raise
+                except Exception as e:
+                    error = classify(self, e, attempt)
+                    if error is not None:
+                        raise error from e
+                    METRICS.retry(func.__qualname__)
+                    # Sync handlers run on worker threads, so only the caller's thread sleeps
+                    time.sleep(backoff(attempt, delay_secs, max_delay_secs))
+                    attempt += 1
+                    self.breaker.allow()
+                    continue
+                self.breaker.record_success()
+                return result
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,74 @@
+import logging
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+logger = logging.getLogger(__name__)
+
+
+class Startup:
+    """
+    Startup
+
+    Tracks how a worker started: how long importing the app and each
+    warm-up phase took, and whether warm-up has finished, which is what
+    /health/ready reports.
+
+    The clock starts when this module is imported, which main.py does
+    before anything else, so the cold start includes importing the app
+    """
+
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.phases: dict[str, float] = {}
+        self.ready = False
+        self.attempts = 0
+        self.error: str | None = None
+        self.cold_start_secs: float | None = None
+
+    def imported(self) -> None:
+        """
+        Records the time taken to import the app, once the lifespan starts
+        """
+        self.phases.setdefault("import", time.perf_counter() - self.started)
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """
+        Times one warm-up phase. A phase run again by a later attempt
+        replaces the earlier timing
+        """
+        started = time.perf_counter()
+        yield
+        self.phases[name] = time.perf_counter() - started
+        logger.debug(f"Startup phase {name} took {self.phases[name]:.3f}s")
+
+    def failed(self, exc: Exception) -> None:
+        self.attempts += 1
+        self.error = repr(exc)
+
+    def mark_ready(self) -> None:
+        """
+        Marks warm-up as finished, and logs the cold start time
+        """
+        self.attempts += 1
+        self.error = None
+        self.ready = True
+        self.cold_start_secs = time.perf_counter() - self.started
+        phases = ", ".join(f"{name} {secs:.3f}s" for name, secs in self.phases.items())
+        logger.info(f"Worker ready in {self.cold_start_secs:.3f}s ({phases})")
+
+    def uptime_secs(self) -> float:
+        return time.perf_counter() - self.started
+
+    def snapshot(self) -> dict[str, any]:
+        return {
+            "ready": self.ready,
+            "cold_start_secs": None if self.cold_start_secs is None else round(self.cold_start_secs, 4),
+            "phases": {name: round(secs, 4) for name, secs in self.phases.items()},
+            "attempts": self.attempts,
+            "error": self.error,
+        }
+
+
+STARTUP = Startup()
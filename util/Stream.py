@@ -0,0 +1,89 @@
+from contextlib import aclosing
+from typing import AsyncIterable, Iterable, Iterator
+
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from starlette.types import Receive, Scope, Send
+
+from util.Accept import negotiate
+from util.Json import dumps
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+class ClosingStreamingResponse(StreamingResponse):
+    """
+    A StreamingResponse that always closes its body once the response ends,
+    however it ends. Starlette stops iterating the body when the client
+    disconnects or the request is cancelled, leaving it suspended until it
+    is garbage collected, along with any connection its source holds
+    """
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await self.body_iterator.aclose()
+
+
+def wants_ndjson(request: Request) -> bool:
+    """
+    Checks if the client asked for a streamed, newline delimited JSON response
+    """
+    return negotiate(request, NDJSON_MEDIA_TYPE) == NDJSON_MEDIA_TYPE
+
+
+def ndjson_response(
+        batches: AsyncIterable[list] | Iterable[list],
+        model: type[BaseModel] | None = None,
+        **kwargs
+) -> StreamingResponse:
+    """
+    Streams batches of rows as newline delimited JSON, one chunk per batch,
+    so that only a single batch is ever held in memory. The batches are
+    closed when the response ends, even if the client disconnects early
+
+    Args:
+        batches (AsyncIterable | Iterable): Batches of models or row dicts
+        model (type[BaseModel], optional): Model to build from each row dict before
+        serialising it. Row dicts are serialised as they are if not given.
+        kwargs: Any other StreamingResponse arguments
+    """
+    return ClosingStreamingResponse(_ndjson_chunks(batches, model), media_type=NDJSON_MEDIA_TYPE, **kwargs)
+
+
+def batched(items: Iterable, size: int) -> Iterator[list]:
+    """
+    Splits an iterable into lists of at most `size` items
+    """
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+async def _ndjson_chunks(batches: AsyncIterable[list] | Iterable[list], model: type[BaseModel] | None):
+    if isinstance(batches, AsyncIterable):
+        # Closing the batches releases whatever they hold, such as the connection of ADB.stream
+        async with aclosing(batches):
+            async for batch in batches:
+                yield _encode_batch(batch, model)
+    else:
+        for batch in batches:
+            yield _encode_batch(batch, model)
+
+
+def _encode_batch(batch: list, model: type[BaseModel] | None) -> bytes:
+    lines = []
+    for item in batch:
+        if model is not None and not isinstance(item, BaseModel):
+            # Table models hydrate rows from our own database without validating them
+            from_row = getattr(model, "from_row", None)
+            item = from_row(item) if from_row else model(**item)
+        lines.append(dumps(item))
+    return b"\n".join(lines) + b"\n"
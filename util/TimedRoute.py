@@ -0,0 +1,103 @@
+import asyncio
+import inspect
+from functools import wraps
+from typing import Callable
+
+from fastapi import Request, Response
+from fastapi.routing import APIRoute
+from starlette.exceptions import HTTPException
+
+from util.Metrics import METRICS
+
+
+class TimedRoute(APIRoute):
+    """
+    Timed Route
+
+    A route that records its latency and commits per request, and adds a
+    Server-Timing header splitting the request's time into database work,
+    the endpoint's own code and serialisation of the response
+
+    Usage:
+        router = APIRouter(prefix="/api/...", route_class=TimedRoute)
+    """
+
+    def get_route_handler(self) -> Callable:
+        # The endpoint is wrapped before FastAPI builds its handler, so the
+        # handler calls it (and can tell it apart from serialisation)
+        if not getattr(self.dependant.call, "__timed__", False):
+            self.dependant.call = self._timed_endpoint(self.dependant.call)
+        handler = super().get_route_handler()
+        method = ",".join(sorted(self.methods))
+        route = self.path_format
+
+        async def timed_handler(request: Request) -> Response:
+            timings, token = METRICS.start_request()
+            if timings is None:
+                return await handler(request)
+
+            status = 500
+            try:
+                try:
+                    response = await handler(request)
+                except Exception as e:
+                    # Handled exceptions are turned into their responses here,
+                    # so they are recorded with the status the client gets.
+                    # Unhandled ones are left to fail the request with a 500
+                    exception_handler = self._exception_handler(request, e)
+                    if exception_handler is None:
+                        raise
+                    response = exception_handler(request, e)
+                    if inspect.isawaitable(response):
+                        response = await response
+                status = response.status_code
+            finally:
+                total_secs = METRICS.finish_request(timings, token, method, route, status)
+
+            response.headers["Server-Timing"] = timings.server_timing(total_secs)
+            return response
+
+        return timed_handler
+
+    @staticmethod
+    def _exception_handler(request: Request, exc: Exception) -> Callable | None:
+        # Looked up the same way as Starlette does, by status code for
+        # HTTPExceptions, then by the closest class in the exception's MRO
+        handlers = request.app.exception_handlers
+        if isinstance(exc, HTTPException) and exc.status_code in handlers:
+            return handlers[exc.status_code]
+        for cls in type(exc).__mro__:
+            if cls in handlers:
+                return handlers[cls]
+        return None
+
+    @staticmethod
+    def _timed_endpoint(call: Callable) -> Callable:
+        if asyncio.iscoroutinefunction(call):
+            @wraps(call)
+            async def timed_call(*args, **kwargs):
+                timings = METRICS.current_request()
+                if timings is None:
+                    return await call(*args, **kwargs)
+                timings.start_endpoint()
+                try:
+                    return await call(*args, **kwargs)
+                finally:
+                    timings.finish_endpoint()
+
+            timed_call.__timed__ = True
+            return timed_call
+
+        @wraps(call)
+        def timed_sync_call(*args, **kwargs):
+            timings = METRICS.current_request()
+            if timings is None:
+                return call(*args, **kwargs)
+            timings.start_endpoint()
+            try:
+                return call(*args, **kwargs)
+            finally:
+                timings.finish_endpoint()
+
+        timed_sync_call.__timed__ = True
+        return timed_sync_call